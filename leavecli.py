@@ -0,0 +1,238 @@
+"""
+班级请假记录系统 - 命令行
+不需要图形界面，可在服务器上用定时任务批量生成统计报表
+只读取数据文件、不修改它们，可以在界面程序运行时使用
+
+用法示例:
+    python leavecli.py classes
+    python leavecli.py stats --range month --all-classes
+    python leavecli.py export --class 一班 --start 2024-09-01 --end 2025-01-31 -o 一班.xlsx
+    python leavecli.py export --all-classes --range week --format csv -o reports/
+    python leavecli.py export --class 一班 --student 张三 --range month -o 张三.json
+    python leavecli.py aggregate --all-classes --range month -o 汇总.xlsx
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+from typing import List, Tuple
+from leavedata import ClassWorkspace, WorkspaceManager, to_ordinal, week_range, month_range
+import leaveexport
+import leavereport
+
+
+def read_backend(data_dir: str) -> str:
+    """读取界面设置中的存储方式，与界面使用同一份数据"""
+    try:
+        settings_file = os.path.join(data_dir, 'settings.json')
+        if os.path.exists(settings_file):
+            with open(settings_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('storage_backend', 'json')
+    except Exception:
+        pass
+    return 'json'
+
+
+def resolve_range(args) -> Tuple[str, str]:
+    """根据 --range 或 --start/--end 确定日期范围"""
+    if args.range == "week":
+        return week_range()
+    if args.range == "month":
+        return month_range()
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    if args.range == "today":
+        return today, today
+    start_date = args.start or today
+    end_date = args.end or start_date
+    for value in (start_date, end_date):
+        try:
+            to_ordinal(value)
+        except ValueError:
+            raise SystemExit(f"日期格式错误: {value}，应为 YYYY-MM-DD")
+    if start_date > end_date:
+        raise SystemExit(f"开始日期 {start_date} 晚于结束日期 {end_date}")
+    return start_date, end_date
+
+
+def resolve_classes(args, workspaces: WorkspaceManager) -> List[str]:
+    """确定要处理的班级，未指定时只处理默认班级"""
+    available = workspaces.list_classes()
+    if args.all_classes:
+        return available
+    classes = args.classes or [WorkspaceManager.DEFAULT_CLASS]
+    missing = [name for name in classes if name not in available]
+    if missing:
+        raise SystemExit(f"班级不存在: {', '.join(missing)}（现有班级: {', '.join(available)}）")
+    return classes
+
+
+def resolve_format(args) -> str:
+    """导出格式：--format 优先，否则按输出文件扩展名，默认 xlsx"""
+    if args.format:
+        return args.format
+    ext = os.path.splitext(args.output or "")[1].lower().lstrip(".")
+    return ext if ext in leaveexport.EXPORT_FORMATS else "xlsx"
+
+
+def output_path(args, class_name: str, start_date: str, end_date: str, fmt: str, many: bool) -> str:
+    """输出文件路径：处理多个班级或 -o 是文件夹时，在该文件夹下按班级和日期命名"""
+    output = args.output or "."
+    if not many and not os.path.isdir(output) and not output.endswith(os.sep):
+        return output
+    os.makedirs(output, exist_ok=True)
+    parts = [class_name, start_date, end_date] + ([args.student] if args.student else [])
+    return os.path.join(output, "_".join(parts) + "." + fmt)
+
+
+def cmd_classes(args, workspaces: WorkspaceManager) -> int:
+    """列出全部班级"""
+    for name in workspaces.list_classes():
+        print(name)
+    return 0
+
+
+def cmd_stats(args, workspaces: WorkspaceManager) -> int:
+    """输出各班级的统计汇总"""
+    start_date, end_date = resolve_range(args)
+    summary = {}
+    failed = 0
+    for class_name in resolve_classes(args, workspaces):
+        workspace = None
+        try:
+            workspace = ClassWorkspace(class_name, workspaces.class_dir(class_name), workspaces.backend,
+                                       read_only=True)
+            if args.student:
+                stats = workspace.leave_manager.get_student_statistics(args.student, start_date, end_date)
+            else:
+                stats = workspace.leave_manager.get_statistics(start_date, end_date)
+        except Exception as e:
+            print(f"{class_name}: 统计失败: {str(e)}", file=sys.stderr)
+            failed += 1
+            continue
+        finally:
+            if workspace is not None:
+                workspace.leave_manager.storage.close()
+        summary[class_name] = stats
+
+    if args.json:
+        json.dump({"start_date": start_date, "end_date": end_date, "classes": summary},
+                  sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print(f"统计范围: {start_date} 至 {end_date}")
+        for class_name, stats in summary.items():
+            title = f"{class_name} - {args.student}" if args.student else class_name
+            print(f"[{title}] 全天 {stats['total_full_days']} 人次，半天 {stats['total_half_days']} 人次"
+                  f"（工作日 {stats['weekdays']['full_days']}/{stats['weekdays']['half_days']}，"
+                  f"周六 {stats['saturdays']['full_days']}/{stats['saturdays']['half_days']}，"
+                  f"周日 {stats['sundays']['full_days']}/{stats['sundays']['half_days']}）")
+    return 1 if failed else 0
+
+
+def cmd_export(args, workspaces: WorkspaceManager) -> int:
+    """按班级导出统计表格，每个班级一个文件"""
+    start_date, end_date = resolve_range(args)
+    fmt = resolve_format(args)
+    classes = resolve_classes(args, workspaces)
+    failed = 0
+    for class_name in classes:
+        workspace = None
+        try:
+            workspace = ClassWorkspace(class_name, workspaces.class_dir(class_name), workspaces.backend,
+                                       read_only=True)
+            # 已删除的学生仍有编号和历史记录，也可以导出
+            if args.student and workspace.student_manager.student_id(args.student) is None:
+                print(f"{class_name}: 没有学生 {args.student}，跳过", file=sys.stderr)
+                continue
+            result = workspace.leave_manager.query_statistics(start_date, end_date, args.student)
+            table_data = leaveexport.build_table_data(result)
+            file_path = output_path(args, class_name, start_date, end_date, fmt, len(classes) > 1)
+            leaveexport.export_table(table_data, args.student is None, file_path, fmt)
+            print(f"{class_name}: 导出 {len(table_data)} 条记录到 {file_path}")
+        except Exception as e:
+            print(f"{class_name}: 导出失败: {str(e)}", file=sys.stderr)
+            failed += 1
+        finally:
+            if workspace is not None:
+                workspace.leave_manager.storage.close()
+    return 1 if failed else 0
+
+
+def cmd_aggregate(args, workspaces: WorkspaceManager) -> int:
+    """多班级汇总统计，导出一个 Excel 文件"""
+    start_date, end_date = resolve_range(args)
+    classes = {name: workspaces.class_dir(name) for name in resolve_classes(args, workspaces)}
+    result = leavereport.aggregate_statistics(classes, start_date, end_date,
+                                              backend=workspaces.backend, max_workers=args.jobs)
+    file_path = args.output or f"多班级汇总_{start_date}_{end_date}.xlsx"
+    leavereport.export_aggregate_to_excel(result, file_path)
+    print(f"汇总 {len(result.class_names)} 个班级到 {file_path}："
+          f"全天 {result.total_full_days} 人次，半天 {result.total_half_days} 人次")
+    for class_name, error in result.errors.items():
+        print(f"{class_name}: 统计失败: {error}", file=sys.stderr)
+    return 1 if result.errors else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="leavecli", description="班级请假记录系统命令行")
+    parser.add_argument("--data-dir", default="data", help="数据文件夹（默认 data）")
+    parser.add_argument("--backend", choices=("json", "sqlite"),
+                        help="存储方式（默认与界面设置一致）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("classes", help="列出全部班级")
+
+    def add_common(sub):
+        group = sub.add_mutually_exclusive_group()
+        group.add_argument("--class", dest="classes", action="append", metavar="班级",
+                           help="要处理的班级，可重复指定（默认为默认班级）")
+        group.add_argument("--all-classes", action="store_true", help="处理全部班级")
+        sub.add_argument("--range", choices=("today", "week", "month"), help="今天/本周/本月")
+        sub.add_argument("--start", help="开始日期 YYYY-MM-DD（默认今天）")
+        sub.add_argument("--end", help="结束日期 YYYY-MM-DD（默认同开始日期）")
+
+    stats = subparsers.add_parser("stats", help="输出统计汇总")
+    add_common(stats)
+    stats.add_argument("--student", help="只统计该学生")
+    stats.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    export = subparsers.add_parser("export", help="导出统计表格（每个班级一个文件）")
+    add_common(export)
+    export.add_argument("--student", help="只导出该学生")
+    export.add_argument("--format", choices=leaveexport.EXPORT_FORMATS,
+                        help="导出格式（默认按输出文件扩展名，否则 xlsx）")
+    export.add_argument("-o", "--output", help="输出文件；处理多个班级时为输出文件夹")
+
+    aggregate = subparsers.add_parser("aggregate", help="多班级汇总导出 Excel")
+    add_common(aggregate)
+    aggregate.add_argument("-o", "--output", help="输出文件（默认 多班级汇总_开始_结束.xlsx）")
+    aggregate.add_argument("--jobs", type=int, help="并行进程数（默认每个CPU核心一个）")
+    return parser
+
+
+COMMANDS = {
+    "classes": cmd_classes,
+    "stats": cmd_stats,
+    "export": cmd_export,
+    "aggregate": cmd_aggregate,
+}
+
+
+def main(argv=None) -> int:
+    """命令行入口，返回退出码：0 成功，1 有班级处理失败"""
+    args = build_parser().parse_args(argv)
+    if args.command != "classes" and args.range and (args.start or args.end):
+        raise SystemExit("--range 不能与 --start/--end 同时使用")
+    if not os.path.isdir(args.data_dir):
+        raise SystemExit(f"数据文件夹不存在: {args.data_dir}")
+    workspaces = WorkspaceManager(root_dir=args.data_dir, backend=args.backend or read_backend(args.data_dir))
+    try:
+        return COMMANDS[args.command](args, workspaces)
+    finally:
+        workspaces.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
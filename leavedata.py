@@ -0,0 +1,1575 @@
+"""
+班级请假记录系统 - 数据层
+学生名单、请假记录存储、统计查询和多班级工作区，不依赖 tkinter，
+界面、命令行和多进程汇总统计共用
+"""
+
+import os
+import json
+import shutil
+import sqlite3
+import urllib.request
+import datetime
+import bisect
+import functools
+import contextlib
+import copy
+import heapq
+import concurrent.futures
+from array import array
+from typing import List, Dict, Tuple, Optional
+from collections import defaultdict, OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 可选，没有时统计走纯 Python 路径
+    np = None
+
+# 星期名称，下标与 date.weekday() 一致
+WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
+
+def pinyin_key(name: str) -> str:
+    """学生姓名的拼音排序键"""
+    from pypinyin import lazy_pinyin
+
+    return ''.join(lazy_pinyin(name))
+
+
+@dataclass
+class BatchImportResult:
+    """批量导入学生的结果"""
+    added: List[str] = field(default_factory=list)
+    duplicates: List[str] = field(default_factory=list)  # 已在名单中或本次重复出现
+    invalid: List[str] = field(default_factory=list)     # 空白、过长或含不可见字符
+
+
+class StudentManager:
+    """学生名单管理
+
+    名单按拼音顺序保存，每个学生的拼音排序键只在添加或首次加载时计算一次，
+    并随名单一起写入文件。
+
+    每个姓名有一个稳定的整数编号（名单表：编号 -> 姓名），请假记录只保存编号，
+    改名只需修改名单表。删除的学生和只出现在请假记录中的姓名也保留编号，历史记录照常显示。
+    """
+
+    # students.json 的格式版本：1 为纯姓名列表，2 增加拼音，3 增加编号
+    FILE_VERSION = 3
+
+    # 姓名最大长度
+    MAX_NAME_LENGTH = 32
+
+    def __init__(self, data_file: str = "students.json", data_dir: str = "data", read_only: bool = False):
+        # 只读方式（报表、命令行）加载时不写任何文件：不建文件夹、不升级旧格式、新编号只分配在内存中
+        self.read_only = read_only
+        # 确保data文件夹存在
+        if not read_only and not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+        self.data_file = os.path.join(data_dir, data_file)
+        self.students = []      # 按拼音排序的姓名
+        self._sort_keys = []    # 与 students 对齐的 (拼音, 姓名)
+        self._names = set()     # 用于 O(1) 判断是否已在名单中
+        # 名单表：编号 -> 姓名。请假记录的列数组直接引用这个列表，只能原地修改
+        self.names_by_id = []
+        self._ids = {}          # 姓名 -> 编号（包括已删除的学生）
+        # 加载时发现的问题（名单文件损坏、请假记录中的编号不在名单表中），由界面提示
+        self.load_warnings = []
+        self.load_students()
+    
+    def load_students(self):
+        """加载学生名单
+
+        文件无法解析时不按空名单改写它：请假记录只保存编号，这个文件是唯一的编号 -> 姓名对照，
+        先复制一份备份，本次按空名单运行，请假记录中的编号显示为占位姓名。
+        """
+        self.load_warnings = []
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if not isinstance(data, (dict, list)):
+                    raise ValueError("内容不是学生名单")
+            except Exception as e:
+                self._set_students([], [])
+                if self.read_only:
+                    self.load_warnings.append(f"学生名单文件无法读取（{str(e)}），请假记录中的学生显示为编号")
+                    return
+                backup_file = self.data_file + datetime.datetime.now().strftime('.%Y%m%d-%H%M%S.corrupt')
+                shutil.copy2(self.data_file, backup_file)
+                self.load_warnings.append(f"学生名单文件无法读取（{str(e)}），已备份为 {backup_file}，"
+                                          f"请从备份恢复；修复前请假记录中的学生显示为编号")
+                return
+            self._set_students(*self._parse_students(data))
+            if self.read_only:
+                return
+            if not isinstance(data, dict) or data.get("version") != self.FILE_VERSION:
+                # 旧格式：补算拼音、分配编号后按新格式保存，以后加载不再计算
+                self.save_students()
+        else:
+            # 首次运行，初始化空名单
+            self._set_students([], [])
+            if not self.read_only:
+                self.save_students()
+
+    def _parse_students(self, data) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """解析文件内容为 (名单表, [(拼音, 姓名)])，兼容旧版的纯姓名列表和无编号格式"""
+        if isinstance(data, dict):
+            active, others = data.get("students", []), data.get("others", [])
+        elif isinstance(data, list):
+            active, others = data, []
+        else:
+            active, others = [], []
+
+        table = {}       # 编号 -> 姓名
+        unnumbered = []  # 旧格式中没有编号的姓名，按出现顺序分配
+        keys = []
+        seen = set()
+        for is_active, entries in ((True, active), (False, others)):
+            for entry in entries:
+                if isinstance(entry, dict):
+                    name, pinyin, student_id = entry.get("name"), entry.get("pinyin"), entry.get("id")
+                else:
+                    name, pinyin, student_id = entry, None, None
+                if not isinstance(name, str) or not name or name in seen:
+                    continue
+                seen.add(name)
+                if isinstance(student_id, int) and student_id >= 0 and student_id not in table:
+                    table[student_id] = name
+                else:
+                    unnumbered.append(name)
+                if is_active:
+                    if not isinstance(pinyin, str):
+                        pinyin = pinyin_key(name)
+                    keys.append((pinyin, name))
+
+        names_by_id = [None] * (max(table) + 1 if table else 0)
+        for student_id, name in table.items():
+            names_by_id[student_id] = name
+        names_by_id.extend(unnumbered)
+        # 编号不连续时补占位姓名，保证编号可以直接作为下标
+        for student_id, name in enumerate(names_by_id):
+            if name is None:
+                names_by_id[student_id] = f"#{student_id}"
+        return names_by_id, keys
+
+    def _set_students(self, names_by_id: List[str], keys: List[Tuple[str, str]]):
+        """用名单表和 [(拼音, 姓名)] 重建名单"""
+        self.names_by_id[:] = names_by_id
+        self._ids = {name: student_id for student_id, name in enumerate(names_by_id)}
+        self._sort_keys = sorted(keys)
+        self.students = [name for _, name in self._sort_keys]
+        self._names = set(self.students)
+
+    def save_students(self):
+        """保存学生名单（先写临时文件再替换，名单表损坏会导致请假记录无法对应姓名）"""
+        if self.read_only:
+            raise PermissionError("只读方式加载的学生名单不能保存")
+        data = {
+            "version": self.FILE_VERSION,
+            "students": [{"id": self._ids[name], "name": name, "pinyin": pinyin}
+                         for pinyin, name in self._sort_keys],
+            "others": [{"id": student_id, "name": name}
+                       for student_id, name in enumerate(self.names_by_id) if name not in self._names]
+        }
+        temp_file = self.data_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.data_file)
+
+    def student_id(self, name: str) -> Optional[int]:
+        """姓名对应的编号，没有时返回 None"""
+        return self._ids.get(name)
+
+    def student_name(self, student_id: int) -> str:
+        """编号对应的姓名"""
+        return self.names_by_id[student_id]
+
+    def fill_missing_ids(self, count: int) -> int:
+        """保证编号 0 到 count-1 都在名单表中：请假记录中有、名单表中没有的编号补占位姓名 "#编号"
+
+        补上的编号不会再分配给新学生。返回补充的个数（不保存，下次保存名单时一并写入）。
+        """
+        added = 0
+        while len(self.names_by_id) < count:
+            student_id = len(self.names_by_id)
+            name = f"#{student_id}"
+            while name in self._ids:
+                name += "#"
+            self.names_by_id.append(name)
+            self._ids[name] = student_id
+            added += 1
+        return added
+
+    def _assign_id(self, name: str) -> int:
+        """获取姓名的编号，新姓名分配新编号（不保存）"""
+        student_id = self._ids.get(name)
+        if student_id is None:
+            student_id = len(self.names_by_id)
+            self.names_by_id.append(name)
+            self._ids[name] = student_id
+        return student_id
+
+    def ensure_ids(self, names) -> Dict[str, int]:
+        """获取一批姓名的编号，不在名单表中的姓名分配新编号，有新编号时保存一次"""
+        count = len(self.names_by_id)
+        ids = {name: self._assign_id(name) for name in names}
+        if len(self.names_by_id) != count and not self.read_only:
+            self.save_students()
+        return ids
+
+    @classmethod
+    def name_error(cls, name) -> Optional[str]:
+        """姓名无效的原因，有效时返回 None"""
+        if not isinstance(name, str) or not name:
+            return "姓名不能为空"
+        if len(name) > cls.MAX_NAME_LENGTH:
+            return f"姓名不能超过 {cls.MAX_NAME_LENGTH} 个字符"
+        if not name.isprintable():
+            return "姓名不能包含换行、制表符等不可见字符"
+        return None
+
+    @classmethod
+    def is_valid_name(cls, name) -> bool:
+        """姓名是否有效：非空、不超长、不含换行等不可见字符"""
+        return cls.name_error(name) is None
+
+    def has_student(self, name: str) -> bool:
+        """是否已在名单中"""
+        return name in self._names
+
+    def add_error(self, name) -> Optional[str]:
+        """不能添加该学生的原因，可以添加时返回 None"""
+        error = self.name_error(name)
+        if error is None and name in self._names:
+            error = "该学生已在名单中"
+        return error
+
+    def add_student(self, name: str) -> bool:
+        """添加学生"""
+        if self.add_error(name) is not None:
+            return False
+        self._assign_id(name)
+        self._insert_sorted(name)
+        self.save_students()
+        return True
+
+    def _insert_sorted(self, name: str):
+        """按拼音顺序把姓名插入名单"""
+        key = (pinyin_key(name), name)
+        index = bisect.bisect_left(self._sort_keys, key)
+        self._sort_keys.insert(index, key)
+        self.students.insert(index, name)
+        self._names.add(name)
+
+    def _remove_sorted(self, name: str):
+        """从有序名单中移除姓名"""
+        index = self.students.index(name)
+        del self.students[index]
+        del self._sort_keys[index]
+        self._names.discard(name)
+    
+    def remove_student(self, name: str) -> bool:
+        """删除学生"""
+        if name in self._names:
+            # 编号保留在名单表中，历史请假记录仍能显示姓名
+            self._remove_sorted(name)
+            self.save_students()
+            return True
+        return False
+
+    def rename_student(self, old_name: str, new_name: str) -> bool:
+        """修改学生姓名：只改名单表中编号对应的姓名，请假记录无需改写"""
+        if old_name not in self._ids or not self.is_valid_name(new_name) or new_name in self._ids:
+            return False
+        student_id = self._ids.pop(old_name)
+        self.names_by_id[student_id] = new_name
+        self._ids[new_name] = student_id
+        if old_name in self._names:
+            self._remove_sorted(old_name)
+            self._insert_sorted(new_name)
+        self.save_students()
+        return True
+    
+    def batch_import(self, names: List[str]) -> BatchImportResult:
+        """批量导入学生：一次遍历去重，整批只排序合并和保存一次"""
+        result = BatchImportResult()
+        new_keys = []
+        for raw_name in names:
+            name = raw_name.strip() if isinstance(raw_name, str) else raw_name
+            if not self.is_valid_name(name):
+                result.invalid.append(raw_name)
+            elif name in self._names:
+                result.duplicates.append(name)
+            else:
+                self._names.add(name)
+                self._assign_id(name)
+                result.added.append(name)
+                new_keys.append((pinyin_key(name), name))
+
+        if new_keys:
+            # 新名单排序后与已有的有序名单归并
+            new_keys.sort()
+            self._sort_keys = list(heapq.merge(self._sort_keys, new_keys))
+            self.students = [name for _, name in self._sort_keys]
+            self.save_students()
+        return result
+    
+    def get_students(self) -> List[str]:
+        """获取学生列表（按拼音排序）"""
+        return list(self.students)
+
+
+class JsonLeaveStorage:
+    """JSON快照 + 追加日志存储（默认）
+
+    快照格式为 {"version": 2, "records": {date: {学生编号: "half"/"full"}}}，
+    兼容读取旧版按姓名保存的 {date: {name: {"type": ...}}}，加载旧文件后 needs_upgrade 为 True。
+    """
+
+    # 快照文件格式版本
+    FILE_VERSION = 2
+
+    # 日志条数达到该值时自动压缩为快照
+    JOURNAL_COMPACT_THRESHOLD = 500
+
+    def __init__(self, data_file: str, students: 'StudentManager', read_only: bool = False):
+        self.data_file = data_file
+        # 只读：加载时不截断日志的残行，不能写入
+        self.read_only = read_only
+        # 名单表，用于把旧版按姓名保存的记录转换为编号
+        self.students = students
+        # 追加写日志：每次按天修改追加一行，定期压缩回快照文件
+        self.journal_file = os.path.splitext(self.data_file)[0] + '.journal'
+        self._journal_entries = 0
+        self.needs_upgrade = False
+        # 快照文件无法解析的原因：这时内存中只有日志里的修改，不能再用它覆盖快照文件
+        self.snapshot_error = None
+
+    def load(self) -> Dict[str, Dict[int, str]]:
+        """加载请假记录（快照 + 日志回放），返回 {date: {学生编号: type}}
+
+        快照文件无法解析时不按空快照处理：先复制一份备份，本次只回放日志，并且不再压缩日志，
+        否则退出时会用只含日志的数据覆盖快照文件，全部历史记录就丢了。
+        """
+        self.snapshot_error = None
+        self.needs_upgrade = False
+        records = {}
+        legacy = None
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and data.get("version") == self.FILE_VERSION:
+                    records = {date: {int(student_id): leave_type for student_id, leave_type in day_records.items()}
+                               for date, day_records in data["records"].items()}
+                elif isinstance(data, dict):
+                    # 旧版按姓名保存的快照
+                    legacy = {date: {name: record["type"] for name, record in day_records.items()}
+                              for date, day_records in data.items()}
+                else:
+                    raise ValueError("内容不是请假记录")
+            except Exception as e:
+                records = {}
+                self._snapshot_failed(e)
+        if legacy:
+            records = self._resolve_names(legacy)
+            self.needs_upgrade = True
+
+        self._journal_entries = self._replay_journal(records)
+        if self.snapshot_error is not None:
+            # 旧版日志只在内存中转换，等快照修复后再改写
+            self.needs_upgrade = False
+        return records
+
+    def _snapshot_failed(self, error: Exception):
+        """快照文件无法解析：备份一份（只读加载时不备份），记录原因并由界面提示"""
+        if self.read_only:
+            self.snapshot_error = f"请假记录文件无法读取（{str(error)}），只显示日志中尚未合并的修改"
+        else:
+            backup_file = self.data_file + datetime.datetime.now().strftime('.%Y%m%d-%H%M%S.corrupt')
+            shutil.copy2(self.data_file, backup_file)
+            self.snapshot_error = (f"请假记录文件无法读取（{str(error)}），已备份为 {backup_file}，请从备份恢复；"
+                                   f"修复前只显示日志中的修改，新录入的记录只追加到日志，不会覆盖该文件")
+        self.students.load_warnings.append(self.snapshot_error)
+
+    def _resolve_names(self, records: Dict[str, Dict[str, str]]) -> Dict[str, Dict[int, str]]:
+        """把按姓名保存的记录转换为按编号保存，名单表中没有的姓名一次性分配编号"""
+        ids = self.students.ensure_ids({name for day_records in records.values() for name in day_records})
+        return {date: {ids[name]: leave_type for name, leave_type in day_records.items()}
+                for date, day_records in records.items()}
+
+    def _replay_journal(self, records: Dict) -> int:
+        """将日志中的按天修改依次应用到快照上，返回回放的条数"""
+        if not os.path.exists(self.journal_file):
+            return 0
+
+        with open(self.journal_file, 'rb') as f:
+            content = f.read()
+
+        # 最后一行可能因异常退出只写了一半，截掉它，避免后续追加的内容接在残行后面
+        if content and not content.endswith(b'\n'):
+            content = content[:content.rfind(b'\n') + 1]
+            if not self.read_only:
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(len(content))
+
+        entries = []
+        for line in content.decode('utf-8', errors='ignore').splitlines():
+            try:
+                entry = json.loads(line)
+                if "i" in entry:
+                    entries.append((entry["d"], {int(student_id): leave_type
+                                                 for student_id, leave_type in entry["i"].items()}, False))
+                else:
+                    # 旧版日志按姓名记录
+                    entries.append((entry["d"], dict(entry["r"]), True))
+            except:
+                continue
+
+        legacy = [day_records for _, day_records, by_name in entries if by_name]
+        if legacy:
+            ids = self.students.ensure_ids({name for day_records in legacy for name in day_records})
+            self.needs_upgrade = True
+
+        for date, day_records, by_name in entries:
+            if by_name:
+                day_records = {ids[name]: leave_type for name, leave_type in day_records.items()}
+            if day_records:
+                records[date] = day_records
+            else:
+                records.pop(date, None)
+        return len(entries)
+
+    def write_day(self, date: str, day_records: Dict[int, str], columns: 'LeaveColumns'):
+        """把某天的最新状态追加写入日志并落盘，day_records 为 {学生编号: type}"""
+        self._check_writable()
+        line = json.dumps({"d": date, "i": day_records}, ensure_ascii=False, separators=(',', ':'))
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += 1
+
+        # 日志过长时压缩为快照，避免启动时回放过多（快照文件损坏时不压缩）
+        if self._journal_entries >= self.JOURNAL_COMPACT_THRESHOLD and self.snapshot_error is None:
+            self.write_all(columns)
+
+    def write_all(self, columns: 'LeaveColumns'):
+        """写入完整快照并清空日志"""
+        self._check_writable()
+        if self.snapshot_error is not None:
+            raise PermissionError("请假记录文件无法读取，修复前不能写入完整快照（会覆盖其中的历史记录）")
+        data = {
+            "version": self.FILE_VERSION,
+            "records": {date: day_records for date, day_records in columns.iter_days()}
+        }
+        # 创建临时文件
+        temp_file = self.data_file + '.tmp'
+
+        try:
+            # 写入临时文件
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 使用原子操作替换原文件
+            if os.path.exists(self.data_file):
+                os.replace(temp_file, self.data_file)
+            else:
+                os.rename(temp_file, self.data_file)
+
+        except Exception as e:
+            # 清理临时文件
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise e
+
+        # 快照已包含日志中的全部修改，日志可以清空
+        # 若在此之前崩溃，按天整体替换的日志重复回放也不会出错
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_entries = 0
+        self.needs_upgrade = False
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError("只读方式加载的请假记录不能保存")
+
+    def compact(self, columns: 'LeaveColumns'):
+        """如果日志中有未合并的修改，则压缩为快照（快照文件无法解析时保留日志，不覆盖它）"""
+        if self.read_only or self.snapshot_error is not None:
+            return
+        if self._journal_entries or os.path.exists(self.journal_file):
+            self.write_all(columns)
+
+    def prepare_restore(self, file_names: List[str]):
+        """恢复备份前调用：删除当前日志，避免旧日志回放到恢复后的快照上"""
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_entries = 0
+
+    def close(self):
+        """释放存储资源（JSON存储无需处理）"""
+        pass
+
+
+class SqliteLeaveStorage:
+    """SQLite存储：按 (date) 和 (student_id, date) 建索引，范围统计和个人历史走索引查询"""
+
+    def __init__(self, db_file: str, json_file: str, students: 'StudentManager', read_only: bool = False):
+        self.db_file = db_file
+        # 只读：以只读模式打开数据库，不建表、不迁移，只用 load() 读出全部记录
+        self.read_only = read_only
+        # 旧版JSON数据文件，首次使用SQLite时一次性迁移
+        self.json_file = json_file
+        # 名单表，用于迁移旧版按姓名保存的记录
+        self.students = students
+        self._conn = None
+        self.needs_upgrade = False
+        self.snapshot_error = None  # 与 JsonLeaveStorage 一致，数据库没有单独的快照文件
+
+    def _connect(self):
+        """打开数据库并建表（首次打开时从JSON迁移数据）"""
+        if self._conn is not None:
+            return self._conn
+        if self.read_only:
+            raise PermissionError("只读方式加载的请假记录不能写入或按索引查询")
+
+        is_new = not os.path.exists(self.db_file)
+        # 保存在主线程执行，备份在后台线程复制数据库文件，都持有管理器的锁（见 LeaveRecordManager.paused_writes）
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS leave_entries (
+                date TEXT NOT NULL,
+                student_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                PRIMARY KEY (date, student_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entry_date ON leave_entries (date);
+            CREATE INDEX IF NOT EXISTS idx_entry_student_date ON leave_entries (student_id, date);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn = conn
+
+        if is_new:
+            self._migrate_from_json()
+        else:
+            self._migrate_name_table()
+        return conn
+
+    def _migrate_from_json(self):
+        """一次性迁移：把现有的 leave_records.json（含未压缩的日志）导入数据库"""
+        records = JsonLeaveStorage(self.json_file, self.students).load()
+        if not records:
+            return
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO leave_entries (date, student_id, type) VALUES (?, ?, ?)",
+                [(date, student_id, leave_type)
+                 for date, day_records in records.items()
+                 for student_id, leave_type in day_records.items()]
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                               (os.path.basename(self.json_file),))
+
+    def _migrate_name_table(self):
+        """旧版数据库按姓名保存在 leave_records 表中，转换为按编号保存后删除旧表"""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'leave_records'").fetchone()
+        if not exists:
+            return
+
+        rows = self._conn.execute("SELECT date, name, type FROM leave_records").fetchall()
+        ids = self.students.ensure_ids({name for _, name, _ in rows})
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO leave_entries (date, student_id, type) VALUES (?, ?, ?)",
+                [(date, ids[name], leave_type) for date, name, leave_type in rows]
+            )
+            self._conn.execute("DROP TABLE leave_records")
+
+    def _load_read_only(self) -> Dict[str, Dict[int, str]]:
+        """只读加载：数据库还不存在（尚未从JSON迁移）时读JSON，旧版按姓名保存的表只在内存中转换为编号"""
+        if not os.path.exists(self.db_file):
+            return JsonLeaveStorage(self.json_file, self.students, read_only=True).load()
+        uri = 'file:' + urllib.request.pathname2url(os.path.abspath(self.db_file)) + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            records = {}
+            if 'leave_entries' in tables:
+                for date, student_id, leave_type in conn.execute(
+                        "SELECT date, student_id, type FROM leave_entries ORDER BY date"):
+                    records.setdefault(date, {})[student_id] = leave_type
+            if 'leave_records' in tables:
+                rows = conn.execute("SELECT date, name, type FROM leave_records").fetchall()
+                ids = self.students.ensure_ids({name for _, name, _ in rows})
+                for date, name, leave_type in rows:
+                    records.setdefault(date, {})[ids[name]] = leave_type
+            return records
+        finally:
+            conn.close()
+
+    def load(self) -> Dict[str, Dict[int, str]]:
+        """加载全部请假记录到内存，返回 {date: {学生编号: type}}"""
+        if self.read_only:
+            return self._load_read_only()
+        records = {}
+        cursor = self._connect().execute("SELECT date, student_id, type FROM leave_entries ORDER BY date")
+        for date, student_id, leave_type in cursor:
+            records.setdefault(date, {})[student_id] = leave_type
+        return records
+
+    def write_day(self, date: str, day_records: Dict[int, str], columns: 'LeaveColumns'):
+        """在一个事务中整体替换某天的记录"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM leave_entries WHERE date = ?", (date,))
+            conn.executemany(
+                "INSERT INTO leave_entries (date, student_id, type) VALUES (?, ?, ?)",
+                [(date, student_id, leave_type) for student_id, leave_type in day_records.items()]
+            )
+
+    def write_all(self, columns: 'LeaveColumns'):
+        """在一个事务中写入全部记录"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM leave_entries")
+            conn.executemany(
+                "INSERT INTO leave_entries (date, student_id, type) VALUES (?, ?, ?)",
+                [(date, student_id, leave_type)
+                 for date, day_records in columns.iter_days()
+                 for student_id, leave_type in day_records.items()]
+            )
+
+    def compact(self, columns: 'LeaveColumns'):
+        """每次修改都已直接写入数据库，无需压缩"""
+        pass
+
+    def query_range(self, start_date: str, end_date: str) -> Dict[str, Dict[int, str]]:
+        """按日期索引查询范围内的记录，返回 {date: {学生编号: type}}"""
+        records = {}
+        cursor = self._connect().execute(
+            "SELECT date, student_id, type FROM leave_entries WHERE date BETWEEN ? AND ? ORDER BY date",
+            (start_date, end_date)
+        )
+        for date, student_id, leave_type in cursor:
+            records.setdefault(date, {})[student_id] = leave_type
+        return records
+
+    def query_student(self, student_id: int, start_date: str, end_date: str) -> List[Tuple[str, str]]:
+        """按 (student_id, date) 索引查询某学生的记录，返回按日期排序的 [(date, type)]"""
+        cursor = self._connect().execute(
+            "SELECT date, type FROM leave_entries WHERE student_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (student_id, start_date, end_date)
+        )
+        return cursor.fetchall()
+
+    def prepare_restore(self, file_names: List[str]):
+        """恢复备份前调用：关闭数据库；若备份中没有数据库文件，则删除它以便从恢复的JSON重新迁移"""
+        self.close()
+        if os.path.basename(self.db_file) not in file_names and os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def close(self):
+        """关闭数据库连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# 日期键解析缓存的条目数（约 45 年的日期）
+DATE_KEY_CACHE_SIZE = 16384
+
+
+@functools.lru_cache(maxsize=DATE_KEY_CACHE_SIZE)
+def parse_date_key(date_str: str) -> Tuple[int, int]:
+    """解析 'YYYY-MM-DD'，返回 (日期序数, 星期几)
+
+    每个日期键只用 strptime 解析一次，之后直接命中缓存；格式无效时抛出 ValueError。
+    """
+    ordinal = datetime.datetime.strptime(date_str, "%Y-%m-%d").toordinal()
+    # date.toordinal() 的 1 是周一
+    return ordinal, (ordinal + 6) % 7
+
+
+def to_ordinal(date_str: str) -> int:
+    """把 'YYYY-MM-DD' 转换为日期序数（date.toordinal）"""
+    return parse_date_key(date_str)[0]
+
+
+def date_weekday(date_str: str) -> int:
+    """'YYYY-MM-DD' 是星期几，0=周一, 6=周日"""
+    return parse_date_key(date_str)[1]
+
+
+@functools.lru_cache(maxsize=DATE_KEY_CACHE_SIZE)
+def from_ordinal(ordinal: int) -> str:
+    """把日期序数转换回 'YYYY-MM-DD'"""
+    return datetime.date.fromordinal(ordinal).strftime("%Y-%m-%d")
+
+
+def week_range(day: Optional[datetime.date] = None) -> Tuple[str, str]:
+    """day 所在周（周一到周日）的起止日期，默认本周"""
+    day = day or datetime.date.today()
+    monday = day - datetime.timedelta(days=day.weekday())
+    return monday.strftime("%Y-%m-%d"), (monday + datetime.timedelta(days=6)).strftime("%Y-%m-%d")
+
+
+def month_range(day: Optional[datetime.date] = None) -> Tuple[str, str]:
+    """day 所在月的起止日期，默认本月"""
+    day = day or datetime.date.today()
+    if day.month == 12:
+        next_month = datetime.date(day.year + 1, 1, 1)
+    else:
+        next_month = datetime.date(day.year, day.month + 1, 1)
+    return day.replace(day=1).strftime("%Y-%m-%d"), (next_month - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class LeaveColumns:
+    """列式存储的请假记录
+
+    学生存为名单表中的整数编号，日期存为 date.toordinal()，请假类型存为一个字节，
+    三列按 (日期, 学生编号) 排序存放在并行的 array 中，十年全校数据也只占几兆内存。
+    """
+
+    TYPE_NAMES = ("half", "full")
+    TYPE_CODES = {"half": 0, "full": 1}
+
+    def __init__(self, names: List[str]):
+        self.names = names   # 编号 -> 姓名，与 StudentManager 共用同一个名单表
+        self.ordinals = array('i')
+        self.student_ids = array('i')
+        self.types = array('b')
+        self.day_count = 0   # 有记录的天数
+
+    @classmethod
+    def from_records(cls, records: Dict[str, Dict[int, str]], names: List[str]) -> 'LeaveColumns':
+        """从 {date: {学生编号: type}} 构建，无法解析的日期会被忽略"""
+        columns = cls(names)
+        rows = []
+        for date_str, day_records in records.items():
+            try:
+                ordinal = to_ordinal(date_str)
+            except ValueError:
+                continue
+            for student_id, leave_type in day_records.items():
+                rows.append((ordinal, student_id, cls.TYPE_CODES.get(leave_type, 0)))
+        rows.sort()
+        columns.ordinals = array('i', (row[0] for row in rows))
+        columns.student_ids = array('i', (row[1] for row in rows))
+        columns.types = array('b', (row[2] for row in rows))
+        columns.day_count = len(set(columns.ordinals))
+        return columns
+
+    def bounds(self, start_ordinal: int, end_ordinal: int) -> Tuple[int, int]:
+        """日期范围 [start, end] 在各列中对应的下标区间"""
+        return (bisect.bisect_left(self.ordinals, start_ordinal),
+                bisect.bisect_right(self.ordinals, end_ordinal))
+
+    def day(self, ordinal: int) -> Dict[int, str]:
+        """某天的记录 {学生编号: "half"/"full"}"""
+        lo, hi = self.bounds(ordinal, ordinal)
+        return {self.student_ids[i]: self.TYPE_NAMES[self.types[i]] for i in range(lo, hi)}
+
+    def get_type(self, ordinal: int, student_id: int) -> Optional[str]:
+        """某学生某天的请假类型，没有记录时返回 None"""
+        lo, hi = self.bounds(ordinal, ordinal)
+        i = bisect.bisect_left(self.student_ids, student_id, lo, hi)
+        if i < hi and self.student_ids[i] == student_id:
+            return self.TYPE_NAMES[self.types[i]]
+        return None
+
+    def replace_day(self, ordinal: int, day_records: Dict[int, str]):
+        """整体替换某天的记录 {学生编号: type}（空字典表示清空该天）"""
+        lo, hi = self.bounds(ordinal, ordinal)
+        rows = sorted((student_id, self.TYPE_CODES.get(leave_type, 0))
+                      for student_id, leave_type in day_records.items())
+        self.day_count += (1 if rows else 0) - (1 if hi > lo else 0)
+        self.ordinals[lo:hi] = array('i', [ordinal] * len(rows))
+        self.student_ids[lo:hi] = array('i', (row[0] for row in rows))
+        self.types[lo:hi] = array('b', (row[1] for row in rows))
+
+    def iter_ordinals(self):
+        """按顺序遍历有记录的日期序数"""
+        previous = None
+        for ordinal in self.ordinals:
+            if ordinal != previous:
+                yield ordinal
+                previous = ordinal
+
+    def iter_days(self):
+        """按日期顺序遍历 (date, {学生编号: type})"""
+        ordinals, student_ids, types, type_names = self.ordinals, self.student_ids, self.types, self.TYPE_NAMES
+        i, total = 0, len(ordinals)
+        while i < total:
+            ordinal = ordinals[i]
+            day_records = {}
+            while i < total and ordinals[i] == ordinal:
+                day_records[student_ids[i]] = type_names[types[i]]
+                i += 1
+            yield from_ordinal(ordinal), day_records
+
+    def nbytes(self) -> int:
+        """三列数组占用的字节数"""
+        return sum(column.itemsize * len(column) for column in (self.ordinals, self.student_ids, self.types))
+
+
+class LeaveRecordsView(Mapping):
+    """列式记录的只读字典视图 {date: {name: {"type": ...}}}，兼容按字典读取记录的旧代码
+
+    修改请通过 LeaveRecordManager 的方法进行
+    """
+
+    def __init__(self, columns: LeaveColumns):
+        self._columns = columns
+
+    def __getitem__(self, date_str: str) -> Dict:
+        try:
+            ordinal = to_ordinal(date_str)
+        except (ValueError, TypeError):
+            raise KeyError(date_str)
+        day_records = self._columns.day(ordinal)
+        if not day_records:
+            raise KeyError(date_str)
+        names = self._columns.names
+        return {names[student_id]: {"type": leave_type} for student_id, leave_type in day_records.items()}
+
+    def __contains__(self, date_str) -> bool:
+        try:
+            ordinal = to_ordinal(date_str)
+        except (ValueError, TypeError):
+            return False
+        lo, hi = self._columns.bounds(ordinal, ordinal)
+        return hi > lo
+
+    def __iter__(self):
+        for ordinal in self._columns.iter_ordinals():
+            yield from_ordinal(ordinal)
+
+    def __len__(self) -> int:
+        return self._columns.day_count
+
+
+def memoize_by_version(extra_key=None, copy_result=False):
+    """按 (方法名, 参数, 数据版本) 缓存 LeaveRecordManager 读方法的结果
+
+    数据未修改时重复刷新界面直接命中缓存；任何修改都会递增 data_version，旧结果自然失效。
+    extra_key 用于结果还依赖其他因素的方法（如依赖今天日期的常请假名单）。
+    缓存的结果由多个调用方共享，被缓存的方法应返回不可变对象（元组、冻结的数据类）；
+    返回字典等可变结构的方法设置 copy_result，每次返回缓存结果的深拷贝。
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (method.__name__, args, tuple(sorted(kwargs.items())), self.data_version,
+                   extra_key() if extra_key else None)
+            cache = self._query_cache
+            if key in cache:
+                cache.move_to_end(key)
+                value = cache[key]
+            else:
+                value = method(self, *args, **kwargs)
+                cache[key] = value
+                if len(cache) > self.QUERY_CACHE_SIZE:
+                    cache.popitem(last=False)
+            return copy.deepcopy(value) if copy_result else value
+        return wrapper
+    return decorator
+
+
+@dataclass(frozen=True)
+class DailyStatRow:
+    """统计结果中的一天"""
+    date: str
+    weekday: int  # 0=周一, 6=周日
+    full_students: Tuple[str, ...]
+    half_students: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class WeekdayStat:
+    """按工作日/周六/周日分类的汇总"""
+    half_days: int = 0
+    full_days: int = 0
+    students: Tuple[str, ...] = ()
+    dates: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class StatisticsResult:
+    """统计查询结果，统计界面、Excel导出和 get_statistics 共用
+
+    结果会被缓存并在多个调用方之间共享，因此是冻结的：名单为元组，student_totals 为只读映射。
+    """
+    start_date: str
+    end_date: str
+    student: Optional[str]  # None 表示全部学生
+    rows: Tuple[DailyStatRow, ...] = ()
+    total_half_days: int = 0
+    total_full_days: int = 0
+    weekdays: WeekdayStat = field(default_factory=WeekdayStat)
+    saturdays: WeekdayStat = field(default_factory=WeekdayStat)
+    sundays: WeekdayStat = field(default_factory=WeekdayStat)
+    student_totals: Mapping = field(default_factory=lambda: MappingProxyType({}))  # 姓名 -> (半天, 全天)
+
+    def bucket(self, weekday: int) -> WeekdayStat:
+        """获取某个星期几所属的分类"""
+        if weekday == 6:
+            return self.sundays
+        if weekday == 5:
+            return self.saturdays
+        return self.weekdays
+
+
+class LeaveRecordManager:
+    """请假记录管理（改进版 - 添加原子性保护和线程安全）"""
+
+    # 可选的存储方式
+    STORAGE_BACKENDS = ("json", "sqlite")
+
+    # 读方法结果缓存（LRU）的条目数
+    QUERY_CACHE_SIZE = 64
+
+    # 范围内记录数达到该值且安装了 NumPy 时，统计走向量化路径
+    NUMPY_MIN_RECORDS = 2000
+
+    def __init__(self, data_file: str = "leave_records.json", backend: str = "json",
+                 students: Optional[StudentManager] = None, data_dir: str = "data", read_only: bool = False):
+        # 只读方式（报表、命令行）加载时不写任何文件，数据文件由界面程序负责维护
+        self.read_only = read_only
+        # 确保data文件夹存在
+        if not read_only and not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+        self.data_file = os.path.join(data_dir, data_file)
+        self.backend = backend if backend in self.STORAGE_BACKENDS else "json"
+        # 名单表：记录中只保存学生编号，姓名通过名单表对应
+        self.students = students if students is not None else StudentManager(data_dir=data_dir, read_only=read_only)
+        self.storage = self._create_storage(self.backend, read_only)
+        # SQLite存储的范围统计和个人历史走数据库索引；只读加载时全部记录都在内存中，直接查内存
+        self._indexed_queries = self.backend == "sqlite" and not read_only
+        # 内存中以列式数组存放全部记录，records 是兼容旧代码的字典视图
+        self.columns = LeaveColumns(self.students.names_by_id)
+        self.records = LeaveRecordsView(self.columns)  # {date: {name: {"type": "half"/"full"}}}
+        # 有序日期索引，范围查询用二分定位，只访问窗口内的日期
+        self._dates = []
+        # 学生编号 -> 有序日期 的倒排索引，个人历史和个人统计只访问该学生自己的记录
+        self._student_dates = {}
+        # 常请假名单：当前统计窗口 (days, start, end) 内每个学生的请假天数，保存时增量更新
+        self._frequent_window = None
+        self._frequent_counts = defaultdict(int)
+        # 数据版本号：每次修改递增，用于判断缓存是否过期
+        self.data_version = 0
+        self._query_cache = OrderedDict()  # {(方法名, 参数, 数据版本, 附加键): 结果}
+
+        # 添加数据锁，防止并发写入
+        self._lock = threading.Lock()
+
+        self.load_records()
+
+    def _create_storage(self, backend: str, read_only: bool = False):
+        """创建该班级数据文件对应的存储"""
+        if backend == "sqlite":
+            db_file = os.path.splitext(self.data_file)[0] + '.db'
+            return SqliteLeaveStorage(db_file, self.data_file, self.students, read_only)
+        return JsonLeaveStorage(self.data_file, self.students, read_only)
+
+    def copy_to_backend(self, backend: str):
+        """把内存中的全部记录写入另一种存储（切换存储方式时调用）
+
+        两种存储各自保存一份数据，使用其中一种时另一种不会更新，切换前必须先复制，
+        否则切换后看到的是上次切换时的旧数据。
+        """
+        if backend == self.backend or backend not in self.STORAGE_BACKENDS:
+            return
+        if self.storage.snapshot_error is not None:
+            # 内存中只有日志里的修改，复制过去再切换，历史记录就看不到了
+            raise PermissionError(self.storage.snapshot_error)
+        storage = self._create_storage(backend)
+        try:
+            with self._lock:
+                storage.write_all(self.columns)
+        finally:
+            storage.close()
+
+    def load_records(self):
+        """加载请假记录"""
+        with self._lock:
+            self.columns = LeaveColumns.from_records(self.storage.load(), self.students.names_by_id)
+            self.records = LeaveRecordsView(self.columns)
+            # 名单文件丢失或损坏时，记录中的编号可能超出名单表，补占位姓名，避免按编号取姓名时出错
+            missing = self.students.fill_missing_ids(max(self.columns.student_ids, default=-1) + 1)
+            if missing:
+                self.students.load_warnings.append(f"请假记录中有 {missing} 个学生编号在学生名单中找不到，"
+                                                   f"暂时显示为 #编号，请检查学生名单文件")
+            if self.storage.needs_upgrade and not self.read_only:
+                # 旧版按姓名保存的数据：名单表已分配编号，改写为按编号保存
+                self.storage.write_all(self.columns)
+            self._dates = []
+            self._student_dates = defaultdict(list)
+            previous = None
+            for ordinal, student_id in zip(self.columns.ordinals, self.columns.student_ids):
+                if ordinal != previous:
+                    self._dates.append(from_ordinal(ordinal))
+                    previous = ordinal
+                self._student_dates[student_id].append(self._dates[-1])
+            self._student_dates = dict(self._student_dates)
+            # 下次查询常请假名单时重新计数
+            self._frequent_window = None
+            self.data_version += 1
+
+    def _sync_date_index(self, date: str):
+        """修改某天记录后同步有序日期索引（调用方需持有锁）"""
+        pos = bisect.bisect_left(self._dates, date)
+        indexed = pos < len(self._dates) and self._dates[pos] == date
+        if date in self.records and not indexed:
+            self._dates.insert(pos, date)
+        elif date not in self.records and indexed:
+            del self._dates[pos]
+
+    def _sync_student_index(self, date: str, student_ids):
+        """修改某天记录后同步这些学生的倒排索引（调用方需持有锁）"""
+        day_records = self.columns.day(to_ordinal(date))
+        for student_id in student_ids:
+            dates = self._student_dates.setdefault(student_id, [])
+            pos = bisect.bisect_left(dates, date)
+            indexed = pos < len(dates) and dates[pos] == date
+            if student_id in day_records and not indexed:
+                dates.insert(pos, date)
+            elif student_id not in day_records and indexed:
+                del dates[pos]
+                if not dates:
+                    del self._student_dates[student_id]
+
+    def save_records(self):
+        """保存全部请假记录（JSON存储会写入完整快照并压缩日志）"""
+        with self._lock:
+            self.storage.write_all(self.columns)
+
+    def save_day_records(self, date: str, day_records: Dict[str, str]):
+        """按天保存请假记录：整体替换该天记录，只写入这一天而不重写整个文件
+
+        day_records 为 {name: "half"/"full"}，为空时清空该天记录
+        """
+        ordinal = to_ordinal(date)
+        date = from_ordinal(ordinal)
+        with self._lock:
+            # 新姓名先在名单表中分配编号并保存，再写入记录
+            ids = self.students.ensure_ids(day_records)
+            day_records = {ids[name]: leave_type for name, leave_type in day_records.items()}
+            old_day = self.columns.day(ordinal)
+            self._replace_day(ordinal, date, day_records, old_day)
+            try:
+                self.storage.write_day(date, day_records, self.columns)
+            except Exception as e:
+                # 写入失败时回滚内存中的该天数据
+                self._replace_day(ordinal, date, old_day, day_records)
+                raise e
+
+    def _replace_day(self, ordinal: int, date: str, day_records: Dict[int, str], old_day: Dict[int, str]):
+        """在内存中整体替换某天记录 {学生编号: type} 并同步各索引（调用方需持有锁）"""
+        self.columns.replace_day(ordinal, day_records)
+        self._sync_date_index(date)
+        self._sync_student_index(date, set(old_day) | set(day_records))
+        self._update_frequent_counts(date, old_day, day_records)
+        self.data_version += 1
+
+    def compact(self):
+        """合并未压缩的日志（退出程序前调用）"""
+        with self._lock:
+            self.storage.compact(self.columns)
+
+    @contextlib.contextmanager
+    def paused_writes(self):
+        """在 with 块内暂停写入（持有数据锁），用于备份时复制数据文件
+
+        保存会等待复制完成，复制到的不会是写了一半的数据库事务或正在压缩的日志。
+        """
+        with self._lock:
+            yield
+
+    def prepare_restore(self, file_names: List[str]):
+        """恢复备份前释放数据文件，file_names 为备份中包含的文件名"""
+        with self._lock:
+            self.storage.prepare_restore(file_names)
+
+    def _query_range(self, start_date: str, end_date: str) -> Dict[str, Dict[int, str]]:
+        """获取日期范围内的记录 {date: {学生编号: type}}"""
+        if self._indexed_queries:
+            with self._lock:
+                return self.storage.query_range(start_date, end_date)
+        return {date_str: self.columns.day(to_ordinal(date_str))
+                for date_str in self.get_dates_in_range(start_date, end_date)}
+
+    def add_leave(self, date: str, name: str, leave_type: str):
+        """添加请假记录（改进版 - 不立即保存）"""
+        ordinal = to_ordinal(date)
+        with self._lock:
+            student_id = self.students.ensure_ids([name])[name]
+            old_day = self.columns.day(ordinal)
+            day_records = dict(old_day)
+            day_records[student_id] = leave_type
+            self._replace_day(ordinal, from_ordinal(ordinal), day_records, old_day)
+            # 移除立即保存，由调用方统一保存
+
+    def remove_leave(self, date: str, name: str):
+        """删除请假记录（改进版 - 不立即保存）"""
+        ordinal = to_ordinal(date)
+        with self._lock:
+            student_id = self.students.student_id(name)
+            old_day = self.columns.day(ordinal)
+            if student_id in old_day:
+                day_records = dict(old_day)
+                del day_records[student_id]
+                self._replace_day(ordinal, from_ordinal(ordinal), day_records, old_day)
+                # 移除立即保存，由调用方统一保存
+    
+    def update_leave(self, date: str, name: str, leave_type: str):
+        """更新请假记录"""
+        ordinal = to_ordinal(date)
+        with self._lock:
+            student_id = self.students.student_id(name)
+            old_day = self.columns.day(ordinal)
+            if student_id in old_day:
+                day_records = dict(old_day)
+                day_records[student_id] = leave_type
+                self._replace_day(ordinal, from_ordinal(ordinal), day_records, old_day)
+                self.storage.write_day(from_ordinal(ordinal), day_records, self.columns)
+
+    def rename_student(self, old_name: str, new_name: str) -> bool:
+        """修改学生姓名：记录按编号保存，只需修改名单表，不改写任何一天的记录"""
+        with self._lock:
+            if not self.students.rename_student(old_name, new_name):
+                return False
+            # 缓存的统计结果中是旧姓名
+            self.data_version += 1
+            return True
+    
+    def get_leave_records(self, date: str) -> Dict[str, str]:
+        """获取某天的请假记录"""
+        return self.records.get(date, {})
+    
+    @memoize_by_version()
+    def get_all_dates(self) -> Tuple[str, ...]:
+        """获取所有有记录的日期"""
+        return tuple(self._dates)
+
+    def get_dates_in_range(self, start_date: str, end_date: str) -> List[str]:
+        """获取日期范围内有记录的日期（有序，二分定位）"""
+        lo = bisect.bisect_left(self._dates, start_date)
+        hi = bisect.bisect_right(self._dates, end_date)
+        return self._dates[lo:hi]
+    
+    @memoize_by_version(extra_key=lambda: datetime.date.today())
+    def get_frequent_leavers(self, days: int = 5, threshold: int = 3) -> Tuple[str, ...]:
+        """获取常请假的学生"""
+        # 统计窗口为包含今天在内的最近 days 天
+        today = datetime.date.today().toordinal()
+        start_date = from_ordinal(today - days + 1)
+        end_date = from_ordinal(today)
+
+        with self._lock:
+            window = self._frequent_window
+            if window is None or window[0] != days or start_date < window[1]:
+                # 首次查询或统计天数变化：只按窗口内的日期重新计数
+                self._frequent_counts = defaultdict(int)
+                for date_str in self.get_dates_in_range(start_date, end_date):
+                    for student_id in self.columns.day(to_ordinal(date_str)):
+                        self._frequent_counts[student_id] += 1
+            elif start_date != window[1]:
+                # 跨天：移出滑出窗口的日期，加入新进入窗口的日期
+                expired_end = from_ordinal(today - days)
+                entered_start = max(start_date, from_ordinal(to_ordinal(window[2]) + 1))
+                for date_str in self.get_dates_in_range(window[1], min(expired_end, window[2])):
+                    self._count_frequent(self.columns.day(to_ordinal(date_str)), -1)
+                for date_str in self.get_dates_in_range(entered_start, end_date):
+                    self._count_frequent(self.columns.day(to_ordinal(date_str)), 1)
+            self._frequent_window = (days, start_date, end_date)
+
+            names = self.columns.names
+            return tuple(names[student_id] for student_id, count in self._frequent_counts.items() if count >= threshold)
+
+    def _count_frequent(self, student_ids, delta: int):
+        """调整常请假计数（调用方需持有锁）"""
+        for student_id in student_ids:
+            self._frequent_counts[student_id] += delta
+            if self._frequent_counts[student_id] <= 0:
+                del self._frequent_counts[student_id]
+
+    def _update_frequent_counts(self, date: str, old_ids, new_ids):
+        """某天记录变化后增量更新常请假计数（调用方需持有锁）"""
+        window = self._frequent_window
+        if window is None or not (window[1] <= date <= window[2]):
+            return
+        old_ids, new_ids = set(old_ids), set(new_ids)
+        if old_ids == new_ids:
+            return
+        self._count_frequent(old_ids - new_ids, -1)
+        self._count_frequent(new_ids - old_ids, 1)
+    
+    def get_student_leave_history(self, name: str) -> Dict[str, str]:
+        """获取某学生的请假历史"""
+        return self.get_student_records(name)
+
+    def get_student_records(self, name: str, start_date: str = "", end_date: str = "9999-12-31") -> List[Tuple[str, str]]:
+        """获取某学生在日期范围内的记录，按日期排序的 [(date, type)]"""
+        student_id = self.students.student_id(name)
+        if student_id is None:
+            return []
+        if self._indexed_queries:
+            with self._lock:
+                return self.storage.query_student(student_id, start_date, end_date)
+        dates = self._student_dates.get(student_id, [])
+        lo = bisect.bisect_left(dates, start_date)
+        hi = bisect.bisect_right(dates, end_date)
+        return [(date_str, self.columns.get_type(to_ordinal(date_str), student_id)) for date_str in dates[lo:hi]]
+    
+    @memoize_by_version()
+    def query_statistics(self, start_date: str, end_date: str, student: Optional[str] = None) -> StatisticsResult:
+        """统计查询：按天汇总全天/半天名单，并按工作日/周六/周日分类
+
+        student 为 None 时统计全部学生，否则只统计该学生。结果按 (范围, 学生, 数据版本)
+        缓存，数据未修改时统计界面和导出共用同一份（冻结的）结果。
+        """
+        if student is None and not self._indexed_queries and np is not None:
+            lo, hi = self._column_bounds(start_date, end_date)
+            if hi - lo >= self.NUMPY_MIN_RECORDS:
+                return self._aggregate_columns_numpy(start_date, end_date, lo, hi)
+
+        if student is not None:
+            day_items = [(date_str, [(student, leave_type)])
+                         for date_str, leave_type in self.get_student_records(student, start_date, end_date)]
+        elif self._indexed_queries:
+            names = self.columns.names
+            day_items = [(date_str, [(names[student_id], leave_type) for student_id, leave_type in records.items()])
+                         for date_str, records in self._query_range(start_date, end_date).items()]
+        else:
+            day_items = self._column_day_items(start_date, end_date)
+
+        rows = []
+        student_totals = defaultdict(lambda: [0, 0])
+        # 分类编号：0=工作日, 1=周六, 2=周日；每类为 [半天, 全天, 学生集合, 日期列表]
+        buckets = [[0, 0, set(), []] for _ in range(3)]
+        for date_str, entries in day_items:
+            try:
+                weekday = date_weekday(date_str)
+            except ValueError:
+                continue
+
+            full_students = tuple(sorted(name for name, leave_type in entries if leave_type == "full"))
+            half_students = tuple(sorted(name for name, leave_type in entries if leave_type != "full"))
+            for name in full_students:
+                student_totals[name][1] += 1
+            for name in half_students:
+                student_totals[name][0] += 1
+            rows.append(DailyStatRow(date_str, weekday, full_students, half_students))
+
+            bucket = buckets[max(weekday - 4, 0)]
+            bucket[0] += len(half_students)
+            bucket[1] += len(full_students)
+            bucket[2].update(full_students + half_students)
+            bucket[3].append(date_str)
+
+        weekdays, saturdays, sundays = (WeekdayStat(half_days, full_days, tuple(sorted(students)), tuple(dates))
+                                        for half_days, full_days, students, dates in buckets)
+        return StatisticsResult(
+            start_date, end_date, student, tuple(rows),
+            total_half_days=sum(bucket[0] for bucket in buckets),
+            total_full_days=sum(bucket[1] for bucket in buckets),
+            weekdays=weekdays, saturdays=saturdays, sundays=sundays,
+            student_totals=MappingProxyType({name: tuple(student_totals[name]) for name in sorted(student_totals)}))
+
+    def _column_bounds(self, start_date: str, end_date: str) -> Tuple[int, int]:
+        """日期范围在列数组中对应的 [lo, hi) 下标"""
+        dates = self.get_dates_in_range(start_date, end_date)
+        if not dates:
+            return 0, 0
+        return self.columns.bounds(to_ordinal(dates[0]), to_ordinal(dates[-1]))
+
+    def _aggregate_columns_numpy(self, start_date: str, end_date: str, lo: int, hi: int) -> StatisticsResult:
+        """用 NumPy 对列数组做分组计数，结果与纯 Python 路径完全一致
+
+        按天、按工作日/周六/周日、按学生的半天/全天计数都用 bincount 完成，
+        只有每天的名单需要转换回姓名列表。
+        """
+        columns = self.columns
+        dates = self.get_dates_in_range(start_date, end_date)
+        names = columns.names
+        # 切片会复制出独立的 array，避免 numpy 引用原数组导致其无法扩容
+        ordinals = np.frombuffer(columns.ordinals[lo:hi], dtype=np.intc)
+        student_ids = np.frombuffer(columns.student_ids[lo:hi], dtype=np.intc)
+        is_full = np.frombuffer(columns.types[lo:hi], dtype=np.int8) == LeaveColumns.TYPE_CODES["full"]
+
+        # 每条记录所在的天（与 dates 对齐）
+        day_starts = np.flatnonzero(np.diff(ordinals, prepend=ordinals[0] - 1))
+        day_index = np.cumsum(np.diff(ordinals, prepend=ordinals[0]) != 0)
+        day_count = len(day_starts)
+        day_ordinals = ordinals[day_starts]
+
+        full_per_day = np.bincount(day_index[is_full], minlength=day_count)
+        half_per_day = np.bincount(day_index[~is_full], minlength=day_count)
+
+        # date.toordinal() 的 1 是周一
+        day_weekdays = (day_ordinals.astype(np.int64) + 6) % 7
+        # 分类编号：0=工作日, 1=周六, 2=周日
+        day_buckets = np.clip(day_weekdays - 4, 0, 2)
+        record_buckets = day_buckets[day_index]
+
+        buckets = []
+        for code in range(3):
+            in_bucket = day_buckets == code
+            buckets.append(WeekdayStat(
+                half_days=int(half_per_day[in_bucket].sum()),
+                full_days=int(full_per_day[in_bucket].sum()),
+                students=tuple(sorted(names[i] for i in np.unique(student_ids[record_buckets == code]).tolist())),
+                dates=tuple(dates[i] for i in np.flatnonzero(in_bucket).tolist())))
+
+        student_count = len(names)
+        half_per_student = np.bincount(student_ids[~is_full], minlength=student_count)
+        full_per_student = np.bincount(student_ids[is_full], minlength=student_count)
+        present = np.flatnonzero(half_per_student + full_per_student).tolist()
+        student_totals = {
+            names[i]: (int(half_per_student[i]), int(full_per_student[i]))
+            for i in sorted(present, key=names.__getitem__)
+        }
+
+        # 每天的名单：按 (天, 类型, 姓名) 排序后切分
+        name_rank = np.empty(student_count, dtype=np.int64)
+        name_rank[sorted(range(student_count), key=names.__getitem__)] = np.arange(student_count)
+        order = np.lexsort((name_rank[student_ids], ~is_full, day_index))
+        sorted_names = tuple(names[i] for i in student_ids[order].tolist())
+        full_bounds = (day_starts + full_per_day).tolist()
+        day_bounds = day_starts.tolist() + [hi - lo]
+        weekdays = day_weekdays.tolist()
+        rows = []
+        for i in range(day_count):
+            start, split, end = day_bounds[i], full_bounds[i], day_bounds[i + 1]
+            rows.append(DailyStatRow(dates[i], weekdays[i], sorted_names[start:split], sorted_names[split:end]))
+
+        return StatisticsResult(
+            start_date, end_date, None, tuple(rows),
+            total_half_days=int(half_per_day.sum()), total_full_days=int(full_per_day.sum()),
+            weekdays=buckets[0], saturdays=buckets[1], sundays=buckets[2],
+            student_totals=MappingProxyType(student_totals))
+
+    def _column_day_items(self, start_date: str, end_date: str) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        """直接遍历列数组，按天收集范围内的 [(date, [(name, type)])]"""
+        dates = self.get_dates_in_range(start_date, end_date)
+        if not dates:
+            return []
+
+        columns = self.columns
+        names, ordinals, student_ids, types = columns.names, columns.ordinals, columns.student_ids, columns.types
+        type_names = LeaveColumns.TYPE_NAMES
+        lo, hi = columns.bounds(to_ordinal(dates[0]), to_ordinal(dates[-1]))
+
+        day_items = []
+        i = lo
+        for date_str in dates:
+            ordinal = ordinals[i]
+            entries = []
+            while i < hi and ordinals[i] == ordinal:
+                entries.append((names[student_ids[i]], type_names[types[i]]))
+                i += 1
+            day_items.append((date_str, entries))
+        return day_items
+
+    @memoize_by_version(copy_result=True)
+    def get_statistics(self, start_date: str, end_date: str) -> Dict:
+        """获取统计数据"""
+        result = self.query_statistics(start_date, end_date)
+        stats = {
+            "total_days": len(result.rows),
+            "total_half_days": result.total_half_days,
+            "total_full_days": result.total_full_days,
+            "daily": {}
+        }
+        for key, bucket in (("weekdays", result.weekdays), ("saturdays", result.saturdays),
+                            ("sundays", result.sundays)):
+            stats[key] = {"half_days": bucket.half_days, "full_days": bucket.full_days,
+                          "students": list(bucket.students)}
+        for row in result.rows:
+            stats["daily"][row.date] = {
+                "half_days": len(row.half_students),
+                "full_days": len(row.full_students),
+                "students": list(row.full_students + row.half_students)
+            }
+        return stats
+    
+    @memoize_by_version(copy_result=True)
+    def get_student_statistics(self, name: str, start_date: str, end_date: str) -> Dict:
+        """获取某学生的请假统计"""
+        result = self.query_statistics(start_date, end_date, name)
+        stats = {
+            "total_half_days": result.total_half_days,
+            "total_full_days": result.total_full_days,
+            "records": [{"date": row.date, "type": "full" if row.full_students else "half", "weekday": row.weekday}
+                        for row in result.rows]
+        }
+        for key, bucket in (("weekdays", result.weekdays), ("saturdays", result.saturdays),
+                            ("sundays", result.sundays)):
+            stats[key] = {"half_days": bucket.half_days, "full_days": bucket.full_days,
+                          "dates": list(bucket.dates)}
+        return stats
+
+
+class ClassWorkspace:
+    """一个班级的工作区：该班级数据文件夹对应的名单和请假记录管理器
+
+    read_only 为 True 时只读取数据文件、不写入任何文件，供报表和命令行在界面程序运行时读取数据
+    """
+
+    def __init__(self, name: str, data_dir: str, backend: str = "json", read_only: bool = False):
+        self.name = name
+        self.data_dir = data_dir
+        self.read_only = read_only
+        self.student_manager = StudentManager(data_dir=data_dir, read_only=read_only)
+        self.leave_manager = LeaveRecordManager(backend=backend, students=self.student_manager, data_dir=data_dir,
+                                                read_only=read_only)
+
+    def close(self):
+        """合并日志并释放数据文件"""
+        if not self.read_only:
+            self.leave_manager.compact()
+        self.leave_manager.storage.close()
+
+
+class WorkspaceManager:
+    """多班级工作区管理
+
+    默认班级使用 data 文件夹本身（兼容单班级的旧数据），其他班级各占 data/classes 下的一个文件夹。
+    启动时只加载当前班级；切换班级时在后台线程加载，最近使用的几个班级留在内存中（LRU），
+    切回时无需重新加载。
+    """
+
+    DEFAULT_CLASS = "默认班级"
+    CLASSES_DIR = "classes"
+
+    # 内存中保留的班级数（包括当前班级）
+    WARM_CLASSES = 4
+
+    def __init__(self, root_dir: str = "data", backend: str = "json"):
+        self.root_dir = root_dir
+        self.backend = backend
+        self._warm = OrderedDict()  # {班级名: ClassWorkspace}，最近使用的在最后
+        self._lock = threading.Lock()
+        # 单线程后台加载，同一时间只加载一个班级
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._pending = {}          # {班级名: Future}
+
+    def class_dir(self, name: str) -> str:
+        """班级的数据文件夹"""
+        if name == self.DEFAULT_CLASS:
+            return self.root_dir
+        return os.path.join(self.root_dir, self.CLASSES_DIR, name)
+
+    def list_classes(self) -> List[str]:
+        """全部班级名（默认班级在最前）"""
+        classes_dir = os.path.join(self.root_dir, self.CLASSES_DIR)
+        names = []
+        if os.path.isdir(classes_dir):
+            names = sorted(entry for entry in os.listdir(classes_dir)
+                           if os.path.isdir(os.path.join(classes_dir, entry)))
+        return [self.DEFAULT_CLASS] + names
+
+    def create_class(self, name: str) -> bool:
+        """新建班级文件夹，名称无效或已存在时返回 False"""
+        if (not StudentManager.is_valid_name(name) or name in ('.', '..')
+                or any(ch in name for ch in '\\/:*?"<>|') or name in self.list_classes()):
+            return False
+        os.makedirs(self.class_dir(name))
+        return True
+
+    def get(self, name: str) -> ClassWorkspace:
+        """获取班级工作区（未加载时在当前线程加载）"""
+        with self._lock:
+            workspace = self._warm.get(name)
+            if workspace is not None:
+                self._warm.move_to_end(name)
+                return workspace
+        workspace = ClassWorkspace(name, self.class_dir(name), self.backend)
+        return self._remember(workspace)
+
+    def load_async(self, name: str) -> concurrent.futures.Future:
+        """在后台线程加载班级，返回 Future；已在内存中时返回已完成的 Future"""
+        with self._lock:
+            workspace = self._warm.get(name)
+            if workspace is not None:
+                self._warm.move_to_end(name)
+                future = concurrent.futures.Future()
+                future.set_result(workspace)
+                return future
+            future = self._pending.get(name)
+            if future is None:
+                future = self._executor.submit(self._load, name)
+                self._pending[name] = future
+            return future
+
+    def _load(self, name: str) -> ClassWorkspace:
+        try:
+            return self._remember(ClassWorkspace(name, self.class_dir(name), self.backend))
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+
+    def _remember(self, workspace: ClassWorkspace) -> ClassWorkspace:
+        """放入 LRU，超出数量时释放最久未用的班级"""
+        evicted = []
+        with self._lock:
+            current = self._warm.get(workspace.name)
+            if current is not None:
+                # 另一个线程已经加载好了，使用已有的那份
+                self._warm.move_to_end(workspace.name)
+                evicted.append(workspace)
+                workspace = current
+            else:
+                self._warm[workspace.name] = workspace
+            while len(self._warm) > self.WARM_CLASSES:
+                evicted.append(self._warm.popitem(last=False)[1])
+        for old in evicted:
+            try:
+                old.close()
+            except Exception as e:
+                print(f"释放班级数据失败: {str(e)}")
+        return workspace
+
+    def copy_to_backend(self, backend: str):
+        """把全部班级的数据复制到另一种存储（切换存储方式时调用，任一班级失败即抛出异常）
+
+        已在内存中的班级直接写入，其他班级临时加载后写入。
+        """
+        for name in self.list_classes():
+            with self._lock:
+                workspace = self._warm.get(name)
+            if workspace is not None:
+                workspace.leave_manager.copy_to_backend(backend)
+                continue
+            workspace = ClassWorkspace(name, self.class_dir(name), self.backend)
+            try:
+                workspace.leave_manager.copy_to_backend(backend)
+            finally:
+                workspace.close()
+
+    def close(self):
+        """退出前释放全部班级"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            workspaces = list(self._warm.values())
+            self._warm.clear()
+        for workspace in workspaces:
+            workspace.close()
@@ -0,0 +1,331 @@
+"""
+班级请假记录系统 - 导出
+把统计结果整理成导出表格并写出 Excel / CSV / JSON，不依赖 tkinter，界面和命令行共用
+"""
+
+import os
+import csv
+import contextlib
+import json
+import queue
+import threading
+from typing import List, Dict, Optional, Callable, Tuple
+import openpyxl
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from leavedata import WEEKDAY_NAMES, StatisticsResult
+import textmeasure
+
+# 支持的导出格式
+EXPORT_FORMATS = ("xlsx", "csv", "json")
+
+
+def build_table_data(result: StatisticsResult) -> List[Dict]:
+    """把统计结果整理成导出表格的行（与统计页表格的列一致）"""
+    table_data = []
+    for row in result.rows:
+        if result.student is None:
+            table_data.append({
+                "date": row.date,
+                "weekday": WEEKDAY_NAMES[row.weekday],
+                "col3": f"{len(row.full_students) + len(row.half_students)}人",
+                "col4": ", ".join(row.full_students),
+                "col5": ", ".join(row.half_students)
+            })
+        else:
+            table_data.append({
+                "date": row.date,
+                "weekday": WEEKDAY_NAMES[row.weekday],
+                "col3": result.student,
+                "col4": "✓" if row.full_students else "",
+                "col5": "✓" if row.half_students else ""
+            })
+    return table_data
+
+
+def table_headers(is_all_students: bool) -> List[str]:
+    """导出表格的表头"""
+    if is_all_students:
+        return ["日期", "星期", "人数", "全天", "半天"]
+    return ["日期", "星期", "姓名", "全天", "半天"]
+
+
+def export_table(table_data: List[Dict], is_all_students: bool, file_path: str, fmt: str = "xlsx",
+                 progress: Optional[Callable[[float], None]] = None):
+    """按格式导出表格，fmt 为 EXPORT_FORMATS 之一"""
+    if fmt == "xlsx":
+        export_table_to_excel(table_data, is_all_students, file_path, progress)
+    elif fmt == "csv":
+        export_table_to_csv(table_data, is_all_students, file_path, progress)
+    elif fmt == "json":
+        export_table_to_json(table_data, is_all_students, file_path)
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+def export_table_to_csv(table_data: List[Dict], is_all_students: bool, file_path: str,
+                        progress: Optional[Callable[[float], None]] = None):
+    """导出 CSV（UTF-8 带 BOM，Excel 直接打开不乱码）"""
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(table_headers(is_all_students))
+        for row_num, data in enumerate(table_data, 1):
+            writer.writerow([data["date"], data["weekday"], data["col3"], data["col4"], data["col5"]])
+            if progress:
+                progress(row_num / len(table_data) * 100)
+
+
+def export_table_to_json(table_data: List[Dict], is_all_students: bool, file_path: str):
+    """导出 JSON，每行一个对象，键为表头"""
+    headers = table_headers(is_all_students)
+    rows = [dict(zip(headers, (data["date"], data["weekday"], data["col3"], data["col4"], data["col5"])))
+            for data in table_data]
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+# Excel 导出的列宽（全部学生统计时第3列为人数，单个学生时为姓名）
+EXCEL_COLUMN_WIDTHS = (15, 10, 50, 50, 50)
+EXCEL_STUDENT_COLUMN_WIDTHS = (15, 10, 15, 50, 50)
+# 估算行高用的字体（Excel 默认的 Calibri 11，列宽 1 约为 7 像素）、单元格左右留白和每行的高度
+EXCEL_FONT = ("Calibri", 11)
+EXCEL_PIXELS_PER_WIDTH = 7
+EXCEL_CELL_PADDING = 5
+EXCEL_LINE_HEIGHT = 15
+# 界面线程预先测量字符宽度时每批处理的行数（每批十几毫秒，批与批之间界面可以响应）
+PRIME_CHUNK_ROWS = 2000
+
+
+def excel_row_lines(values, widths, measure: textmeasure.TextMeasurer) -> int:
+    """按像素宽度估算一行数据在 Excel 中需要显示的行数"""
+    max_lines = 1
+    for value, width in zip(values, widths):
+        if value:
+            max_width = width * EXCEL_PIXELS_PER_WIDTH - EXCEL_CELL_PADDING
+            max_lines = max(max_lines, measure.line_count(str(value), max_width))
+    return max_lines
+
+
+def prime_text_measurer(table_data: List[Dict], chunk_rows: int = PRIME_CHUNK_ROWS):
+    """预先测量导出表格用到的字符（在界面线程调用，导出线程只查缓存）
+
+    返回生成器，每次迭代处理 chunk_rows 行，界面用 after() 逐批调用，大表格也不会长时间占用界面线程。
+    """
+    measure = textmeasure.measurer(EXCEL_FONT)
+    for start in range(0, len(table_data), chunk_rows):
+        measure.prime(str(data[key]) for data in table_data[start:start + chunk_rows]
+                      for key in ("col3", "col4", "col5"))
+        yield
+
+
+class _ExcelRowStyles:
+    """流式导出用的预设样式单元格
+
+    只写模式下每行写出后即写入文件，单元格对象可以在下一行复用。每种样式（行颜色 × 是否加边框、
+    表头、合计行）的每一列各建一个带样式的单元格，写每行时只改值，样式只在这里计算一次。
+    """
+
+    def __init__(self, ws):
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        header_font = Font(bold=True, color="FFFFFF", size=11)
+        header_alignment = Alignment(horizontal="center", vertical="center")
+        # 所有数据列都使用居中对齐和自动换行
+        data_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        fills = {
+            "weekday": PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid"),
+            "saturday": PatternFill(start_color="FFE699", end_color="FFE699", fill_type="solid"),
+            "sunday": PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),
+        }
+        # 细边框样式（用于有数据的单元格）
+        thin_border = Border(
+            left=Side(style='thin', color='000000'),
+            right=Side(style='thin', color='000000'),
+            top=Side(style='thin', color='000000'),
+            bottom=Side(style='thin', color='000000')
+        )
+
+        def make_cells(fill, alignment, font=None, border=None):
+            cells = []
+            for _ in range(5):
+                cell = WriteOnlyCell(ws)
+                cell.fill = fill
+                cell.alignment = alignment
+                if font is not None:
+                    cell.font = font
+                if border is not None:
+                    cell.border = border
+                cells.append(cell)
+            return cells
+
+        self.header = make_cells(header_fill, header_alignment, header_font)
+        self.summary = make_cells(header_fill, header_alignment, header_font)
+        # 合计行第二列为空，不设置字体
+        self.summary[1] = WriteOnlyCell(ws)
+        self.summary[1].fill = header_fill
+        self.summary[1].alignment = header_alignment
+        self.rows = {(kind, has_data): make_cells(fill, data_alignment, border=thin_border if has_data else None)
+                     for kind, fill in fills.items() for has_data in (False, True)}
+
+    @staticmethod
+    def fill(cells, values):
+        for cell, value in zip(cells, values):
+            cell.value = value
+        return cells
+
+
+def export_table_to_excel(table_data: List[Dict], is_all_students: bool, file_path: str,
+                          progress: Optional[Callable[[float], None]] = None):
+    """导出 Excel，progress(百分比) 在写入数据行时回调
+
+    使用 openpyxl 的只写模式流式写出：每行连同行高在写出时即确定，不在内存中保留整张表，
+    内存占用与行数无关。
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("请假记录")
+
+    # 列宽需要在写入第一行之前设置
+    widths = EXCEL_COLUMN_WIDTHS if is_all_students else EXCEL_STUDENT_COLUMN_WIDTHS
+    for col_num, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
+
+    styles = _ExcelRowStyles(ws)
+    measure = textmeasure.measurer(EXCEL_FONT)
+    row_num = 1
+
+    def append(cells, values):
+        nonlocal row_num
+        # 根据内容估算行高；行写出后立即丢弃该行的行高设置，保持内存不随行数增长
+        lines = excel_row_lines(values, widths, measure)
+        if lines > 1:
+            ws.row_dimensions[row_num].height = EXCEL_LINE_HEIGHT * lines
+        ws.append(styles.fill(cells, values))
+        ws.row_dimensions.pop(row_num, None)
+        row_num += 1
+
+    try:
+        ws.append(styles.fill(styles.header, table_headers(is_all_students)))
+        row_num += 1
+
+        total_full_count = 0
+        total_half_count = 0
+        for index, data in enumerate(table_data, 1):
+            values = (data["date"], data["weekday"], data["col3"], data["col4"], data["col5"])
+            if data["weekday"] == "周六":
+                kind = "saturday"
+            elif data["weekday"] == "周日":
+                kind = "sunday"
+            else:
+                kind = "weekday"
+            # 判断该行是否有数据（有数据的行加边框）
+            has_data = any(value and str(value).strip() for value in values[2:])
+            append(styles.rows[(kind, has_data)], values)
+
+            if data["col4"] and str(data["col4"]).strip():
+                total_full_count += 1
+            if data["col5"] and str(data["col5"]).strip():
+                total_half_count += 1
+
+            # 更新进度
+            if progress:
+                progress(index / len(table_data) * 100)
+
+        # 如果是单个学生统计，添加合计行
+        if not is_all_students and table_data:
+            student_name = table_data[0]["col3"]
+            append(styles.summary, ("合计", None, student_name, f"{total_full_count}次", f"{total_half_count}次"))
+
+        # 保存文件
+        wb.save(file_path)
+    except BaseException:
+        # 中途取消或出错：结束工作表的写入并关闭工作簿，未写完的 .part 文件由 ExportJob 删除
+        if not ws.closed:
+            with contextlib.suppress(Exception):
+                ws.close()
+        wb.close()
+        raise
+
+
+class ExportCancelled(Exception):
+    """导出被取消"""
+
+
+class ExportJob:
+    """后台导出任务
+
+    导出在工作线程中进行，不接触任何界面控件；进度和结果放入线程安全的队列，
+    由界面在主线程中用 root.after 定时调用 poll() 取出并更新控件。
+    先写入临时文件，完成后再替换目标文件，取消或失败时不会留下不完整的文件。
+
+    队列中的事件:
+        ("progress", 百分比)  进度变化（整数百分比变化时才发送）
+        ("done", 行数)        导出完成
+        ("cancelled", None)   已取消
+        ("error", 错误信息)   导出失败
+    """
+
+    def __init__(self, table_data: List[Dict], is_all_students: bool, file_path: str, fmt: str = "xlsx"):
+        self.table_data = table_data
+        self.is_all_students = is_all_students
+        self.file_path = file_path
+        self.fmt = fmt
+        self.events = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._last_percent = -1
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'ExportJob':
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """请求取消，工作线程在下一次报告进度时停止"""
+        self._cancel_event.set()
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread.ident is not None:
+            self._thread.join(timeout)
+
+    def poll(self) -> List[Tuple[str, object]]:
+        """取出目前为止的全部事件（不阻塞）"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _progress(self, percent: float):
+        if self._cancel_event.is_set():
+            raise ExportCancelled()
+        percent = int(percent)
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.events.put(("progress", percent))
+
+    def _run(self):
+        temp_path = self.file_path + ".part"
+        try:
+            export_table(self.table_data, self.is_all_students, temp_path, self.fmt, self._progress)
+            if self._cancel_event.is_set():
+                raise ExportCancelled()
+            os.replace(temp_path, self.file_path)
+        except ExportCancelled:
+            self._remove_temp(temp_path)
+            self.events.put(("cancelled", None))
+        except Exception as e:
+            self._remove_temp(temp_path)
+            self.events.put(("error", str(e)))
+        else:
+            self.events.put(("done", len(self.table_data)))
+
+    @staticmethod
+    def _remove_temp(temp_path: str):
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        except OSError:
+            pass
@@ -0,0 +1,205 @@
+"""
+班级请假记录系统 - 报表
+多班级汇总统计（多进程并行）和汇总 Excel 导出，不依赖 tkinter
+"""
+
+import concurrent.futures
+from typing import List, Dict, Optional
+from dataclasses import dataclass, field
+import openpyxl
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+from leavedata import WEEKDAY_NAMES, StudentManager, LeaveRecordManager, WorkspaceManager, date_weekday
+
+
+def class_statistics(data_dir: str, backend: str, start_date: str, end_date: str) -> Dict:
+    """加载一个班级的数据并统计，返回 LeaveRecordManager.get_statistics 的结果
+
+    作为进程池的任务函数，只接收可序列化的参数，每个进程独立读取该班级的数据文件。
+    只读加载，不写入任何文件（界面程序可能正在使用同一份数据）。
+    """
+    students = StudentManager(data_dir=data_dir, read_only=True)
+    manager = LeaveRecordManager(backend=backend, students=students, data_dir=data_dir, read_only=True)
+    try:
+        return manager.get_statistics(start_date, end_date)
+    finally:
+        manager.storage.close()
+
+
+@dataclass
+class AggregateBucket:
+    """工作日/周六/周日分类的多班级汇总"""
+    half_days: int = 0
+    full_days: int = 0
+    students: int = 0  # 请假学生数（不同班级的同名学生分别计数）
+
+
+@dataclass
+class AggregateDay:
+    """多班级汇总中的一天"""
+    date: str
+    weekday: int
+    half_days: int = 0
+    full_days: int = 0
+    classes: Dict[str, tuple] = field(default_factory=dict)  # 班级 -> (半天, 全天)
+
+
+@dataclass
+class AggregateStatistics:
+    """多班级汇总统计结果"""
+    start_date: str
+    end_date: str
+    class_names: List[str] = field(default_factory=list)
+    classes: Dict[str, Dict] = field(default_factory=dict)  # 班级 -> get_statistics 结果
+    days: List[AggregateDay] = field(default_factory=list)
+    total_half_days: int = 0
+    total_full_days: int = 0
+    weekdays: AggregateBucket = field(default_factory=AggregateBucket)
+    saturdays: AggregateBucket = field(default_factory=AggregateBucket)
+    sundays: AggregateBucket = field(default_factory=AggregateBucket)
+    errors: Dict[str, str] = field(default_factory=dict)  # 统计失败的班级 -> 错误信息
+
+
+def merge_class_statistics(start_date: str, end_date: str, per_class: Dict[str, Dict]) -> AggregateStatistics:
+    """把各班级的 get_statistics 结果合并为按天、按工作日/周六/周日的汇总"""
+    result = AggregateStatistics(start_date, end_date, class_names=list(per_class), classes=dict(per_class))
+    days = {}
+    for class_name, stats in per_class.items():
+        result.total_half_days += stats["total_half_days"]
+        result.total_full_days += stats["total_full_days"]
+        for key in ("weekdays", "saturdays", "sundays"):
+            bucket = getattr(result, key)
+            bucket.half_days += stats[key]["half_days"]
+            bucket.full_days += stats[key]["full_days"]
+            bucket.students += len(stats[key]["students"])
+        for date_str, daily in stats["daily"].items():
+            day = days.get(date_str)
+            if day is None:
+                day = days[date_str] = AggregateDay(date_str, date_weekday(date_str))
+            day.half_days += daily["half_days"]
+            day.full_days += daily["full_days"]
+            day.classes[class_name] = (daily["half_days"], daily["full_days"])
+    result.days = [days[date_str] for date_str in sorted(days)]
+    return result
+
+
+def aggregate_statistics(classes: Dict[str, str], start_date: str, end_date: str,
+                         backend: str = "json", max_workers: Optional[int] = None) -> AggregateStatistics:
+    """统计多个班级并合并，classes 为 {班级名: 数据文件夹}
+
+    各班级在进程池中并行统计（默认每个CPU核心一个进程），只有一个班级时直接在当前进程统计。
+    个别班级统计失败不影响其他班级，错误记录在结果的 errors 中。
+    """
+    per_class = {}
+    errors = {}
+    if len(classes) <= 1 or max_workers == 1:
+        for class_name, data_dir in classes.items():
+            try:
+                per_class[class_name] = class_statistics(data_dir, backend, start_date, end_date)
+            except Exception as e:
+                errors[class_name] = str(e)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(class_statistics, data_dir, backend, start_date, end_date): class_name
+                       for class_name, data_dir in classes.items()}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    per_class[futures[future]] = future.result()
+                except Exception as e:
+                    errors[futures[future]] = str(e)
+
+    # 保持传入的班级顺序
+    result = merge_class_statistics(start_date, end_date,
+                                    {name: per_class[name] for name in classes if name in per_class})
+    result.errors = errors
+    return result
+
+
+def workspace_classes(workspaces: WorkspaceManager) -> Dict[str, str]:
+    """工作区中全部班级的 {班级名: 数据文件夹}"""
+    return {name: workspaces.class_dir(name) for name in workspaces.list_classes()}
+
+
+def export_aggregate_to_excel(result: AggregateStatistics, file_path: str):
+    """导出多班级汇总：按天汇总表（每个班级一列）和班级汇总表"""
+    wb = openpyxl.Workbook()
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    center = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    weekday_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+    saturday_fill = PatternFill(start_color="FFE699", end_color="FFE699", fill_type="solid")
+    sunday_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    thin_border = Border(
+        left=Side(style='thin', color='000000'),
+        right=Side(style='thin', color='000000'),
+        top=Side(style='thin', color='000000'),
+        bottom=Side(style='thin', color='000000')
+    )
+
+    def write_header(ws, headers):
+        ws.append(headers)
+        for col_num in range(1, len(headers) + 1):
+            cell = ws.cell(row=1, column=col_num)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = center
+
+    # 按天汇总：每个班级一列，显示 "全天/半天"
+    ws = wb.active
+    ws.title = "按天汇总"
+    headers = ["日期", "星期", "全天人数", "半天人数"] + [f"{name}(全/半)" for name in result.class_names]
+    write_header(ws, headers)
+    for col_num, header in enumerate(headers, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = 15 if col_num == 1 else max(10, len(header) * 2)
+    for row_num, day in enumerate(result.days, 2):
+        row = [day.date, WEEKDAY_NAMES[day.weekday], day.full_days, day.half_days]
+        for name in result.class_names:
+            half_days, full_days = day.classes.get(name, (0, 0))
+            row.append(f"{full_days}/{half_days}" if half_days or full_days else "")
+        ws.append(row)
+        fill = sunday_fill if day.weekday == 6 else saturday_fill if day.weekday == 5 else weekday_fill
+        for col_num in range(1, len(headers) + 1):
+            cell = ws.cell(row=row_num, column=col_num)
+            cell.fill = fill
+            cell.alignment = center
+            cell.border = thin_border
+
+    # 班级汇总
+    ws = wb.create_sheet("班级汇总")
+    headers = ["班级", "全天人次", "半天人次", "工作日全天", "工作日半天",
+               "周六全天", "周六半天", "周日全天", "周日半天", "请假学生数"]
+    write_header(ws, headers)
+    for col_num in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = 15
+    for name in result.class_names:
+        stats = result.classes[name]
+        students = set()
+        for key in ("weekdays", "saturdays", "sundays"):
+            students.update(stats[key]["students"])
+        ws.append([name, stats["total_full_days"], stats["total_half_days"],
+                   stats["weekdays"]["full_days"], stats["weekdays"]["half_days"],
+                   stats["saturdays"]["full_days"], stats["saturdays"]["half_days"],
+                   stats["sundays"]["full_days"], stats["sundays"]["half_days"], len(students)])
+    total_students = sum(len({student for key in ("weekdays", "saturdays", "sundays")
+                              for student in result.classes[name][key]["students"]})
+                         for name in result.class_names)
+    ws.append(["合计", result.total_full_days, result.total_half_days,
+               result.weekdays.full_days, result.weekdays.half_days,
+               result.saturdays.full_days, result.saturdays.half_days,
+               result.sundays.full_days, result.sundays.half_days, total_students])
+    for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
+        for cell in row:
+            cell.alignment = center
+            cell.border = thin_border
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+
+    if result.errors:
+        ws = wb.create_sheet("统计失败")
+        write_header(ws, ["班级", "错误信息"])
+        ws.column_dimensions["A"].width = 15
+        ws.column_dimensions["B"].width = 60
+        for name, error in result.errors.items():
+            ws.append([name, error])
+
+    wb.save(file_path)
@@ -0,0 +1,112 @@
+"""
+班级请假记录系统 - 命令行测试
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+import leavecli
+from leavedata import WorkspaceManager
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """默认班级和一班各有几天记录"""
+    root_dir = str(tmp_path / "data")
+    workspaces = WorkspaceManager(root_dir=root_dir)
+    workspaces.create_class("一班")
+    workspaces.get(WorkspaceManager.DEFAULT_CLASS).leave_manager.save_day_records("2024-03-04", {"张三": "full"})
+    manager = workspaces.get("一班").leave_manager
+    manager.save_day_records("2024-03-04", {"李四": "half"})
+    manager.save_day_records("2024-03-09", {"李四": "full", "王五": "half"})
+    workspaces.close()
+    return root_dir
+
+
+def run(data_dir, *args) -> int:
+    return leavecli.main(["--data-dir", data_dir, *args])
+
+
+def test_classes(data_dir, capsys):
+    assert run(data_dir, "classes") == 0
+    assert capsys.readouterr().out.split() == [WorkspaceManager.DEFAULT_CLASS, "一班"]
+
+
+def test_stats_json(data_dir, capsys):
+    assert run(data_dir, "stats", "--all-classes", "--start", "2024-03-01", "--end", "2024-03-31", "--json") == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["classes"]["一班"]["total_half_days"] == 2
+    assert summary["classes"]["一班"]["saturdays"]["students"] == ["李四", "王五"]
+    assert summary["classes"][WorkspaceManager.DEFAULT_CLASS]["total_full_days"] == 1
+
+
+def test_export_and_aggregate(data_dir, tmp_path):
+    reports = str(tmp_path / "reports")
+    assert run(data_dir, "export", "--all-classes", "--start", "2024-03-01", "--end", "2024-03-31",
+               "--format", "csv", "-o", reports) == 0
+    assert sorted(os.listdir(reports)) == [f"{name}_2024-03-01_2024-03-31.csv"
+                                           for name in sorted([WorkspaceManager.DEFAULT_CLASS, "一班"])]
+
+    student_file = str(tmp_path / "李四.json")
+    assert run(data_dir, "export", "--class", "一班", "--student", "李四", "--start", "2024-03-01",
+               "--end", "2024-03-31", "-o", student_file) == 0
+    assert os.path.exists(student_file)
+
+    aggregate_file = str(tmp_path / "汇总.xlsx")
+    assert run(data_dir, "aggregate", "--all-classes", "--start", "2024-03-01", "--end", "2024-03-31",
+               "--jobs", "1", "-o", aggregate_file) == 0
+    assert os.path.exists(aggregate_file)
+
+
+def test_failed_class_exits_with_1(data_dir, tmp_path, capsys):
+    """有班级处理失败时退出码为 1，其他班级照常处理"""
+    # 一班的数据库文件损坏
+    with open(os.path.join(data_dir, WorkspaceManager.CLASSES_DIR, "一班", "leave_records.db"), "wb") as f:
+        f.write(b"not a database" * 100)
+    assert run(data_dir, "--backend", "sqlite", "stats", "--all-classes", "--start", "2024-03-01",
+               "--end", "2024-03-31", "--json") == 1
+    captured = capsys.readouterr()
+    assert list(json.loads(captured.out)["classes"]) == [WorkspaceManager.DEFAULT_CLASS]
+    assert "一班: 统计失败" in captured.err
+
+    # 输出位置是一个已存在的文件，不能作为文件夹
+    blocker = tmp_path / "blocker"
+    blocker.write_text("", encoding="utf-8")
+    assert run(data_dir, "export", "--all-classes", "--start", "2024-03-01", "-o", str(blocker)) == 1
+
+
+@pytest.mark.parametrize("args", [
+    ["stats", "--class", "不存在"],
+    ["stats", "--start", "2024-13-01"],
+    ["stats", "--start", "2024-03-10", "--end", "2024-03-01"],
+    ["stats", "--range", "week", "--start", "2024-03-01"],
+])
+def test_invalid_arguments_exit_with_message(data_dir, args):
+    with pytest.raises(SystemExit) as excinfo:
+        run(data_dir, *args)
+    assert isinstance(excinfo.value.code, str)
+
+
+def test_missing_data_dir(tmp_path):
+    missing = str(tmp_path / "nope")
+    with pytest.raises(SystemExit) as excinfo:
+        run(missing, "classes")
+    assert "数据文件夹不存在" in excinfo.value.code
+    assert not os.path.exists(missing)
+
+
+def test_process_exit_codes(data_dir):
+    """作为脚本运行时的退出码：成功 0，出错 1，用法错误 2"""
+    script = os.path.join(os.path.dirname(os.path.abspath(leavecli.__file__)), "leavecli.py")
+
+    def exit_code(*args):
+        return subprocess.run([sys.executable, script, "--data-dir", data_dir, *args],
+                              capture_output=True).returncode
+
+    assert exit_code("classes") == 0
+    assert exit_code("stats", "--class", "不存在") == 1
+    assert exit_code("unknown-command") == 2
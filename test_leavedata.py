@@ -0,0 +1,293 @@
+"""
+班级请假记录系统 - 数据层测试
+"""
+
+import os
+import json
+import random
+import datetime
+import types
+
+import pytest
+
+import leavedata
+from leavedata import LeaveRecordManager, StudentManager
+
+
+def make_manager(data_dir, **kwargs) -> LeaveRecordManager:
+    return LeaveRecordManager(data_dir=str(data_dir), **kwargs)
+
+
+def test_journal_replay(tmp_path):
+    """按天保存只追加日志，重新加载时回放日志，压缩后日志清空"""
+    manager = make_manager(tmp_path)
+    manager.save_day_records("2024-03-04", {"张三": "full", "李四": "half"})
+    manager.save_day_records("2024-03-05", {"张三": "half"})
+    manager.save_day_records("2024-03-04", {"李四": "full"})
+    manager.save_day_records("2024-03-05", {})
+
+    assert not os.path.exists(tmp_path / "leave_records.json")
+    with open(tmp_path / "leave_records.journal", encoding="utf-8") as f:
+        assert len(f.readlines()) == 4
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.get_all_dates() == ("2024-03-04",)
+    assert reloaded.get_leave_records("2024-03-04") == {"李四": {"type": "full"}}
+
+    reloaded.compact()
+    assert not os.path.exists(tmp_path / "leave_records.journal")
+    assert make_manager(tmp_path).get_leave_records("2024-03-04") == {"李四": {"type": "full"}}
+
+
+def test_journal_partial_last_line_is_dropped(tmp_path):
+    """异常退出留下的半行日志在加载时截掉，之后追加的记录不受影响"""
+    manager = make_manager(tmp_path)
+    manager.save_day_records("2024-03-04", {"张三": "full"})
+    with open(tmp_path / "leave_records.journal", "a", encoding="utf-8") as f:
+        f.write('{"d":"2024-03-05","i":{"0":')
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.get_all_dates() == ("2024-03-04",)
+    reloaded.save_day_records("2024-03-06", {"张三": "half"})
+    assert make_manager(tmp_path).get_all_dates() == ("2024-03-04", "2024-03-06")
+
+
+def test_corrupt_snapshot_is_never_compacted(tmp_path):
+    """快照文件无法解析时备份一份、提示，并且不再用只含日志的数据覆盖它"""
+    manager = make_manager(tmp_path)
+    manager.save_day_records("2024-03-04", {"张三": "full"})
+    manager.compact()
+    manager.save_day_records("2024-03-05", {"张三": "half"})
+    snapshot = tmp_path / "leave_records.json"
+    snapshot.write_text("{broken", encoding="utf-8")
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.storage.snapshot_error
+    assert reloaded.students.load_warnings
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".corrupt")]
+    assert reloaded.get_all_dates() == ("2024-03-05",)
+
+    reloaded.save_day_records("2024-03-06", {"张三": "full"})
+    reloaded.compact()
+    with pytest.raises(PermissionError):
+        reloaded.save_records()
+    with pytest.raises(PermissionError):
+        reloaded.copy_to_backend("sqlite")
+    assert snapshot.read_text(encoding="utf-8") == "{broken"
+    with open(tmp_path / "leave_records.journal", encoding="utf-8") as f:
+        assert [json.loads(line)["d"] for line in f] == ["2024-03-05", "2024-03-06"]
+
+
+def fill_sample(manager: LeaveRecordManager):
+    """两周多的样例记录，包含周末和修改、清空某天"""
+    manager.save_day_records("2024-03-01", {"张三": "full", "李四": "half"})
+    manager.save_day_records("2024-03-02", {"王五": "full"})
+    manager.save_day_records("2024-03-03", {"张三": "half", "王五": "half"})
+    manager.save_day_records("2024-03-04", {"李四": "full"})
+    manager.save_day_records("2024-03-11", {"张三": "full", "李四": "full", "王五": "half"})
+    manager.save_day_records("2024-03-04", {"李四": "half", "赵六": "full"})
+    manager.save_day_records("2024-03-05", {"张三": "full"})
+    manager.save_day_records("2024-03-05", {})
+
+
+def test_sqlite_migrates_json_records(tmp_path):
+    """首次使用SQLite时导入现有的JSON快照和未压缩的日志"""
+    manager = make_manager(tmp_path)
+    fill_sample(manager)
+    manager.compact()
+    manager.save_day_records("2024-03-12", {"赵六": "half"})
+    expected = manager.get_statistics("2024-01-01", "2024-12-31")
+
+    migrated = make_manager(tmp_path, backend="sqlite")
+    assert os.path.exists(tmp_path / "leave_records.db")
+    assert migrated.get_statistics("2024-01-01", "2024-12-31") == expected
+    migrated.storage.close()
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    ("2024-01-01", "2024-12-31"),
+    ("2024-03-02", "2024-03-04"),
+    ("2024-03-05", "2024-03-05"),
+    ("2025-01-01", "2025-12-31"),
+])
+def test_json_and_sqlite_statistics_match(tmp_path, start_date, end_date):
+    """两种存储对同样的修改给出相同的统计和个人记录"""
+    json_manager = make_manager(tmp_path / "json")
+    sqlite_manager = make_manager(tmp_path / "sqlite", backend="sqlite")
+    for manager in (json_manager, sqlite_manager):
+        fill_sample(manager)
+
+    assert json_manager.query_statistics(start_date, end_date) == sqlite_manager.query_statistics(start_date, end_date)
+    for name in ("张三", "李四", "赵六", "不存在"):
+        assert (json_manager.get_student_records(name, start_date, end_date)
+                == sqlite_manager.get_student_records(name, start_date, end_date))
+        assert (json_manager.get_student_statistics(name, start_date, end_date)
+                == sqlite_manager.get_student_statistics(name, start_date, end_date))
+    sqlite_manager.storage.close()
+
+
+def test_copy_to_backend(tmp_path):
+    """切换存储方式前复制全部记录，之后用另一种存储加载得到相同的数据"""
+    manager = make_manager(tmp_path)
+    fill_sample(manager)
+    make_manager(tmp_path, backend="sqlite").storage.close()
+    # 数据库建好之后的修改只在JSON中，切换前必须复制
+    manager.save_day_records("2024-03-20", {"张三": "half"})
+    manager.copy_to_backend("sqlite")
+
+    sqlite_manager = make_manager(tmp_path, backend="sqlite")
+    assert sqlite_manager.get_all_dates() == manager.get_all_dates()
+    assert sqlite_manager.query_statistics("2024-01-01", "2024-12-31") == manager.query_statistics("2024-01-01", "2024-12-31")
+
+    sqlite_manager.save_day_records("2024-03-21", {"李四": "full"})
+    sqlite_manager.copy_to_backend("json")
+    sqlite_manager.storage.close()
+    assert make_manager(tmp_path).get_leave_records("2024-03-21") == {"李四": {"type": "full"}}
+
+
+class FixedDate(datetime.date):
+    """today() 可以指定的日期，用于模拟跨天"""
+    current = datetime.date(2024, 3, 1)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+def recount_frequent(manager: LeaveRecordManager, today: datetime.date, days: int, threshold: int):
+    counts = {}
+    for offset in range(days):
+        for name in manager.get_leave_records((today - datetime.timedelta(days=offset)).isoformat()):
+            counts[name] = counts.get(name, 0) + 1
+    return sorted(name for name, count in counts.items() if count >= threshold)
+
+
+def test_frequent_leavers_sliding_window(tmp_path, monkeypatch):
+    """逐天前进、窗口内修改记录、改变统计天数时，增量计数都与重新计数一致"""
+    monkeypatch.setattr(leavedata, "datetime", types.SimpleNamespace(
+        date=FixedDate, datetime=datetime.datetime, timedelta=datetime.timedelta))
+    rng = random.Random(7)
+    names = [f"学生{i}" for i in range(12)]
+    manager = make_manager(tmp_path)
+    start = datetime.date(2024, 3, 1)
+    for offset in range(60):
+        day = start + datetime.timedelta(days=offset)
+        manager.save_day_records(day.isoformat(), {name: rng.choice(("half", "full"))
+                                                    for name in rng.sample(names, rng.randint(0, 6))})
+
+    for offset in range(70):
+        today = start + datetime.timedelta(days=offset)
+        FixedDate.current = today
+        days = 5 if offset < 30 else 7
+        if offset % 9 == 0:
+            # 窗口内某天的记录被修改
+            changed = (today - datetime.timedelta(days=1)).isoformat()
+            manager.save_day_records(changed, {name: "full" for name in rng.sample(names, 4)})
+        if offset % 13 == 0:
+            # 跳过几天再查询
+            continue
+        for threshold in (2, 3):
+            assert sorted(manager.get_frequent_leavers(days, threshold)) == recount_frequent(
+                manager, today, days, threshold), (today, days, threshold)
+
+
+def test_memoized_results_are_not_shared_mutably(tmp_path):
+    """缓存的结果不能被调用方改坏，修改记录后缓存失效"""
+    manager = make_manager(tmp_path)
+    fill_sample(manager)
+
+    result = manager.query_statistics("2024-03-01", "2024-03-31")
+    assert manager.query_statistics("2024-03-01", "2024-03-31") is result
+    with pytest.raises(AttributeError):
+        result.rows[0].full_students.append("某人")
+    with pytest.raises(TypeError):
+        result.student_totals["某人"] = (1, 1)
+    assert isinstance(manager.get_all_dates(), tuple)
+    assert isinstance(manager.get_frequent_leavers(), tuple)
+
+    stats = manager.get_statistics("2024-03-01", "2024-03-31")
+    stats["daily"].clear()
+    stats["weekdays"]["students"].append("某人")
+    fresh = manager.get_statistics("2024-03-01", "2024-03-31")
+    assert fresh["daily"] and "某人" not in fresh["weekdays"]["students"]
+
+    manager.save_day_records("2024-03-20", {"张三": "full"})
+    assert manager.query_statistics("2024-03-01", "2024-03-31") is not result
+    assert "2024-03-20" in manager.get_statistics("2024-03-01", "2024-03-31")["daily"]
+
+
+@pytest.mark.skipif(leavedata.np is None, reason="未安装 NumPy")
+def test_numpy_statistics_match_pure_python(tmp_path, monkeypatch):
+    """向量化统计与纯 Python 统计的结果完全一致（包括类型）"""
+    rng = random.Random(5)
+    names = [f"学生{i}" for i in range(60)] + ["alice", "Bob", "张三"]
+    manager = make_manager(tmp_path)
+    for _ in range(200):
+        day = datetime.date(2023, 1, 1) + datetime.timedelta(days=rng.randint(0, 500))
+        manager.save_day_records(day.isoformat(), {name: rng.choice(("half", "full"))
+                                                    for name in rng.sample(names, rng.randint(0, 15))})
+    ranges = [("2023-01-01", "2024-12-31"), ("2023-03-02", "2023-03-02"), ("2023-06-01", "2023-09-30"),
+              ("2030-01-01", "2030-12-31")]
+
+    manager.NUMPY_MIN_RECORDS = 1
+    vectorized = [manager.query_statistics(start_date, end_date) for start_date, end_date in ranges]
+    manager._query_cache.clear()
+    monkeypatch.setattr(leavedata, "np", None)
+    pure = [manager.query_statistics(start_date, end_date) for start_date, end_date in ranges]
+
+    assert vectorized == pure
+    for result in vectorized:
+        assert all(type(row.weekday) is int for row in result.rows)
+        assert all(type(count) is int for totals in result.student_totals.values() for count in totals)
+
+
+def test_legacy_roster_and_records_are_upgraded(tmp_path):
+    """旧版纯姓名名单和按姓名保存的记录：分配编号后改写为新格式，改名后历史记录跟着新姓名"""
+    (tmp_path / "students.json").write_text(json.dumps(["张三", "李四"], ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "leave_records.json").write_text(json.dumps({
+        "2024-03-04": {"张三": {"type": "full"}, "王五": {"type": "half"}},
+        "2024-03-05": {"李四": {"type": "half"}},
+    }, ensure_ascii=False), encoding="utf-8")
+
+    manager = make_manager(tmp_path)
+    assert manager.students.get_students() == ["李四", "张三"]
+    assert manager.get_leave_records("2024-03-04") == {"张三": {"type": "full"}, "王五": {"type": "half"}}
+    with open(tmp_path / "students.json", encoding="utf-8") as f:
+        assert json.load(f)["version"] == StudentManager.FILE_VERSION
+    with open(tmp_path / "leave_records.json", encoding="utf-8") as f:
+        assert json.load(f)["version"] == leavedata.JsonLeaveStorage.FILE_VERSION
+
+    assert manager.rename_student("张三", "张三丰")
+    reloaded = make_manager(tmp_path)
+    assert reloaded.get_leave_records("2024-03-04") == {"张三丰": {"type": "full"}, "王五": {"type": "half"}}
+    assert reloaded.get_student_records("张三丰") == [("2024-03-04", "full")]
+
+
+def test_corrupt_roster_is_kept(tmp_path):
+    """名单文件无法解析时备份一份、提示，记录中的学生显示为编号，名单文件不被改写"""
+    manager = make_manager(tmp_path)
+    manager.students.add_student("张三")
+    manager.save_day_records("2024-03-04", {"张三": "full", "李四": "half"})
+    roster = tmp_path / "students.json"
+    roster.write_text("[\"张三\",", encoding="utf-8")
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.students.load_warnings
+    assert [name for name in os.listdir(tmp_path) if name.startswith("students.json.") and name.endswith(".corrupt")]
+    assert reloaded.students.get_students() == []
+    assert sorted(reloaded.get_leave_records("2024-03-04")) == ["#0", "#1"]
+    assert roster.read_text(encoding="utf-8") == "[\"张三\","
+
+
+def test_missing_roster_keeps_record_ids(tmp_path):
+    """名单文件丢失时记录中的编号补占位姓名，新学生不会占用这些编号"""
+    manager = make_manager(tmp_path)
+    manager.save_day_records("2024-03-04", {"张三": "full", "李四": "half"})
+    os.remove(tmp_path / "students.json")
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.students.load_warnings
+    assert sorted(reloaded.get_leave_records("2024-03-04")) == ["#0", "#1"]
+    reloaded.save_day_records("2024-03-05", {"王五": "full"})
+    assert reloaded.students.student_id("王五") == 2
+    assert reloaded.get_leave_records("2024-03-04") == make_manager(tmp_path).get_leave_records("2024-03-04")
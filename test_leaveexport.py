@@ -0,0 +1,72 @@
+"""
+班级请假记录系统 - 导出测试
+"""
+
+import os
+import json
+
+import openpyxl
+
+from leavedata import LeaveRecordManager
+from leaveexport import ExportJob, build_table_data, export_table
+
+
+def sample_table(tmp_path, days: int = 40):
+    manager = LeaveRecordManager(data_dir=str(tmp_path / "data"))
+    for day in range(1, days + 1):
+        date = f"2024-{1 + (day - 1) // 28:02d}-{1 + (day - 1) % 28:02d}"
+        manager.save_day_records(date, {f"学生{i}": "full" if i % 3 else "half" for i in range(day % 30)})
+    return build_table_data(manager.query_statistics("2024-01-01", "2024-12-31"))
+
+
+def run_job(job: ExportJob):
+    job.start()
+    job.join()
+    return job.poll()
+
+
+def test_export_job_writes_excel(tmp_path):
+    """导出完成后替换目标文件，不留临时文件，长名单的行按换行行数加高"""
+    table_data = sample_table(tmp_path)
+    file_path = str(tmp_path / "统计.xlsx")
+    events = run_job(ExportJob(table_data, True, file_path))
+
+    assert events[-1] == ("done", len(table_data))
+    assert not os.path.exists(file_path + ".part")
+    ws = openpyxl.load_workbook(file_path).active
+    assert ws.max_row == 1 + len(table_data)
+    assert [cell.value for cell in ws[1]] == ["日期", "星期", "人数", "全天", "半天"]
+    assert any(dimension.height for dimension in ws.row_dimensions.values())
+
+
+def test_export_job_cancel_keeps_existing_file(tmp_path):
+    """取消导出：原有的目标文件保持不变，未写完的 .part 文件被删除"""
+    file_path = tmp_path / "统计.xlsx"
+    file_path.write_bytes(b"old")
+    job = ExportJob(sample_table(tmp_path), True, str(file_path))
+    job.cancel()
+    events = run_job(job)
+
+    assert events[-1] == ("cancelled", None)
+    assert file_path.read_bytes() == b"old"
+    assert sorted(os.listdir(tmp_path)) == ["data", "统计.xlsx"]
+
+
+def test_export_job_error(tmp_path):
+    file_path = str(tmp_path / "统计.txt")
+    events = run_job(ExportJob(sample_table(tmp_path, 3), True, file_path, fmt="txt"))
+    assert events[-1][0] == "error"
+    assert not os.path.exists(file_path) and not os.path.exists(file_path + ".part")
+
+
+def test_csv_and_json_match(tmp_path):
+    table_data = sample_table(tmp_path, 5)
+    export_table(table_data, True, str(tmp_path / "统计.csv"), "csv")
+    export_table(table_data, True, str(tmp_path / "统计.json"), "json")
+
+    with open(tmp_path / "统计.csv", encoding="utf-8-sig") as f:
+        csv_rows = [line.rstrip("\r\n").split(",", 4) for line in f]
+    with open(tmp_path / "统计.json", encoding="utf-8") as f:
+        json_rows = json.load(f)
+    assert len(csv_rows) == 1 + len(json_rows) == 1 + len(table_data)
+    assert [row["日期"] for row in json_rows] == [row[0] for row in csv_rows[1:]]
@@ -0,0 +1,115 @@
+"""
+班级请假记录系统 - 多班级汇总测试
+"""
+
+import os
+
+import openpyxl
+import pytest
+
+from leavedata import WorkspaceManager
+from leavereport import aggregate_statistics, workspace_classes, export_aggregate_to_excel
+
+
+def make_workspaces(root_dir) -> WorkspaceManager:
+    """三个班级：默认班级、一班、二班（二班的修改还在日志中未压缩）"""
+    workspaces = WorkspaceManager(root_dir=str(root_dir))
+    for name in ("一班", "二班"):
+        workspaces.create_class(name)
+    samples = {
+        WorkspaceManager.DEFAULT_CLASS: {"2024-03-04": {"张三": "full"}, "2024-03-09": {"李四": "half"}},
+        "一班": {"2024-03-04": {"张三": "half", "王五": "full"}, "2024-03-10": {"赵六": "full"}},
+        "二班": {"2024-03-05": {"孙七": "half"}, "2024-03-09": {"孙七": "full", "周八": "half"}},
+    }
+    for name, days in samples.items():
+        manager = workspaces.get(name).leave_manager
+        for date, day_records in days.items():
+            manager.save_day_records(date, day_records)
+    for name in (WorkspaceManager.DEFAULT_CLASS, "一班"):
+        workspaces.get(name).leave_manager.compact()
+    return workspaces
+
+
+def snapshot_files(root_dir):
+    """数据文件夹下全部文件的内容"""
+    files = {}
+    for folder, _, names in os.walk(root_dir):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, "rb") as f:
+                files[path] = f.read()
+    return files
+
+
+def test_aggregate_matches_per_class_statistics(tmp_path):
+    """并行汇总与逐个班级统计的结果一致，合计等于各班级之和"""
+    workspaces = make_workspaces(tmp_path)
+    classes = workspace_classes(workspaces)
+    expected = {name: workspaces.get(name).leave_manager.get_statistics("2024-03-01", "2024-03-31")
+                for name in classes}
+
+    serial = aggregate_statistics(classes, "2024-03-01", "2024-03-31", max_workers=1)
+    parallel = aggregate_statistics(classes, "2024-03-01", "2024-03-31", max_workers=2)
+    assert serial == parallel
+    assert not serial.errors
+    assert serial.class_names == list(classes)
+    assert serial.classes == expected
+    assert serial.total_full_days == sum(stats["total_full_days"] for stats in expected.values()) == 4
+    assert serial.total_half_days == sum(stats["total_half_days"] for stats in expected.values()) == 4
+    assert [day.date for day in serial.days] == ["2024-03-04", "2024-03-05", "2024-03-09", "2024-03-10"]
+    assert serial.days[0].classes == {WorkspaceManager.DEFAULT_CLASS: (0, 1), "一班": (1, 1)}
+    assert serial.saturdays.students == 3
+    workspaces.close()
+
+
+def test_aggregate_json_and_sqlite_match(tmp_path):
+    """两种存储的汇总结果一致"""
+    workspaces = make_workspaces(tmp_path)
+    workspaces.copy_to_backend("sqlite")
+    classes = workspace_classes(workspaces)
+    from_json = aggregate_statistics(classes, "2024-03-01", "2024-03-31", backend="json", max_workers=1)
+    from_sqlite = aggregate_statistics(classes, "2024-03-01", "2024-03-31", backend="sqlite", max_workers=1)
+    assert from_json == from_sqlite
+    workspaces.close()
+
+
+def test_aggregate_is_read_only(tmp_path):
+    """汇总只读取数据文件：未压缩的日志、半行日志和尚未创建的数据库都保持原样"""
+    workspaces = make_workspaces(tmp_path)
+    journal = os.path.join(workspaces.class_dir("二班"), "leave_records.journal")
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"d":"2024-03-06"')
+    before = snapshot_files(tmp_path)
+
+    classes = workspace_classes(workspaces)
+    for backend in ("json", "sqlite"):
+        result = aggregate_statistics(classes, "2024-03-01", "2024-03-31", backend=backend, max_workers=2)
+        assert not result.errors
+        assert result.total_full_days == 4
+    assert snapshot_files(tmp_path) == before
+    workspaces.close()
+
+
+def test_export_aggregate_to_excel(tmp_path):
+    """汇总导出包含按天汇总和班级汇总两张表"""
+    workspaces = make_workspaces(tmp_path / "data")
+    result = aggregate_statistics(workspace_classes(workspaces), "2024-03-01", "2024-03-31", max_workers=1)
+    file_path = str(tmp_path / "汇总.xlsx")
+    export_aggregate_to_excel(result, file_path)
+
+    wb = openpyxl.load_workbook(file_path)
+    assert wb.sheetnames == ["按天汇总", "班级汇总"]
+    assert wb["按天汇总"].max_row == 1 + len(result.days)
+    totals = [cell.value for cell in wb["班级汇总"][wb["班级汇总"].max_row]]
+    assert totals[:3] == ["合计", 4, 4]
+    workspaces.close()
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_missing_class_folder_is_empty(tmp_path, max_workers):
+    """数据文件夹不存在的班级按没有记录统计，不会创建文件夹"""
+    missing = str(tmp_path / "没有这个班")
+    result = aggregate_statistics({"甲": missing, "乙": missing}, "2024-03-01", "2024-03-31",
+                                  max_workers=max_workers)
+    assert not result.errors and result.total_full_days == 0
+    assert not os.path.exists(missing)
@@ -0,0 +1,127 @@
+"""
+班级请假记录系统 - 文本测量
+按像素宽度给名单换行，每种字体的字符宽度只测量一次，统计表格和 Excel 导出共用，不依赖 tkinter
+
+有界面时由界面注册测量函数（tkinter.font.Font.measure），没有界面时（命令行）按字符的东亚宽度估算。
+"""
+
+import math
+import threading
+import unicodedata
+from typing import List, Dict, Callable, Optional
+
+# 没有测量函数时，半角字符的估算宽度（像素）；全角字符按两倍计算
+DEFAULT_CHAR_WIDTH = 7
+
+
+def estimate_width(text: str, char_width: int = DEFAULT_CHAR_WIDTH) -> int:
+    """按东亚宽度估算文本宽度：中日韩等全角字符为两个半角宽度"""
+    return sum(char_width * 2 if unicodedata.east_asian_width(ch) in ('W', 'F') else char_width
+               for ch in text)
+
+
+class TextMeasurer:
+    """一种字体的文本测量，按字符缓存宽度
+
+    measure 只在创建测量器的线程中调用（tkinter 不允许在其他线程使用），
+    其他线程遇到没缓存的字符时按东亚宽度估算，不写入缓存。
+    可以先在界面线程调用 prime() 把要用到的字符测量好。
+    """
+
+    def __init__(self, measure: Optional[Callable[[str], int]] = None,
+                 char_width: int = DEFAULT_CHAR_WIDTH):
+        self._measure = measure
+        self._char_width = char_width
+        self._owner = threading.current_thread()
+        self._widths: Dict[str, int] = {}
+        self.separator_width = self.width(", ")
+
+    def char_width(self, ch: str) -> int:
+        width = self._widths.get(ch)
+        if width is None:
+            if self._measure is None:
+                width = estimate_width(ch, self._char_width)
+            elif threading.current_thread() is self._owner:
+                width = self._measure(ch)
+            else:
+                return estimate_width(ch, self._char_width)
+            self._widths[ch] = width
+        return width
+
+    def width(self, text: str) -> int:
+        """文本宽度（像素），逐字符累加缓存的宽度"""
+        widths = self._widths
+        total = 0
+        for ch in text:
+            width = widths.get(ch)
+            total += width if width is not None else self.char_width(ch)
+        return total
+
+    def prime(self, texts):
+        """预先测量这些文本中出现的全部字符（在创建测量器的线程中调用）"""
+        for ch in set().union(*texts):
+            self.char_width(ch)
+
+    def wrap_names(self, text: str, max_width: float) -> List[str]:
+        """把逗号分隔的名单按像素宽度换行，名字不拆开，返回各行（空文本返回空列表）"""
+        if not text:
+            return []
+
+        lines = []
+        current_line = ""
+        current_width = 0
+        for name in (name.strip() for name in text.split(",")):
+            name_width = self.width(name)
+            if not current_line:
+                current_line, current_width = name, name_width
+            elif current_width + self.separator_width + name_width <= max_width:
+                current_line += ", " + name
+                current_width += self.separator_width + name_width
+            else:
+                lines.append(current_line)
+                current_line, current_width = name, name_width
+
+        if current_line:
+            lines.append(current_line)
+        return lines
+
+    def line_count(self, text: str, max_width: float) -> int:
+        """文本在 max_width 宽的单元格中显示的行数，放不下的单个名字按折行计算"""
+        if not text:
+            return 1
+        if max_width <= 0:
+            return len(text)
+        return max(1, sum(max(1, math.ceil(self.width(line) / max_width))
+                          for line in self.wrap_names(text, max_width)))
+
+
+_measurers: Dict[tuple, TextMeasurer] = {}
+_measure_factory: Optional[Callable[[tuple], Callable[[str], int]]] = None
+_lock = threading.Lock()
+
+
+def set_measure_factory(factory: Optional[Callable[[tuple], Callable[[str], int]]]):
+    """注册测量函数工厂：factory(字体) 返回该字体的 measure(文本) -> 像素宽度
+
+    已创建的测量器（以及它们的缓存）会被丢弃。
+    """
+    global _measure_factory
+    with _lock:
+        _measure_factory = factory
+        _measurers.clear()
+
+
+def measurer(font: tuple) -> TextMeasurer:
+    """取得字体的测量器，同一字体共用一个（和它的字符宽度缓存）
+
+    注册了测量函数时应先在主线程取得要用的测量器，工作线程再取到的就是同一个。
+    """
+    with _lock:
+        instance = _measurers.get(font)
+        if instance is None:
+            if _measure_factory is not None and threading.current_thread() is not threading.main_thread():
+                # 测量函数（tkinter）只能在主线程创建和调用，其他线程先用不缓存的估算
+                return TextMeasurer()
+            instance = TextMeasurer(_measure_factory(font) if _measure_factory else None)
+            _measurers[font] = instance
+        return instance
@@ -7,19 +7,26 @@ import os
 import sys
 import json
 import datetime
-from typing import List, Dict, Tuple, Optional
-from collections import defaultdict
+import time
+from typing import List, Tuple, Optional
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
+import tkinter.font as tkfont
 import importlib
 import tkintercalendar
 importlib.reload(tkintercalendar)
 CalendarWidget = tkintercalendar.Calendar
-import openpyxl
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+import bisect
+from collections import OrderedDict
 import threading
 import shutil
+import concurrent.futures
+import multiprocessing
+from leavedata import (WEEKDAY_NAMES, StatisticsResult, ClassWorkspace, WorkspaceManager, date_weekday,
+                       week_range, month_range)
+import leaveexport
+import leavereport
+import textmeasure
 
 # 获取程序运行目录
 if getattr(sys, 'frozen', False):
@@ -129,287 +136,6 @@ if getattr(sys, 'frozen', False):
         widget.after(duration, restore)
 
 
-class StudentManager:
-    """学生名单管理"""
-
-    def __init__(self, data_file: str = "students.json"):
-        # 确保data文件夹存在
-        data_dir = 'data'
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-
-        self.data_file = os.path.join(data_dir, data_file)
-        self.students = []
-        self.load_students()
-    
-    def load_students(self):
-        """加载学生名单"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.students = json.load(f)
-            except:
-                self.students = []
-        else:
-            # 首次运行，初始化空名单
-            self.students = []
-            self.save_students()
-    
-    def save_students(self):
-        """保存学生名单"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.students, f, ensure_ascii=False, indent=2)
-    
-    def add_student(self, name: str) -> bool:
-        """添加学生"""
-        if not name or name in self.students:
-            return False
-        self.students.append(name)
-        self.students.sort()  # 按拼音排序
-        self.save_students()
-        return True
-    
-    def remove_student(self, name: str) -> bool:
-        """删除学生"""
-        if name in self.students:
-            self.students.remove(name)
-            self.save_students()
-            return True
-        return False
-    
-    def batch_import(self, names: List[str]) -> int:
-        """批量导入学生"""
-        count = 0
-        for name in names:
-            if name and name not in self.students:
-                self.students.append(name)
-                count += 1
-        self.students.sort()
-        self.save_students()
-        return count
-    
-    def get_students(self) -> List[str]:
-        """获取学生列表（按拼音排序）"""
-        from pypinyin import lazy_pinyin
-
-        return sorted(self.students, key=lambda x: ''.join(lazy_pinyin(x)))
-
-
-class LeaveRecordManager:
-    """请假记录管理（改进版 - 添加原子性保护和线程安全）"""
-
-    def __init__(self, data_file: str = "leave_records.json"):
-        # 确保data文件夹存在
-        data_dir = 'data'
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-
-        self.data_file = os.path.join(data_dir, data_file)
-        self.records = {}  # {date: {name: {"type": "half"/"full"}}}
-        self.load_records()
-
-        # 添加数据锁，防止并发写入
-        self._lock = threading.Lock()
-
-    def load_records(self):
-        """加载请假记录"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.records = json.load(f)
-            except:
-                self.records = {}
-        else:
-            self.records = {}
-
-    def save_records(self):
-        """保存请假记录（改进版 - 添加原子性保护）"""
-        with self._lock:
-            # 创建临时文件
-            temp_file = self.data_file + '.tmp'
-
-            try:
-                # 写入临时文件
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.records, f, ensure_ascii=False, indent=2)
-
-                # 使用原子操作替换原文件
-                if os.path.exists(self.data_file):
-                    os.replace(temp_file, self.data_file)
-                else:
-                    os.rename(temp_file, self.data_file)
-
-            except Exception as e:
-                # 清理临时文件
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                raise e
-
-    def add_leave(self, date: str, name: str, leave_type: str):
-        """添加请假记录（改进版 - 不立即保存）"""
-        with self._lock:
-            if date not in self.records:
-                self.records[date] = {}
-            self.records[date][name] = {"type": leave_type}
-            # 移除立即保存，由调用方统一保存
-
-    def remove_leave(self, date: str, name: str):
-        """删除请假记录（改进版 - 不立即保存）"""
-        with self._lock:
-            if date in self.records and name in self.records[date]:
-                del self.records[date][name]
-                if not self.records[date]:
-                    del self.records[date]
-                # 移除立即保存，由调用方统一保存
-    
-    def update_leave(self, date: str, name: str, leave_type: str):
-        """更新请假记录"""
-        if date in self.records and name in self.records[date]:
-            self.records[date][name]["type"] = leave_type
-            self.save_records()
-    
-    def get_leave_records(self, date: str) -> Dict[str, str]:
-        """获取某天的请假记录"""
-        return self.records.get(date, {})
-    
-    def get_all_dates(self) -> List[str]:
-        """获取所有有记录的日期"""
-        return sorted(self.records.keys())
-    
-    def get_frequent_leavers(self, days: int = 5, threshold: int = 3) -> List[str]:
-        """获取常请假的学生"""
-        end_date = datetime.datetime.now()
-        start_date = end_date - datetime.timedelta(days=days)
-        
-        leave_counts = defaultdict(int)
-        
-        for date_str, records in self.records.items():
-            try:
-                date = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                if start_date <= date <= end_date:
-                    for name in records:
-                        leave_counts[name] += 1
-            except:
-                continue
-        
-        return [name for name, count in leave_counts.items() if count >= threshold]
-    
-    def get_student_leave_history(self, name: str) -> Dict[str, str]:
-        """获取某学生的请假历史"""
-        history = {}
-        for date_str, records in self.records.items():
-            if name in records:
-                history[date_str] = records[name]["type"]
-        return sorted(history.items())
-    
-    def get_statistics(self, start_date: str, end_date: str) -> Dict:
-        """获取统计数据"""
-        stats = {
-            "total_days": 0,
-            "total_half_days": 0,
-            "total_full_days": 0,
-            "weekdays": {"half_days": 0, "full_days": 0, "students": []},
-            "saturdays": {"half_days": 0, "full_days": 0, "students": []},
-            "sundays": {"half_days": 0, "full_days": 0, "students": []},
-            "daily": {}
-        }
-        
-        for date_str, records in self.records.items():
-            if start_date <= date_str <= end_date:
-                try:
-                    date = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                    weekday = date.weekday()  # 0=周一, 6=周日
-                    
-                    half_count = 0
-                    full_count = 0
-                    students = []
-                    
-                    for name, record in records.items():
-                        if record["type"] == "half":
-                            half_count += 1
-                            stats["total_half_days"] += 1
-                        else:
-                            full_count += 1
-                            stats["total_full_days"] += 1
-                        students.append(name)
-                    
-                    stats["total_days"] += 1
-                    stats["daily"][date_str] = {
-                        "half_days": half_count,
-                        "full_days": full_count,
-                        "students": students
-                    }
-                    
-                    if weekday == 6:  # 周日
-                        stats["sundays"]["half_days"] += half_count
-                        stats["sundays"]["full_days"] += full_count
-                        stats["sundays"]["students"].extend(students)
-                    elif weekday == 5:  # 周六
-                        stats["saturdays"]["half_days"] += half_count
-                        stats["saturdays"]["full_days"] += full_count
-                        stats["saturdays"]["students"].extend(students)
-                    else:  # 工作日
-                        stats["weekdays"]["half_days"] += half_count
-                        stats["weekdays"]["full_days"] += full_count
-                        stats["weekdays"]["students"].extend(students)
-                except:
-                    continue
-        
-        # 去重学生名单
-        stats["weekdays"]["students"] = list(set(stats["weekdays"]["students"]))
-        stats["saturdays"]["students"] = list(set(stats["saturdays"]["students"]))
-        stats["sundays"]["students"] = list(set(stats["sundays"]["students"]))
-        
-        return stats
-    
-    def get_student_statistics(self, name: str, start_date: str, end_date: str) -> Dict:
-        """获取某学生的请假统计"""
-        stats = {
-            "total_half_days": 0,
-            "total_full_days": 0,
-            "weekdays": {"half_days": 0, "full_days": 0, "dates": []},
-            "saturdays": {"half_days": 0, "full_days": 0, "dates": []},
-            "sundays": {"half_days": 0, "full_days": 0, "dates": []},
-            "records": []
-        }
-        
-        for date_str, records in self.records.items():
-            if start_date <= date_str <= end_date and name in records:
-                try:
-                    date = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                    weekday = date.weekday()
-                    leave_type = records[name]["type"]
-                    
-                    record_info = {
-                        "date": date_str,
-                        "type": leave_type,
-                        "weekday": weekday
-                    }
-                    stats["records"].append(record_info)
-                    
-                    if leave_type == "half":
-                        stats["total_half_days"] += 1
-                    else:
-                        stats["total_full_days"] += 1
-                    
-                    if weekday == 6:
-                        stats["sundays"]["half_days"] += 1 if leave_type == "half" else 0
-                        stats["sundays"]["full_days"] += 1 if leave_type == "full" else 0
-                        stats["sundays"]["dates"].append(date_str)
-                    elif weekday == 5:
-                        stats["saturdays"]["half_days"] += 1 if leave_type == "half" else 0
-                        stats["saturdays"]["full_days"] += 1 if leave_type == "full" else 0
-                        stats["saturdays"]["dates"].append(date_str)
-                    else:
-                        stats["weekdays"]["half_days"] += 1 if leave_type == "half" else 0
-                        stats["weekdays"]["full_days"] += 1 if leave_type == "full" else 0
-                        stats["weekdays"]["dates"].append(date_str)
-                except:
-                    continue
-        
-        return stats
-
-
 class CalendarWidget:
     """日历组件"""
     
@@ -550,8 +276,209 @@ class CalendarWidget:
         return self.selected_date
 
 
+class TreeRowSync:
+    """Treeview 行差量同步
+
+    维护 键 -> 行id 的映射和每行已显示的内容，刷新时只修改内容有变化的行，
+    只有名单本身变化时才插入、删除或移动行。
+    """
+
+    def __init__(self, tree: ttk.Treeview):
+        self.tree = tree
+        self._items = {}   # 键 -> 行id
+        self._keys = {}    # 行id -> 键
+        self._shown = {}   # 键 -> (values, tag)
+        self._order = []   # 当前显示顺序
+
+    def key_of(self, item: str) -> Optional[str]:
+        """行id对应的键"""
+        return self._keys.get(item)
+
+    def sync(self, rows: List[Tuple[str, tuple]], start: int = 0):
+        """按 [(键, values)] 的顺序同步表格，行的底色按 start 起算的奇偶交替"""
+        tree = self.tree
+        keys = [key for key, _ in rows]
+        if keys != self._order:
+            wanted = set(keys)
+            for key in [key for key in self._order if key not in wanted]:
+                item = self._items.pop(key)
+                del self._keys[item]
+                del self._shown[key]
+                tree.delete(item)
+
+            # 保留下来的行相对顺序不变时，只需在对应位置插入新行
+            kept = [key for key in self._order if key in wanted]
+            reorder = kept != [key for key in keys if key in self._items]
+            for index, (key, values) in enumerate(rows):
+                tag = 'even' if (start + index + 1) % 2 == 0 else 'odd'
+                item = self._items.get(key)
+                if item is None:
+                    item = tree.insert("", index, values=values, tags=(tag,))
+                    self._items[key] = item
+                    self._keys[item] = key
+                    self._shown[key] = (values, tag)
+                elif reorder:
+                    tree.move(item, "", index)
+            self._order = keys
+
+        for index, (key, values) in enumerate(rows):
+            tag = 'even' if (start + index + 1) % 2 == 0 else 'odd'
+            if self._shown[key] != (values, tag):
+                tree.item(self._items[key], values=values, tags=(tag,))
+                self._shown[key] = (values, tag)
+
+
+class VirtualTreeList:
+    """虚拟化的 Treeview 列表
+
+    表格里只保留可见行数加少量预留的行，滚动时改写这些行的内容，
+    行内容也只为可见窗口计算，建表和滚动的开销与名单长度无关。
+    """
+
+    # 可见行之外多保留的行数
+    OVERSCAN = 2
+
+    def __init__(self, tree: ttk.Treeview, scrollbar: ttk.Scrollbar, row_height: int = 25):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_height = row_height
+        self.keys = []
+        self.row_values = None  # 键 -> values
+        self.offset = 0
+        self.visible = int(tree.cget("height"))
+        self._slots = TreeRowSync(tree)
+
+        scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", self._on_configure, "+")
+        # 滚轮由列表自己处理，返回 break 阻止 Treeview 自带的滚动
+        tree.bind("<MouseWheel>", self._on_mousewheel)
+        tree.bind("<Button-4>", lambda e: self._scroll_by(-1))
+        tree.bind("<Button-5>", lambda e: self._scroll_by(1))
+
+    def set_items(self, keys: List[str], row_values):
+        """设置完整名单和行内容函数，只重绘可见窗口"""
+        self.keys = keys
+        self.row_values = row_values
+        self._render()
+        # 表格里的行数是固定的，只在换名单时把 Treeview 自身的滚动位置归零
+        self.tree.yview_moveto(0)
+
+    def key_of(self, item: str) -> Optional[str]:
+        """行id对应的键"""
+        slot = self._slots.key_of(item)
+        if slot is None or self.offset + slot >= len(self.keys):
+            return None
+        return self.keys[self.offset + slot]
+
+    def yview(self, *args):
+        """滚动条回调"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.keys))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.offset += step * self.visible if args[2] == "pages" else step
+        self._render()
+
+    def _scroll_by(self, rows: int):
+        self.offset += rows
+        self._render()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        # Windows系统使用 event.delta，Linux/Mac使用 event.num
+        if event.delta:
+            return self._scroll_by(-1 * (event.delta // 120))
+        return self._scroll_by(-1 if event.num == 4 else 1)
+
+    def _on_configure(self, event):
+        # 减去表头所占的一行
+        visible = max(1, -(-event.height // self.row_height) - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self._render()
+
+    def _render(self):
+        total = len(self.keys)
+        self.offset = min(max(self.offset, 0), max(0, total - self.visible))
+        window = self.keys[self.offset:self.offset + self.visible + self.OVERSCAN]
+        self._slots.sync([(slot, self.row_values(key)) for slot, key in enumerate(window)], self.offset)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class StatsTableLayout:
+    """统计表格的行布局：每行换行后的名单、行高和顶部y坐标
+
+    布局只依赖统计数据和名单列的换行宽度，窗口宽度变化（换行宽度不变时）和滚动都直接复用。
+    tops 是行高的前缀和（tops[i] 为第 i 行的顶部，tops[-1] 为表格总高度），
+    表格总高度不需要绘制就能得到，按y坐标找行是二分查找。
+    """
+
+    def __init__(self, header_height: int, heights: List[int], lines: List[Tuple[List[str], List[str]]],
+                 line_height: int, is_single_student: bool, totals: Tuple[int, int]):
+        self.header_height = header_height
+        self.heights = heights
+        self.lines = lines  # 每行 (全天名单各行, 半天名单各行)，汇总行为空
+        self.line_height = line_height  # 名单每行的高度
+        self.is_single_student = is_single_student
+        self.totals = totals  # 单个学生统计的 (全天次数, 半天次数)，用于汇总行
+        self.tops = [header_height]
+        for height in heights:
+            self.tops.append(self.tops[-1] + height)
+        # 绘制时按当前画布宽度设置
+        self.col_widths = None
+        self.canvas_width = 0
+
+    @property
+    def total_height(self) -> int:
+        return self.tops[-1]
+
+    def row_at(self, y: float) -> int:
+        """y坐标所在的行（表头之上为0，表格之下为最后一行）"""
+        return min(max(bisect.bisect_right(self.tops, y) - 1, 0), max(len(self.heights) - 1, 0))
+
+
+class StatsRowItems:
+    """统计表格一行用到的Canvas图形：背景、五个单元格的文字、名单各行的文字和网格线
+
+    图形创建后一直保留，重绘和滚动时只修改坐标、文字和颜色，不再使用的行隐藏起来留给下一行使用。
+    同一行的图形都带有 tag，显示和隐藏只需一次调用；显示中的行还带有 VISIBLE_TAG，
+    调整窗口宽度时只缩放这些图形，隐藏待用的行重新使用时会按新宽度设置坐标。
+    """
+
+    VISIBLE_TAG = "stats_visible"
+
+    def __init__(self, canvas: tk.Canvas, tag: str):
+        self.tag = tag
+        tags = (tag, self.VISIBLE_TAG)
+        self.background = canvas.create_rectangle(0, 0, 0, 0, outline='', tags=tags)
+        self.texts = [canvas.create_text(0, 0, tags=tags) for _ in range(5)]
+        self.grid = [canvas.create_line(0, 0, 0, 0, width=2, tags=tags) for _ in range(5)]
+        self.bottom = canvas.create_line(0, 0, 0, 0, width=2, tags=tags)
+        # 全天、半天名单各行的文字（按需要的行数增加），以及当前显示了几行
+        self.name_lines = ([], [])
+        self.name_counts = [0, 0]
+        self.colors = None
+        self.visible = True
+
+    def name_line_items(self, canvas: tk.Canvas, column: int, count: int, font, fill: str) -> List[int]:
+        """名单列（0 全天，1 半天）的前 count 行文字，不够时创建"""
+        items = self.name_lines[column]
+        while len(items) < count:
+            tags = (self.tag, self.VISIBLE_TAG) if self.visible else (self.tag,)
+            items.append(canvas.create_text(0, 0, anchor='center', font=font, fill=fill, tags=tags))
+        return items
+
+
 class LeaveRecordApp:
     """请假记录应用主类"""
+
+    # 设置界面显示的存储方式名称
+    STORAGE_BACKEND_NAMES = {"JSON文件": "json", "SQLite数据库": "sqlite"}
     
     def __init__(self, root):
         self.root = root
@@ -593,13 +520,41 @@ class LeaveRecordApp:
         # 设置样式
         self.setup_styles()
 
-        # 初始化管理器
-        self.student_manager = StudentManager()
-        self.leave_manager = LeaveRecordManager()
+        # 文本宽度按实际字体测量（统计表格换行和Excel行高共用字符宽度缓存），
+        # tkinter 只能在主线程使用，先在这里创建要用的测量器
+        textmeasure.set_measure_factory(lambda font: tkfont.Font(root=self.root, font=font).measure)
+        textmeasure.measurer(self.STATS_NAME_FONT)
+        textmeasure.measurer(leaveexport.EXCEL_FONT)
+
+        # 初始化管理器：只加载当前班级，其他班级切换时再加载
+        self.workspaces = WorkspaceManager(backend=self._read_setting('storage_backend', 'json'))
+        active_class = self._read_setting('active_class', WorkspaceManager.DEFAULT_CLASS)
+        if active_class not in self.workspaces.list_classes():
+            active_class = WorkspaceManager.DEFAULT_CLASS
+        self._set_workspace(self.workspaces.get(active_class))
 
         # 初始化学生请假类型字典
         self.student_leave_types = {}  # {name: "full" or "half" or None}
 
+        # 正在进行的导出任务，以及启动导出前分批测量字符宽度的生成器
+        self._export_job = None
+        self._export_primer = None
+
+        # 统计表格当前的数据和行布局缓存（{(数据版本, 换行宽度): StatsTableLayout}）
+        self._current_stats_data = None
+        self._stats_data_version = 0
+        self._stats_layout_cache = OrderedDict()
+        self._stats_layout = None
+        # 已绘制的统计结果和画布宽度（都没变时不重绘）、已绘制行的可见范围、等待画布有宽度后再绘制的数据
+        self._drawn_stats_result = None
+        self._drawn_stats_width = None
+        self._stats_band = None
+        self._pending_stats_data = None
+        # 统计表格复用的Canvas图形：表头、正在显示的行（{行号: StatsRowItems}）和隐藏待用的行
+        self._stats_header_items = None
+        self._stats_row_items = {}
+        self._stats_free_row_items = []
+
         # 标记是否有未保存的修改
         self.has_unsaved_changes = False
 
@@ -618,14 +573,136 @@ class LeaveRecordApp:
         # 延迟加载初始数据，优化启动速度
         self.root.after(100, self.load_initial_data)
 
-    def on_closing(self):
-        """关闭窗口时的处理"""
-        # 保存设置
+    def _read_setting(self, key: str, default):
+        """读取单项设置（存储方式、当前班级需要在创建管理器之前读取，不能等设置界面加载）"""
+        try:
+            settings_file = os.path.join('data', 'settings.json')
+            if os.path.exists(settings_file):
+                with open(settings_file, 'r', encoding='utf-8') as f:
+                    return json.load(f).get(key, default)
+        except Exception:
+            pass
+        return default
+
+    def _set_workspace(self, workspace: ClassWorkspace):
+        """设置当前班级，界面各处通过 student_manager/leave_manager 访问当前班级的数据"""
+        self.workspace = workspace
+        self.student_manager = workspace.student_manager
+        self.leave_manager = workspace.leave_manager
+        self._show_load_warnings()
+
+    def _show_load_warnings(self):
+        """提示加载当前班级数据时发现的问题（名单文件损坏等），每个问题只提示一次"""
+        warnings = self.student_manager.load_warnings
+        if warnings:
+            message = f"班级 {self.workspace.name} 的数据有问题:\n\n" + "\n\n".join(warnings)
+            warnings.clear()
+            self.root.after_idle(lambda: messagebox.showwarning("警告", message))
+
+    def switch_class(self, name: str):
+        """切换班级：在后台加载该班级的数据，加载完成后刷新界面"""
+        if name == self.workspace.name:
+            return
+        if self.has_unsaved_changes:
+            if messagebox.askyesno("未保存的修改", "检测到有未保存的请假记录，是否保存？"):
+                self.save_leave_record()
+        self.update_status(f"正在加载班级: {name}")
+        self._poll_class_switch(name, self.workspaces.load_async(name))
+
+    def _poll_class_switch(self, name: str, future):
+        """等待后台加载完成（在主线程轮询，避免在后台线程操作界面）"""
+        if not future.done():
+            self.root.after(50, lambda: self._poll_class_switch(name, future))
+            return
+        if self.class_var.get() != name:
+            # 加载期间又选择了其他班级
+            return
+        try:
+            workspace = future.result()
+        except Exception as e:
+            messagebox.showerror("错误", f"加载班级失败: {str(e)}")
+            self.class_var.set(self.workspace.name)
+            return
+
+        self._set_workspace(workspace)
+        self.load_leave_records(self.date_var.get())
+        self.update_student_combos()
+        self._schedule_calendar_highlight()
+        if hasattr(self, 'stats_canvas'):
+            self.refresh_stats()
         self.save_settings()
+        self.update_status(f"已切换到班级: {name}")
+
+    def show_new_class_dialog(self):
+        """显示新建班级对话框（居中显示）"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("新建班级")
+        dialog.geometry("300x150")
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        # 居中显示
+        dialog.update_idletasks()
+        width = dialog.winfo_width()
+        height = dialog.winfo_height()
+        x = (dialog.winfo_screenwidth() // 2) - (width // 2)
+        y = (dialog.winfo_screenheight() // 2) - (height // 2)
+        dialog.geometry(f'{width}x{height}+{x}+{y}')
+
+        ttk.Label(dialog, text="班级名称:").pack(pady=10)
+
+        name_var = tk.StringVar()
+        name_entry = ttk.Entry(dialog, textvariable=name_var, width=20)
+        name_entry.pack(pady=5)
+        name_entry.focus()
+
+        def create_class():
+            name = name_var.get().strip()
+            if self.workspaces.create_class(name):
+                self.class_combo['values'] = self.workspaces.list_classes()
+                dialog.destroy()
+                self.class_var.set(name)
+                self.switch_class(name)
+            else:
+                messagebox.showwarning("警告", "班级名称无效或已存在")
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+
+        ttk.Button(button_frame, text="确定", command=create_class).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+
+        name_entry.bind('<Return>', lambda e: create_class())
 
+    def on_closing(self):
+        """关闭窗口时的处理"""
         if self.has_unsaved_changes:
             if messagebox.askyesno("未保存的修改", "检测到有未保存的请假记录，是否保存？"):
                 self.save_leave_record()
+
+        # 取消未完成的导出，等待导出线程清理临时文件
+        self._export_primer = None
+        if self._export_job is not None:
+            self._export_job.cancel()
+            self._export_job.join(timeout=2)
+
+        # 切换了存储方式：先把全部班级的数据复制到新的存储，复制成功才在设置中切换
+        storage_backend = self.STORAGE_BACKEND_NAMES.get(self.storage_backend_var.get(), self.workspaces.backend)
+        if storage_backend != self.workspaces.backend:
+            try:
+                self.workspaces.copy_to_backend(storage_backend)
+            except Exception as e:
+                messagebox.showerror("错误", f"复制数据到新的存储方式失败，仍使用原来的存储方式: {str(e)}")
+                storage_backend = self.workspaces.backend
+
+        # 保存设置
+        self.save_settings(storage_backend)
+
+        # 退出前把各班级的日志合并进快照，保证数据文件完整
+        try:
+            self.workspaces.close()
+        except Exception as e:
+            print(f"压缩日志失败: {str(e)}")
         self.root.destroy()
     
     def setup_styles(self):
@@ -792,6 +869,22 @@ class LeaveRecordApp:
                             font=('Microsoft YaHei', 11),
                             bg=self.colors['light_gray'], fg=self.colors['fg'])
         date_label.pack(side=tk.LEFT, padx=15)
+
+        # 班级切换
+        self.class_var = tk.StringVar(value=self.workspace.name)
+        self.class_combo = ttk.Combobox(parent, textvariable=self.class_var,
+                                        values=self.workspaces.list_classes(),
+                                        state="readonly", width=12)
+        self.class_combo.pack(side=tk.LEFT, padx=(0, 8))
+        self.class_combo.bind("<<ComboboxSelected>>", lambda e: self.switch_class(self.class_var.get()))
+
+        new_class_btn = tk.Button(parent, text="🏫 新建班级",
+                                  command=self.show_new_class_dialog,
+                                  bg=self.colors['accent'], fg=self.colors['white'],
+                                  font=('Segoe UI Symbol', 10, 'bold'), relief='flat',
+                                  padx=12, pady=6, cursor='hand2', bd=0)
+        new_class_btn.pack(side=tk.LEFT, padx=(0, 15))
+        self._add_button_hover_effect(new_class_btn, self.colors['accent'], self.colors['accent_hover'])
         
         # 学生管理按钮
         add_btn = tk.Button(parent, text="➕ 添加学生",
@@ -810,6 +903,14 @@ class LeaveRecordApp:
         import_btn.pack(side=tk.LEFT, padx=(0, 8))
         self._add_button_hover_effect(import_btn, self.colors['warning'], '#D68910')
 
+        rename_btn = tk.Button(parent, text="✏️ 修改姓名",
+                             command=self.show_rename_student_dialog,
+                             bg=self.colors['accent'], fg=self.colors['white'],
+                             font=('Segoe UI Symbol', 10, 'bold'), relief='flat',
+                             padx=12, pady=6, cursor='hand2', bd=0)
+        rename_btn.pack(side=tk.LEFT, padx=(0, 8))
+        self._add_button_hover_effect(rename_btn, self.colors['accent'], self.colors['accent_hover'])
+
         remove_btn = tk.Button(parent, text="❌ 删除学生",
                              command=self.show_remove_student_dialog,
                              bg=self.colors['danger'], fg=self.colors['white'],
@@ -1200,15 +1301,14 @@ class LeaveRecordApp:
         self.students_tree.tag_configure('odd', background='white')
         self.students_tree.tag_configure('even', background='#E0E0E0')  # 深灰色
         
-        students_scrollbar = ttk.Scrollbar(students_frame, orient=tk.VERTICAL, command=self.students_tree.yview)
-        self.students_tree.config(yscrollcommand=students_scrollbar.set)
+        students_scrollbar = ttk.Scrollbar(students_frame, orient=tk.VERTICAL)
 
         self.students_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         students_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         self.students_tree.bind("<Button-1>", self.on_student_click)
-        # 添加鼠标滚轮滚动
-        self._bind_mousewheel(self.students_tree)
+        # 名单可能很长，只为可见的行创建表格行（滚动条和鼠标滚轮由虚拟列表处理）
+        self.students_list = VirtualTreeList(self.students_tree, students_scrollbar, row_height=25)
         
         # 常请假名单区域
         frequent_label = tk.Label(parent, text="⚠️ 常请假名单",
@@ -1240,6 +1340,7 @@ class LeaveRecordApp:
         frequent_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         self.frequent_tree.bind("<Button-1>", self.on_frequent_click)
+        self.frequent_rows = TreeRowSync(self.frequent_tree)
         # 添加鼠标滚轮滚动
         self._bind_mousewheel(self.frequent_tree)
     
@@ -1336,6 +1437,14 @@ class LeaveRecordApp:
                               padx=16, pady=8, cursor='hand2')
         export_btn.pack(side=tk.LEFT)
         self._add_button_hover_effect(export_btn, self.colors['success'], '#229954')
+
+        aggregate_btn = tk.Button(button_frame, text="📚 多班级汇总",
+                                  command=self.export_aggregate_to_excel,
+                                  bg=self.colors['success'], fg=self.colors['white'],
+                                  font=('Segoe UI Symbol', 10, 'bold'), relief='flat',
+                                  padx=16, pady=8, cursor='hand2')
+        aggregate_btn.pack(side=tk.LEFT, padx=(10, 0))
+        self._add_button_hover_effect(aggregate_btn, self.colors['success'], '#229954')
         
         # 统计结果显示（表格）
         stats_label = tk.Label(parent, text="📊 统计结果",
@@ -1352,7 +1461,9 @@ class LeaveRecordApp:
         v_scrollbar = ttk.Scrollbar(stats_canvas_frame, orient=tk.VERTICAL, command=self.stats_canvas.yview)
         h_scrollbar = ttk.Scrollbar(stats_canvas_frame, orient=tk.HORIZONTAL, command=self.stats_canvas.xview)
 
-        self.stats_canvas.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        # 纵向滚动（滚动条、滚轮、滚动区域变化）时补画进入可见区域的行
+        self._stats_v_scrollbar = v_scrollbar
+        self.stats_canvas.configure(yscrollcommand=self._on_stats_yscroll, xscrollcommand=h_scrollbar.set)
 
         # 布局
         self.stats_canvas.grid(row=0, column=0, sticky='nsew')
@@ -1369,18 +1480,24 @@ class LeaveRecordApp:
         self.export_progress = ttk.Progressbar(parent, mode='determinate')
         self.export_progress.pack(fill=tk.X, pady=(8, 0))
         
-        self.export_status_label = ttk.Label(parent, text="")
-        self.export_status_label.pack(pady=(8, 0))
+        export_status_frame = tk.Frame(parent, bg=self.colors['white'])
+        export_status_frame.pack(pady=(8, 0))
+
+        self.export_status_label = ttk.Label(export_status_frame, text="")
+        self.export_status_label.pack(side=tk.LEFT)
+
+        # 导出进行中才显示
+        self.export_cancel_btn = ttk.Button(export_status_frame, text="取消导出", command=self.cancel_export)
         
         # 自动生成统计
         self.refresh_stats()
 
         # 绑定窗口大小改变事件,刷新表格
-        # 使用防抖优化，避免频繁触发
+        # 同一帧内的多次事件合并处理，避免频繁重绘
         self._last_window_width = self.root.winfo_width()
         self._last_window_height = self.root.winfo_height()
-        self._is_resizing = False
         self._last_resize_time = 0  # 记录最后一次调整时间
+        self._resize_timer = None   # 已安排的下一帧处理
         self.root.bind('<Configure>', self.on_window_resize)
 
     def create_settings_tab(self, parent):
@@ -1423,6 +1540,28 @@ class LeaveRecordApp:
                                       bg=self.colors['white'])
         auto_start_web_desc.pack(side=tk.LEFT)
 
+        # 数据存储方式
+        storage_frame = tk.Frame(general_frame, bg=self.colors['white'])
+        storage_frame.pack(fill=tk.X, pady=(0, 10))
+
+        storage_label = tk.Label(storage_frame, text="数据存储方式:",
+                                font=('Microsoft YaHei', 12),
+                                bg=self.colors['white'], fg=self.colors['fg'])
+        storage_label.pack(side=tk.LEFT)
+
+        current_label = next(label for label, backend in self.STORAGE_BACKEND_NAMES.items()
+                             if backend == self.leave_manager.backend)
+        self.storage_backend_var = tk.StringVar(value=current_label)
+        storage_combo = ttk.Combobox(storage_frame, textvariable=self.storage_backend_var,
+                                     values=list(self.STORAGE_BACKEND_NAMES.keys()),
+                                     state="readonly", width=14)
+        storage_combo.pack(side=tk.LEFT, padx=(10, 0))
+
+        storage_desc = tk.Label(storage_frame, text="  (退出程序时把现有数据复制到新的存储方式,重启后生效)",
+                               font=('Microsoft YaHei', 10), fg=self.colors['fg'],
+                               bg=self.colors['white'])
+        storage_desc.pack(side=tk.LEFT)
+
         # 备份设置分组
         backup_frame = tk.LabelFrame(main_frame, text="  备份设置  ",
                                       font=('Microsoft YaHei', 13, 'bold'),
@@ -1545,18 +1684,51 @@ class LeaveRecordApp:
         import_backup_btn.pack(side=tk.LEFT)
         self._add_button_hover_effect(import_backup_btn, self.colors['accent'], self.colors['accent_hover'])
 
+    # 备份文件名：<前缀><班级标记><时间>.zip，默认班级的班级标记为空，其他班级为 "<班级>-"
+    BACKUP_PREFIXES = ("自动备份-", "手动备份-")
+    BACKUP_TIME_LENGTH = len("2000-01-01-00-00-00")
+
+    @staticmethod
+    def _backup_class_tag(workspace: ClassWorkspace) -> str:
+        """备份文件名中注明班级的部分"""
+        return "" if workspace.name == WorkspaceManager.DEFAULT_CLASS else f"{workspace.name}-"
+
+    def _class_backup_files(self, backup_dir: str, workspace: Optional[ClassWorkspace] = None) -> List[Tuple[str, float]]:
+        """某班级（默认当前班级）的备份文件 [(文件名, 创建时间)]，最新的在前
+
+        旧版本的备份文件名中没有班级标记，只能是默认班级的数据，归入默认班级
+        """
+        class_tag = self._backup_class_tag(workspace or self.workspace)
+        backup_files = []
+        for file in os.listdir(backup_dir):
+            if not file.endswith('.zip'):
+                continue
+            file_tag = ""
+            stem = file[:-len('.zip')]
+            for prefix in self.BACKUP_PREFIXES:
+                if stem.startswith(prefix) and len(stem) >= len(prefix) + self.BACKUP_TIME_LENGTH:
+                    file_tag = stem[len(prefix):-self.BACKUP_TIME_LENGTH]
+                    break
+            if file_tag == class_tag:
+                backup_files.append((file, os.path.getctime(os.path.join(backup_dir, file))))
+        backup_files.sort(key=lambda x: x[1], reverse=True)
+        return backup_files
+
     def create_backup(self, is_auto=False):
         """创建备份"""
         try:
-            # 检查数据文件夹是否存在
-            data_dir = 'data'
+            # 自动备份在后台线程执行，先取定当前班级，备份中途切换班级也不受影响
+            workspace = self.workspace
+            # 检查当前班级的数据文件夹是否存在
+            data_dir = workspace.data_dir
             if not os.path.exists(data_dir):
                 if not is_auto:
                     messagebox.showwarning("警告", "数据文件夹不存在!\n请先运行程序并添加学生或录入请假记录,然后再创建备份。")
                 return False
 
             # 检查是否有数据文件
-            data_files = [f for f in os.listdir(data_dir) if f.endswith('.json') and f != 'settings.json']
+            data_files = [f for f in os.listdir(data_dir)
+                          if f.endswith(('.json', '.journal', '.db')) and f != 'settings.json']
             if not data_files:
                 if not is_auto:
                     messagebox.showwarning("警告", "没有找到数据文件!\n请先添加学生或录入请假记录,然后再创建备份。")
@@ -1569,23 +1741,26 @@ class LeaveRecordApp:
 
             # 生成备份文件名
             from datetime import datetime
+            # 默认班级之外的班级在文件名中注明班级
+            class_tag = self._backup_class_tag(workspace)
             if is_auto:
-                backup_filename = f"自动备份-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.zip"
+                backup_filename = f"自动备份-{class_tag}{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.zip"
             else:
-                backup_filename = f"手动备份-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.zip"
+                backup_filename = f"手动备份-{class_tag}{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.zip"
             backup_path = os.path.join(backup_dir, backup_filename)
 
-            # 创建ZIP文件
+            # 创建ZIP文件（复制期间暂停保存，数据库和日志不会在复制中途被修改）
             import zipfile
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            with workspace.leave_manager.paused_writes(), \
+                    zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 # 添加数据文件(排除settings.json)
                 for file in data_files:
                     file_path = os.path.join(data_dir, file)
                     if os.path.isfile(file_path):
                         zipf.write(file_path, os.path.basename(file_path))
 
-            # 备份成功后,自动删除旧备份
-            self.auto_delete_old_backups()
+            # 备份成功后,自动删除该班级的旧备份
+            self.auto_delete_old_backups(workspace)
 
             # 显示备份成功信息
             if is_auto:
@@ -1603,15 +1778,15 @@ class LeaveRecordApp:
                 messagebox.showerror("错误", f"创建备份失败: {str(e)}")
             return False
 
-    def auto_delete_old_backups(self):
-        """自动删除旧备份,保留最新的N个"""
+    def auto_delete_old_backups(self, workspace: Optional[ClassWorkspace] = None):
+        """自动删除旧备份,每个班级各自保留最新的N个"""
         try:
             backup_dir = 'backup'
             if not os.path.exists(backup_dir):
                 return
 
-            # 获取所有备份文件
-            backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.zip')]
+            # 获取该班级的备份文件(最新的在前)
+            backup_files_with_time = self._class_backup_files(backup_dir, workspace)
 
             # 获取保留数量
             keep_count = getattr(self, 'backup_delete_var', None)
@@ -1620,17 +1795,7 @@ class LeaveRecordApp:
             else:
                 keep_count = keep_count.get()
 
-            if len(backup_files) > keep_count:
-                # 按创建时间排序,保留最新的N个
-                backup_files_with_time = []
-                for file in backup_files:
-                    file_path = os.path.join(backup_dir, file)
-                    creation_time = os.path.getctime(file_path)
-                    backup_files_with_time.append((file, creation_time))
-
-                # 按创建时间降序排序(最新的在前)
-                backup_files_with_time.sort(key=lambda x: x[1], reverse=True)
-
+            if len(backup_files_with_time) > keep_count:
                 # 删除超过保留数量的旧备份
                 files_to_delete = backup_files_with_time[keep_count:]
                 for file, _ in files_to_delete:
@@ -1652,18 +1817,15 @@ class LeaveRecordApp:
                 # 没有备份文件夹,需要创建备份
                 return True
 
-            # 获取所有备份文件
-            backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.zip')]
+            # 获取当前班级的备份文件(最新的在前)
+            backup_files = self._class_backup_files(backup_dir)
 
             if not backup_files:
-                # 没有备份文件,需要创建备份
+                # 当前班级没有备份文件,需要创建备份
                 return True
 
-            # 获取最后一个备份文件的创建时间
-            backup_files.sort(key=lambda x: os.path.getctime(os.path.join(backup_dir, x)))
-            last_backup_file = backup_files[-1]
-            last_backup_path = os.path.join(backup_dir, last_backup_file)
-            last_backup_time = os.path.getctime(last_backup_path)
+            # 获取当前班级最后一个备份文件的创建时间
+            last_backup_time = backup_files[0][1]
 
             # 获取自动备份频率
             backup_freq = getattr(self, 'backup_freq_var', None)
@@ -1692,11 +1854,11 @@ class LeaveRecordApp:
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
 
-        # 获取备份文件列表
-        backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.zip')]
+        # 只列出当前班级的备份，其他班级的备份不能恢复到当前班级
+        backup_files_with_time = self._class_backup_files(backup_dir)
 
-        if not backup_files:
-            messagebox.showinfo("提示", "没有找到备份文件!")
+        if not backup_files_with_time:
+            messagebox.showinfo("提示", f"没有找到班级“{self.workspace.name}”的备份文件!")
             return
 
         # 创建备份文件选择对话框
@@ -1724,16 +1886,7 @@ class LeaveRecordApp:
         scrollbar = ttk.Scrollbar(dialog, orient=tk.VERTICAL, command=listbox.yview)
         listbox.config(yscrollcommand=scrollbar.set)
 
-        # 按文件创建时间排序(最新的在前)
-        backup_files_with_time = []
-        for file in backup_files:
-            file_path = os.path.join(backup_dir, file)
-            creation_time = os.path.getctime(file_path)
-            backup_files_with_time.append((file, creation_time))
-
-        # 按创建时间降序排序(最新的在前)
-        backup_files_with_time.sort(key=lambda x: x[1], reverse=True)
-
+        # 最新的在前
         for backup_file, _ in backup_files_with_time:
             listbox.insert(tk.END, backup_file)
 
@@ -1755,13 +1908,15 @@ class LeaveRecordApp:
             # 确认对话框
             if messagebox.askyesno("警告", f"确定要恢复备份 '{selected_file}' 吗?\n当前数据将被覆盖!"):
                 try:
-                    # 解压备份文件到data文件夹
+                    # 解压备份文件到当前班级的数据文件夹
                     import zipfile
-                    data_dir = 'data'
+                    data_dir = self.workspace.data_dir
                     if not os.path.exists(data_dir):
                         os.makedirs(data_dir)
 
                     with zipfile.ZipFile(backup_path, 'r') as zip_ref:
+                        # 先释放当前的数据文件（清除旧日志、关闭数据库）
+                        self.leave_manager.prepare_restore(zip_ref.namelist())
                         zip_ref.extractall(data_dir)
 
                     messagebox.showinfo("成功", "备份已恢复!")
@@ -1770,6 +1925,7 @@ class LeaveRecordApp:
                     # 重新加载数据
                     self.student_manager.load_students()
                     self.leave_manager.load_records()
+                    self._show_load_warnings()
                     self.refresh_students_list()
                     self.refresh_frequent_list()
                 except Exception as e:
@@ -1834,15 +1990,20 @@ class LeaveRecordApp:
         except:
             pass
 
-    def save_settings(self):
-        """保存设置到文件"""
+    def save_settings(self, storage_backend: Optional[str] = None):
+        """保存设置到文件
+
+        存储方式只在退出时数据复制完成后切换（storage_backend），其他时候保存的是正在使用的存储方式
+        """
         try:
             settings = {
                 'auto_start_web': self.auto_start_web_var.get(),
                 'backup_freq': self.backup_freq_var.get(),
                 'backup_delete': self.backup_delete_var.get(),
                 'frequent_days': self.frequent_days_var.get(),
-                'frequent_count': self.frequent_count_var.get()
+                'frequent_count': self.frequent_count_var.get(),
+                'storage_backend': storage_backend or self.workspaces.backend,
+                'active_class': self.workspace.name
             }
             settings_file = os.path.join('data', 'settings.json')
             with open(settings_file, 'w', encoding='utf-8') as f:
@@ -1867,6 +2028,10 @@ class LeaveRecordApp:
                         self.frequent_days_var.set(settings['frequent_days'])
                     if 'frequent_count' in settings:
                         self.frequent_count_var.set(settings['frequent_count'])
+                    if 'storage_backend' in settings:
+                        for label, backend in self.STORAGE_BACKEND_NAMES.items():
+                            if backend == settings['storage_backend']:
+                                self.storage_backend_var.set(label)
         except Exception as e:
             pass
 
@@ -2074,19 +2239,14 @@ class LeaveRecordApp:
     def refresh_students_list(self):
         """刷新学生列表（显示全天半天选项）"""
         students = self.student_manager.get_students()
+        self.students_list.set_items(students, self._leave_type_values)
 
-        # 清空表格
-        for item in self.students_tree.get_children():
-            self.students_tree.delete(item)
-
-        # 添加学生到表格
-        for i, student in enumerate(students):
-            leave_type = self.student_leave_types.get(student, None)
-            full_check = "✓" if leave_type == "full" else ""
-            half_check = "✓" if leave_type == "half" else ""
-            # 为每两行之间添加灰色分隔线
-            tag = 'even' if (i + 1) % 2 == 0 else 'odd'
-            self.students_tree.insert("", tk.END, values=(student, full_check, half_check), tags=(tag,))
+    def _leave_type_values(self, student: str) -> tuple:
+        """学生在表格中的一行 (姓名, 全天, 半天)"""
+        leave_type = self.student_leave_types.get(student, None)
+        full_check = "✓" if leave_type == "full" else ""
+        half_check = "✓" if leave_type == "half" else ""
+        return student, full_check, half_check
 
     def refresh_frequent_list(self):
         """刷新常请假名单（显示全天半天选项）"""
@@ -2105,19 +2265,7 @@ class LeaveRecordApp:
             threshold = threshold.get()
 
         frequent_students = self.leave_manager.get_frequent_leavers(days=days, threshold=threshold)
-
-        # 清空表格
-        for item in self.frequent_tree.get_children():
-            self.frequent_tree.delete(item)
-
-        # 添加学生到表格
-        for i, student in enumerate(frequent_students):
-            leave_type = self.student_leave_types.get(student, None)
-            full_check = "✓" if leave_type == "full" else ""
-            half_check = "✓" if leave_type == "half" else ""
-            # 为每两行之间添加灰色分隔线
-            tag = 'even' if (i + 1) % 2 == 0 else 'odd'
-            self.frequent_tree.insert("", tk.END, values=(student, full_check, half_check), tags=(tag,))
+        self.frequent_rows.sync([(student, self._leave_type_values(student)) for student in frequent_students])
 
     def update_student_combos(self):
         """更新学生下拉框"""
@@ -2138,8 +2286,9 @@ class LeaveRecordApp:
 
             if item:
                 # 获取学生姓名
-                values = self.students_tree.item(item, "values")
-                student_name = values[0]
+                student_name = self.students_list.key_of(item)
+                if student_name is None:
+                    return
 
                 # 获取列索引 (列名是 "#1", "#2", "#3" 之类的格式)
                 col_index = int(column[1:]) - 1
@@ -2223,8 +2372,9 @@ class LeaveRecordApp:
 
             if item:
                 # 获取学生姓名
-                values = self.frequent_tree.item(item, "values")
-                student_name = values[0]
+                student_name = self.frequent_rows.key_of(item)
+                if student_name is None:
+                    return
 
                 # 获取列索引 (列名是 "#1", "#2", "#3" 之类的格式)
                 col_index = int(column[1:]) - 1
@@ -2285,13 +2435,14 @@ class LeaveRecordApp:
         def add_student():
             name = name_var.get().strip()
             if name:
-                if self.student_manager.add_student(name):
+                error = self.student_manager.add_error(name)
+                if error is None and self.student_manager.add_student(name):
                     messagebox.showinfo("成功", f"已添加学生: {name}")
                     self.refresh_students_list()
                     self.update_student_combos()
                     dialog.destroy()
                 else:
-                    messagebox.showwarning("警告", "该学生已存在或姓名为空")
+                    messagebox.showwarning("警告", error or "添加学生失败")
             else:
                 messagebox.showwarning("警告", "请输入学生姓名")
         
@@ -2333,8 +2484,17 @@ class LeaveRecordApp:
             names = [name.strip() for name in content.split('\n') if name.strip()]
             
             if names:
-                count = self.student_manager.batch_import(names)
-                messagebox.showinfo("成功", f"成功导入 {count} 个学生")
+                result = self.student_manager.batch_import(names)
+                message = f"成功导入 {len(result.added)} 个学生"
+                if result.duplicates:
+                    message += f"\n跳过重复 {len(result.duplicates)} 个: " + "、".join(result.duplicates[:10])
+                    if len(result.duplicates) > 10:
+                        message += " 等"
+                if result.invalid:
+                    message += f"\n无效姓名 {len(result.invalid)} 个: " + "、".join(result.invalid[:10])
+                    if len(result.invalid) > 10:
+                        message += " 等"
+                messagebox.showinfo("成功", message)
                 self.refresh_students_list()
                 self.update_student_combos()
                 dialog.destroy()
@@ -2349,9 +2509,7 @@ class LeaveRecordApp:
 
     def get_weekday(self, date_str: str) -> str:
         """获取星期几"""
-        date = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-        weekdays = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
-        return weekdays[date.weekday()]
+        return WEEKDAY_NAMES[date_weekday(date_str)]
     
     def on_date_selected(self, date_str: str):
         """日期选择事件"""
@@ -2465,6 +2623,63 @@ class LeaveRecordApp:
             self.refresh_students_list()
             self.refresh_frequent_list()
 
+    def show_rename_student_dialog(self):
+        """显示修改学生姓名对话框（居中显示）"""
+        students = self.student_manager.get_students()
+        if not students:
+            messagebox.showinfo("提示", "没有学生可修改")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("修改姓名")
+        dialog.geometry("300x200")
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        # 居中显示
+        dialog.update_idletasks()
+        width = dialog.winfo_width()
+        height = dialog.winfo_height()
+        x = (dialog.winfo_screenwidth() // 2) - (width // 2)
+        y = (dialog.winfo_screenheight() // 2) - (height // 2)
+        dialog.geometry(f'{width}x{height}+{x}+{y}')
+
+        ttk.Label(dialog, text="选择学生:").pack(pady=(10, 5))
+        old_name_var = tk.StringVar(value=students[0])
+        ttk.Combobox(dialog, textvariable=old_name_var, values=students, state="readonly", width=18).pack()
+
+        ttk.Label(dialog, text="新姓名:").pack(pady=(10, 5))
+        new_name_var = tk.StringVar()
+        name_entry = ttk.Entry(dialog, textvariable=new_name_var, width=20)
+        name_entry.pack()
+        name_entry.focus()
+
+        def rename_student():
+            old_name = old_name_var.get()
+            new_name = new_name_var.get().strip()
+            if not new_name:
+                messagebox.showwarning("警告", "请输入新姓名")
+                return
+            if self.leave_manager.rename_student(old_name, new_name):
+                # 录入界面中未保存的勾选也跟着改名
+                if old_name in self.student_leave_types:
+                    self.student_leave_types[new_name] = self.student_leave_types.pop(old_name)
+                messagebox.showinfo("成功", f"已将 {old_name} 改名为 {new_name}")
+                self.refresh_students_list()
+                self.refresh_frequent_list()
+                self.update_student_combos()
+                dialog.destroy()
+            else:
+                messagebox.showwarning("警告", self.student_manager.name_error(new_name) or "新姓名已被使用")
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+
+        ttk.Button(button_frame, text="确定", command=rename_student).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+
+        name_entry.bind('<Return>', lambda e: rename_student())
+
     def show_remove_student_dialog(self):
         """显示删除学生对话框"""
         students = self.student_manager.get_students()
@@ -2609,27 +2824,8 @@ class LeaveRecordApp:
     
     def _update_leave_records_with_transaction(self, date_str: str, selected_students: list):
         """使用事务方式更新请假记录"""
-        # 临时存储旧数据，以便回滚
-        old_records = self.leave_manager.records.copy()
-
-        try:
-            # 删除该日期的现有记录（不立即保存）
-            if date_str in self.leave_manager.records:
-                del self.leave_manager.records[date_str]
-
-            # 添加新记录（不立即保存）
-            for student, leave_type in selected_students:
-                if date_str not in self.leave_manager.records:
-                    self.leave_manager.records[date_str] = {}
-                self.leave_manager.records[date_str][student] = {"type": leave_type}
-
-            # 统一保存到文件
-            self.leave_manager.save_records()
-
-        except Exception as e:
-            # 回滚到旧数据
-            self.leave_manager.records = old_records
-            raise e
+        # 整体替换该日期的记录，只追加写日志；写入失败时由管理器回滚该天数据
+        self.leave_manager.save_day_records(date_str, dict(selected_students))
 
     def _reenable_save_button(self):
         """重新启用保存按钮"""
@@ -2643,34 +2839,8 @@ class LeaveRecordApp:
         self.refresh_students_list()
         self.refresh_frequent_list()
     
-    def _format_text_with_linebreaks(self, text, max_chars_per_line=15):
-        """将长文本格式化为多行显示，返回格式化后的文本和行数"""
-        if not text or len(text) <= max_chars_per_line:
-            return text, 1
-
-        # 按逗号分割名字
-        names = [name.strip() for name in text.split(",")]
-        lines = []
-        current_line = ""
-
-        for name in names:
-            if not current_line:
-                current_line = name
-            elif len(current_line + ", " + name) <= max_chars_per_line:
-                current_line += ", " + name
-            else:
-                lines.append(current_line)
-                current_line = name
-
-        if current_line:
-            lines.append(current_line)
-
-        # 用换行符连接
-        formatted_text = "\n".join(lines)
-        return formatted_text, len(lines)
-
-    def generate_statistics(self):
-        """生成统计（使用Canvas绘制表格，支持动态行高）"""
+    def _resolve_stats_range(self) -> Tuple[str, str]:
+        """根据统计类型确定日期范围"""
         stats_type = self.stats_type_var.get()
 
         # 确定日期范围
@@ -2678,92 +2848,90 @@ class LeaveRecordApp:
             start_date = self.date_var.get()
             end_date = start_date
         elif stats_type == "week":
-            today = datetime.datetime.now()
-            weekday = today.weekday()
-            monday = today - datetime.timedelta(days=weekday)
-            start_date = monday.strftime("%Y-%m-%d")
-            end_date = (monday + datetime.timedelta(days=6)).strftime("%Y-%m-%d")
+            start_date, end_date = week_range()
         elif stats_type == "month":
-            today = datetime.datetime.now()
-            start_date = today.replace(day=1).strftime("%Y-%m-%d")
-            if today.month == 12:
-                end_date = datetime.datetime(today.year + 1, 1, 1) - datetime.timedelta(days=1)
-            else:
-                end_date = datetime.datetime(today.year, today.month + 1, 1) - datetime.timedelta(days=1)
-            end_date = end_date.strftime("%Y-%m-%d")
+            start_date, end_date = month_range()
         else:  # custom
             start_date = self.start_date_var.get()
             end_date = self.end_date_var.get()
 
-        # 获取所有请假记录
-        all_dates = self.leave_manager.get_all_dates()
+        return start_date, end_date
+
+    def _query_current_statistics(self) -> StatisticsResult:
+        """按界面上选择的统计类型和学生查询统计结果（统计表格和导出共用缓存）"""
+        start_date, end_date = self._resolve_stats_range()
         selected_student = self.selected_student_var.get()
+        student = None if selected_student == "全部学生" else selected_student
+        return self.leave_manager.query_statistics(start_date, end_date, student)
+
+    def generate_statistics(self):
+        """生成统计（使用Canvas绘制表格，支持动态行高）"""
+        result = self._query_current_statistics()
+
+        # 统计结果（命中缓存时是同一个对象）和画布宽度都没变时，例如来回切换选项卡，无需重绘
+        canvas_width = self.stats_canvas.winfo_width()
+        if result is self._drawn_stats_result and canvas_width == self._drawn_stats_width:
+            return
+        if result is self._drawn_stats_result and self._current_stats_data is not None:
+            # 统计结果没变、只是宽度变了：沿用同一份数据，行布局缓存也能命中
+            self._drawn_stats_width = canvas_width
+            self._draw_stats_canvas(self._current_stats_data)
+            return
+        self._drawn_stats_result = result
+        self._drawn_stats_width = canvas_width
 
         # 准备数据
         data = []
-        if selected_student == "全部学生":
-            # 按日期聚合统计
-            date_stats = {}
-            for date_str in all_dates:
-                if start_date <= date_str <= end_date:
-                    records = self.leave_manager.get_leave_records(date_str)
-                    if date_str not in date_stats:
-                        date_stats[date_str] = {"full": 0, "half": 0, "students": set(), "full_students": [], "half_students": []}
-                    for name, record in records.items():
-                        if record["type"] == "full":
-                            date_stats[date_str]["full"] += 1
-                            date_stats[date_str]["full_students"].append(name)
-                        else:
-                            date_stats[date_str]["half"] += 1
-                            date_stats[date_str]["half_students"].append(name)
-                        date_stats[date_str]["students"].add(name)
-
-            for date_str in sorted(date_stats.keys()):
-                weekday = self.get_weekday(date_str)
-                count = len(date_stats[date_str]["students"])
-                full_students = sorted(date_stats[date_str]["full_students"])
-                half_students = sorted(date_stats[date_str]["half_students"])
-                data.append({
-                    "date": date_str,
-                    "weekday": weekday,
-                    "count": f"{count}人",
-                    "full_students": full_students,
-                    "half_students": half_students
-                })
-        else:
-            # 单个学生统计
-            for date_str in all_dates:
-                if start_date <= date_str <= end_date:
-                    records = self.leave_manager.get_leave_records(date_str)
-                    if selected_student in records:
-                        record = records[selected_student]
-                        weekday = self.get_weekday(date_str)
-                        full = record["type"] == "full"
-                        half = record["type"] == "half"
-                        data.append({
-                            "date": date_str,
-                            "weekday": weekday,
-                            "count": selected_student,
-                            "full_students": [selected_student] if full else [],
-                            "half_students": [selected_student] if half else []
-                        })
+        for row in result.rows:
+            if result.student is None:
+                count = f"{len(row.full_students) + len(row.half_students)}人"
+            else:
+                count = result.student
+            data.append({
+                "date": row.date,
+                "weekday": WEEKDAY_NAMES[row.weekday],
+                "count": count,
+                "full_students": row.full_students,
+                "half_students": row.half_students
+            })
 
         # 使用Canvas绘制表格
         self._draw_stats_canvas(data)
 
+    # 可见区域上下各多画的高度（占可见高度的比例），小幅滚动时不需要补画
+    STATS_OVERSCAN = 0.5
+    # 名单列的字体和左右留白（换行按该字体的实际像素宽度计算）
+    STATS_NAME_FONT = ('Microsoft YaHei UI', 9)
+    STATS_CELL_PADDING = 10
+    # 保留的行布局数（不同换行宽度，例如最大化和还原窗口来回切换）
+    STATS_LAYOUT_CACHE_SIZE = 4
+
     def _draw_stats_canvas(self, data):
-        """使用Canvas绘制统计表格，支持动态行高，文字居中，宽度占满（性能优化版）"""
-        # 保存当前数据，避免重复计算
+        """使用Canvas绘制统计表格，支持动态行高，文字居中，宽度占满（性能优化版）
+
+        行布局（名单换行、行高）按数据和换行宽度缓存，表格总高度和滚动区域直接由布局得到，
+        只绘制可见区域（加上预留）内的行，滚动时再补画进入可见区域的行。
+        """
+        # 保存当前数据，避免重复计算；数据换了时行布局缓存随之失效
+        if data is not self._current_stats_data:
+            self._stats_data_version += 1
+            self._stats_layout_cache.clear()
         self._current_stats_data = data
 
-        # 快速清空Canvas，不使用禁用/启用机制（实现实时效果）
-        self.stats_canvas.delete("all")
+        # 正在显示的行都收回待用，下面绘制时直接修改这些图形，不删除重建
+        self._release_stats_rows()
+        self._stats_layout = None
+        self._stats_band = None
 
         # 获取Canvas宽度
         canvas_width = self.stats_canvas.winfo_width()
 
         # 如果Canvas宽度太小，说明可能还没有正确渲染，延迟重绘
         if canvas_width < 50:
+            # 先隐藏表格
+            self._hide_free_stats_rows()
+            if self._stats_header_items is not None:
+                self._hide_stats_row_items(self._stats_header_items)
             # 保存数据以便延迟重绘
             self._pending_stats_data = data
             # 延迟30ms后重绘（更快响应）
@@ -2778,13 +2946,12 @@ class LeaveRecordApp:
             canvas_width * 0.305, # 全天
             canvas_width * 0.305  # 半天
         ]
-        row_height_base = 30
-        line_height = 22
-        x_padding = 10
-        y_padding = 10
-
-        # 判断是否为单个学生统计
-        is_single_student = len(data) > 0 and "人" not in data[0]['count']
+        wrap_width = int(col_widths[3]) - 2 * self.STATS_CELL_PADDING
+        layout = self._stats_layout_for(data, wrap_width)
+        layout.col_widths = col_widths
+        layout.canvas_width = canvas_width
+        is_single_student = layout.is_single_student
+        header_height = layout.header_height
 
         # 根据统计类型设置第三个标题
         if is_single_student:
@@ -2792,255 +2959,233 @@ class LeaveRecordApp:
         else:
             headers = ["日期", "星期", "人数", "全天", "半天"]
 
-        # 绘制表头
-        y_pos = 0
-        header_height = 40
+        # 表头（背景、文字和边框，图形只创建一次）
+        if self._stats_header_items is None:
+            self._stats_header_items = StatsRowItems(self.stats_canvas, "header")
+        header_font = ('Microsoft YaHei UI', 11, 'bold')
+        self._place_stats_row_items(self._stats_header_items, layout, 0, header_height,
+                                    [(header, header_font) for header in headers], '#4472C4', 'white', '#FFFFFF')
 
-        # 表头背景
-        self.stats_canvas.create_rectangle(0, 0, canvas_width, header_height, fill='#4472C4', outline='')
+        # 设置Canvas滚动区域（总高度由行高直接算出）
+        self._stats_layout = layout
+        self.stats_canvas.config(scrollregion=(0, 0, canvas_width, layout.total_height))
 
-        # 表头文字
-        x_pos = 0
-        for i, (header, width) in enumerate(zip(headers, col_widths)):
-            self.stats_canvas.create_text(
-                x_pos + width // 2,
-                header_height // 2,
-                text=header,
-                fill='white',
-                font=('Microsoft YaHei UI', 11, 'bold')
-            )
-            x_pos += width
+        # 绘制可见区域内的行
+        self._render_stats_viewport()
 
-        # 绘制表头边框
-        x_pos = 0
-        for width in col_widths:
-            # 绘制垂直线
-            self.stats_canvas.create_line(x_pos, 0, x_pos, header_height, fill='#FFFFFF', width=2)
-            x_pos += width
-        # 绘制底部水平线
-        self.stats_canvas.create_line(0, header_height, canvas_width, header_height, fill='#FFFFFF', width=2)
+        # 强制立即更新，实现实时效果
+        self.stats_canvas.update_idletasks()
+
+    def _stats_layout_for(self, data, wrap_width: int) -> StatsTableLayout:
+        """取得统计数据的行布局，按 (数据版本, 换行宽度) 缓存
 
-        # 绘制数据行
-        y_pos = header_height
+        名单换行和行高只在数据或换行宽度变化时计算一次，窗口缩放、滚动和切换选项卡后的重绘都直接复用。
+        """
+        key = (self._stats_data_version, wrap_width)
+        layout = self._stats_layout_cache.get(key)
+        if layout is not None:
+            self._stats_layout_cache.move_to_end(key)
+            return layout
 
-        # 统计全天和半天的次数（用于单个学生统计）
+        header_height = 40
+        row_height_base = 30
+        line_height = 22
+        summary_height = 40
+
+        # 判断是否为单个学生统计
+        is_single_student = len(data) > 0 and "人" not in data[0]['count']
+
+        # 名单按像素宽度换行并计算每行的行高，单个学生统计同时统计全天和半天的次数
+        measure = textmeasure.measurer(self.STATS_NAME_FONT)
+        heights = []
+        lines = []
         total_full_count = 0
         total_half_count = 0
+        for row_data in data:
+            full_lines = measure.wrap_names(", ".join(row_data['full_students']), wrap_width)
+            half_lines = measure.wrap_names(", ".join(row_data['half_students']), wrap_width)
+            max_lines = max(len(full_lines), len(half_lines), 1)
+            heights.append(row_height_base + (max_lines - 1) * line_height)
+            lines.append((full_lines, half_lines))
+            if row_data['full_students']:
+                total_full_count += 1
+            if row_data['half_students']:
+                total_half_count += 1
+        # 单个学生统计时最后加一行汇总
+        if is_single_student and data:
+            heights.append(summary_height)
+            lines.append(([], []))
+
+        layout = StatsTableLayout(header_height, heights, lines, line_height, is_single_student,
+                                  (total_full_count, total_half_count))
+
+        self._stats_layout_cache[key] = layout
+        while len(self._stats_layout_cache) > self.STATS_LAYOUT_CACHE_SIZE:
+            self._stats_layout_cache.popitem(last=False)
+        return layout
+
+    def _on_stats_yscroll(self, first, last):
+        """统计表格纵向滚动回调：更新滚动条并补画可见区域的行"""
+        self._stats_v_scrollbar.set(first, last)
+        self._render_stats_viewport()
+
+    def _render_stats_viewport(self):
+        """只绘制与可见区域（上下加预留）相交的行，离开该范围的行的图形留给进入该范围的行使用"""
+        layout = self._stats_layout
+        if layout is None or not layout.heights:
+            self._hide_free_stats_rows()
+            return
 
-        # 确保Canvas已完全更新后再绘制
-        self.stats_canvas.update_idletasks()
+        view_top = self.stats_canvas.canvasy(0)
+        view_height = max(self.stats_canvas.winfo_height(), 1)
+        view_bottom = view_top + view_height
 
-        for row_data in data:
-            weekday = row_data['weekday']
+        # 已绘制的行仍覆盖可见区域时无需处理
+        band = self._stats_band
+        if band is not None and layout.tops[band[0]] <= max(view_top, layout.header_height) \
+                and layout.tops[band[1] + 1] >= min(view_bottom, layout.total_height):
+            return
 
-            # 确定背景色
-            if weekday == "周六":
-                bg_color = '#FFE699'
-            elif weekday == "周日":
-                bg_color = '#FFC7CE'
-            else:
-                bg_color = '#D9E1F2'
-
-            # 计算需要的行数
-            full_text = ", ".join(row_data['full_students'])
-            half_text = ", ".join(row_data['half_students'])
-
-            full_lines = self._count_lines(full_text, 20)
-            half_lines = self._count_lines(half_text, 20)
-            max_lines = max(full_lines, half_lines, 1)
-
-            # 计算行高
-            row_height = row_height_base + (max_lines - 1) * line_height
-
-            # 绘制行背景
-            self.stats_canvas.create_rectangle(0, y_pos, canvas_width, y_pos + row_height, fill=bg_color, outline='')
-
-            # 绘制单元格内容
-            x_pos = 0
-
-            # 日期
-            self.stats_canvas.create_text(
-                x_pos + col_widths[0] // 2,
-                y_pos + row_height // 2,
-                text=row_data['date'],
-                fill='#2C3E50',
-                font=('Microsoft YaHei UI', 10)
-            )
-            x_pos += col_widths[0]
-
-            # 星期
-            self.stats_canvas.create_text(
-                x_pos + col_widths[1] // 2,
-                y_pos + row_height // 2,
-                text=row_data['weekday'],
-                fill='#2C3E50',
-                font=('Microsoft YaHei UI', 10)
-            )
-            x_pos += col_widths[1]
-
-            # 人数
-            self.stats_canvas.create_text(
-                x_pos + col_widths[2] // 2,
-                y_pos + row_height // 2,
-                text=row_data['count'],
-                fill='#2C3E50',
-                font=('Microsoft YaHei UI', 10)
-            )
-            x_pos += col_widths[2]
-
-            # 全天（多行文本，居中）
-            if is_single_student:
-                # 单个学生统计，显示打钩
-                if full_text:
-                    self.stats_canvas.create_text(
-                        x_pos + col_widths[3] // 2,
-                        y_pos + row_height // 2,
-                        text="✓",
-                        fill='#2C3E50',
-                        font=('Microsoft YaHei UI', 16, 'bold')
-                    )
-                    total_full_count += 1
-            else:
-                # 全部学生统计，显示学生名单
-                if full_text:
-                    # 计算多行文本的总高度
-                    total_text_height = full_lines * line_height
-                    # 计算起始Y坐标，使文本在单元格中完全居中
-                    start_y = y_pos + (row_height - total_text_height) // 2
-                    self._draw_multiline_text_centered(
-                        self.stats_canvas,
-                        full_text,
-                        x_pos,
-                        start_y,
-                        col_widths[3],
-                        line_height,
-                        20
-                    )
-
-            x_pos += col_widths[3]
-
-            # 半天（多行文本，居中）
-            if is_single_student:
-                # 单个学生统计，显示打钩
-                if half_text:
-                    self.stats_canvas.create_text(
-                        x_pos + col_widths[4] // 2,
-                        y_pos + row_height // 2,
-                        text="✓",
-                        fill='#2C3E50',
-                        font=('Microsoft YaHei UI', 16, 'bold')
-                    )
-                    total_half_count += 1
-            else:
-                # 全部学生统计，显示学生名单
-                if half_text:
-                    # 计算多行文本的总高度
-                    total_text_height = half_lines * line_height
-                    # 计算起始Y坐标，使文本在单元格中完全居中
-                    start_y = y_pos + (row_height - total_text_height) // 2
-                    self._draw_multiline_text_centered(
-                        self.stats_canvas,
-                        half_text,
-                        x_pos,
-                        start_y,
-                        col_widths[4],
-                        line_height,
-                        20
-                    )
-
-            # 绘制单元格边框（增强网格线）
-            x_pos = 0
-            for width in col_widths:
-                # 绘制垂直线
-                self.stats_canvas.create_line(x_pos, y_pos, x_pos, y_pos + row_height, fill='#95A5A6', width=2)
-                x_pos += width
-            # 绘制水平线（底部）
-            self.stats_canvas.create_line(0, y_pos + row_height, canvas_width, y_pos + row_height, fill='#95A5A6', width=2)
-
-            y_pos += row_height
-
-        # 如果是单个学生统计，添加汇总行
-        if is_single_student and data:
-            # 绘制汇总行背景
-            summary_height = 40
-            summary_bg_color = '#4472C4'
-            self.stats_canvas.create_rectangle(0, y_pos, canvas_width, y_pos + summary_height, fill=summary_bg_color, outline='')
-
-            # 绘制汇总行内容
-            x_pos = 0
-
-            # 前两列合并显示"合计"
-            self.stats_canvas.create_text(
-                x_pos + col_widths[0] // 2,
-                y_pos + summary_height // 2,
-                text="合计",
-                fill='white',
-                font=('Microsoft YaHei UI', 11, 'bold')
-            )
-            self.stats_canvas.create_text(
-                x_pos + col_widths[0] + col_widths[1] // 2,
-                y_pos + summary_height // 2,
-                text="",
-                fill='white',
-                font=('Microsoft YaHei UI', 11, 'bold')
-            )
-            x_pos += col_widths[0] + col_widths[1]
-
-            # 人数列显示学生姓名
-            student_name = data[0]['count'] if data else ""
-            self.stats_canvas.create_text(
-                x_pos + col_widths[2] // 2,
-                y_pos + summary_height // 2,
-                text=student_name,
-                fill='white',
-                font=('Microsoft YaHei UI', 11, 'bold')
-            )
-            x_pos += col_widths[2]
-
-            # 全天列显示统计次数
-            self.stats_canvas.create_text(
-                x_pos + col_widths[3] // 2,
-                y_pos + summary_height // 2,
-                text=f"{total_full_count}次",
-                fill='white',
-                font=('Microsoft YaHei UI', 11, 'bold')
-            )
-            x_pos += col_widths[3]
-
-            # 半天列显示统计次数
-            self.stats_canvas.create_text(
-                x_pos + col_widths[4] // 2,
-                y_pos + summary_height // 2,
-                text=f"{total_half_count}次",
-                fill='white',
-                font=('Microsoft YaHei UI', 11, 'bold')
-            )
-
-            # 绘制汇总行边框
-            x_pos = 0
-            for width in col_widths:
-                # 绘制垂直线
-                self.stats_canvas.create_line(x_pos, y_pos, x_pos, y_pos + summary_height, fill='#FFFFFF', width=2)
-                x_pos += width
-            # 绘制底部水平线
-            self.stats_canvas.create_line(0, y_pos + summary_height, canvas_width, y_pos + summary_height, fill='#FFFFFF', width=2)
-
-            y_pos += summary_height
-
-        # 设置Canvas滚动区域
-        self.stats_canvas.config(scrollregion=(0, 0, canvas_width, y_pos))
+        overscan = view_height * self.STATS_OVERSCAN
+        first = layout.row_at(view_top - overscan)
+        last = layout.row_at(view_bottom + overscan)
+
+        # 离开该范围的行收回待用，进入该范围的行用收回的图形绘制，剩下没用上的隐藏
+        self._release_stats_rows(first, last)
+        for index in range(first, last + 1):
+            if index not in self._stats_row_items:
+                self._draw_stats_row(layout, index)
+        self._hide_free_stats_rows()
+        self._stats_band = (first, last)
+
+    def _release_stats_rows(self, first: int = 0, last: int = -1):
+        """收回第 first 到 last 行以外的行的图形（默认全部收回），先不隐藏，留给接下来绘制的行使用"""
+        for index in [index for index in self._stats_row_items if index < first or index > last]:
+            self._stats_free_row_items.append(self._stats_row_items.pop(index))
+
+    def _hide_free_stats_rows(self):
+        """隐藏收回后没有再用上的行"""
+        for items in self._stats_free_row_items:
+            if items.visible:
+                self._hide_stats_row_items(items)
+
+    def _hide_stats_row_items(self, items: StatsRowItems):
+        self.stats_canvas.itemconfigure(items.tag, state='hidden')
+        self.stats_canvas.dtag(items.tag, StatsRowItems.VISIBLE_TAG)
+        items.visible = False
+
+    def _draw_stats_row(self, layout: StatsTableLayout, index: int):
+        """绘制统计表格的第 index 行（单个学生统计时最后一行为汇总行），优先使用收回待用的图形"""
+        if self._stats_free_row_items:
+            items = self._stats_free_row_items.pop()
+        else:
+            count = len(self._stats_row_items) + len(self._stats_free_row_items)
+            items = StatsRowItems(self.stats_canvas, f"row_items{count}")
+        self._stats_row_items[index] = items
 
-        # 强制立即更新，实现实时效果
-        self.stats_canvas.update_idletasks()
+        data = self._current_stats_data
+        y_pos = layout.tops[index]
+        row_height = layout.heights[index]
+
+        if index == len(data):
+            self._draw_stats_summary_row(layout, items, y_pos, row_height)
+            return
+
+        row_data = data[index]
+        weekday = row_data['weekday']
+
+        # 确定背景色
+        if weekday == "周六":
+            bg_color = '#FFE699'
+        elif weekday == "周日":
+            bg_color = '#FFC7CE'
+        else:
+            bg_color = '#D9E1F2'
+
+        full_lines, half_lines = layout.lines[index]
+
+        # 日期、星期、人数
+        cell_font = ('Microsoft YaHei UI', 10)
+        cells = [(row_data['date'], cell_font), (row_data['weekday'], cell_font), (row_data['count'], cell_font)]
+        if layout.is_single_student:
+            # 单个学生统计，全天、半天显示打钩
+            check_font = ('Microsoft YaHei UI', 16, 'bold')
+            cells += [("✓" if full_lines else "", check_font), ("✓" if half_lines else "", check_font)]
+            name_lines = ([], [])
+        else:
+            # 全部学生统计，全天、半天显示学生名单
+            cells += [("", cell_font), ("", cell_font)]
+            name_lines = (full_lines, half_lines)
+        self._place_stats_row_items(items, layout, y_pos, row_height, cells, bg_color, '#2C3E50', '#95A5A6',
+                                    name_lines)
+
+    def _draw_stats_summary_row(self, layout: StatsTableLayout, items: StatsRowItems, y_pos: int,
+                                summary_height: int):
+        """绘制单个学生统计的汇总行"""
+        total_full_count, total_half_count = layout.totals
+
+        # 前两列合并显示"合计"，人数列显示学生姓名，全天/半天列显示统计次数
+        student_name = self._current_stats_data[0]['count']
+        font = ('Microsoft YaHei UI', 11, 'bold')
+        cells = [("合计", font), ("", font), (student_name, font),
+                 (f"{total_full_count}次", font), (f"{total_half_count}次", font)]
+        self._place_stats_row_items(items, layout, y_pos, summary_height, cells, '#4472C4', 'white', '#FFFFFF')
+
+    def _place_stats_row_items(self, items: StatsRowItems, layout: StatsTableLayout, y_pos: int, row_height: int,
+                               cells, bg_color: str, text_color: str, grid_color: str, name_lines=((), ())):
+        """把一行的图形移到第 y_pos 处并设置内容：cells 为五个单元格的 (文字, 字体)，
+        name_lines 为全天、半天两列的名单各行（多行文本居中显示）"""
+        canvas = self.stats_canvas
+        canvas_width = layout.canvas_width
+        col_widths = layout.col_widths
+
+        # 背景、单元格文字和单元格边框（垂直线和底部水平线）
+        canvas.coords(items.background, 0, y_pos, canvas_width, y_pos + row_height)
+        x_pos = 0
+        for item, grid, (text, font), width in zip(items.texts, items.grid, cells, col_widths):
+            canvas.coords(item, x_pos + width // 2, y_pos + row_height // 2)
+            canvas.itemconfigure(item, text=text, fill=text_color, font=font)
+            canvas.coords(grid, x_pos, y_pos, x_pos, y_pos + row_height)
+            x_pos += width
+        canvas.coords(items.bottom, 0, y_pos + row_height, canvas_width, y_pos + row_height)
+        if items.colors != (bg_color, grid_color):
+            canvas.itemconfigure(items.background, fill=bg_color)
+            for grid in items.grid + [items.bottom]:
+                canvas.itemconfigure(grid, fill=grid_color)
+            items.colors = (bg_color, grid_color)
+
+        # 名单各行，上一次显示的多余的行清空
+        line_height = layout.line_height
+        x_pos = sum(col_widths[:3])
+        for column, (text_lines, width) in enumerate(zip(name_lines, col_widths[3:])):
+            line_items = items.name_line_items(canvas, column, len(text_lines), self.STATS_NAME_FONT, text_color)
+            # 计算多行文本的总高度，使文本在单元格中完全居中
+            start_y = y_pos + (row_height - len(text_lines) * line_height) // 2
+            for i, line in enumerate(text_lines):
+                canvas.coords(line_items[i], x_pos + width // 2, start_y + i * line_height + line_height // 2)
+                canvas.itemconfigure(line_items[i], text=line)
+            for item in line_items[len(text_lines):items.name_counts[column]]:
+                canvas.itemconfigure(item, text="")
+            items.name_counts[column] = len(text_lines)
+            x_pos += width
+
+        if not items.visible:
+            canvas.itemconfigure(items.tag, state='normal')
+            canvas.addtag_withtag(StatsRowItems.VISIBLE_TAG, items.tag)
+            items.visible = True
 
     def _redraw_stats_canvas(self):
         """延迟重绘统计表格"""
-        if hasattr(self, '_pending_stats_data') and self._pending_stats_data:
+        if self._pending_stats_data:
             self._draw_stats_canvas(self._pending_stats_data)
             self._pending_stats_data = None
 
+    # 拖动窗口边框时每帧最多处理一次（毫秒），停止拖动这么久后才重新布局
+    RESIZE_FRAME_MS = 33
+    RESIZE_SETTLE_MS = 150
+
     def on_window_resize(self, event):
-        """窗口大小改变事件 - 实时刷新UI和表格（平滑效果）"""
+        """窗口大小改变事件 - 合并同一帧内的多次事件，拖动中缩放表格，停止拖动后重新布局"""
         # 只处理root窗口的Configure事件，忽略子组件的事件
         if event.widget != self.root:
             return
@@ -3062,91 +3207,46 @@ class LeaveRecordApp:
         if not width_changed and not height_changed:
             return
 
-        # 记录当前时间
-        import time
-        current_time = time.time()
-        self._last_resize_time = current_time
+        self._last_resize_time = time.monotonic()
+        # 已经安排了下一帧时不再重复安排，一帧内的事件合并处理
+        if self._resize_timer is None:
+            self._resize_timer = self.root.after(self.RESIZE_FRAME_MS, self._on_resize_frame)
 
-        # 取消之前的刷新任务
-        if hasattr(self, '_resize_timer') and self._resize_timer:
-            self.root.after_cancel(self._resize_timer)
-        if hasattr(self, '_resize_timer2') and self._resize_timer2:
-            self.root.after_cancel(self._resize_timer2)
-
-        # 立即执行一次快速刷新（无延迟），确保最大化和恢复时立即响应
-        self._resize_timer = self.root.after(0, lambda: self._refresh_ui_with_time_check(current_time))
-
-        # 延迟执行第二次刷新（100ms），确保动画完成后最终状态正确
-        self._resize_timer2 = self.root.after(100, lambda: self._refresh_ui_with_time_check(current_time))
-
-    def _refresh_stats_optimized(self):
-        """优化的统计刷新函数 - 只重绘表格，不重新生成数据"""
-        # 如果有缓存的数据，直接重绘
-        if hasattr(self, '_current_stats_data') and self._current_stats_data:
-            self._draw_stats_canvas(self._current_stats_data)
-        else:
-            # 如果没有缓存数据，则执行完整刷新
-            self.refresh_stats()
+    def _on_resize_frame(self):
+        """调整窗口大小期间每帧执行一次：缩放已有的表格图形，停止调整后做一次完整的重新布局"""
+        self._resize_timer = None
+        if not self._is_stats_tab_visible() or self._stats_layout is None:
+            # 统计表格不可见时不用重绘，切换到统计选项卡时会按新宽度重绘
+            return
 
-    def _refresh_stats_optimized_with_time_check(self, trigger_time):
-        """优化的统计刷新函数 - 包含时间检查，确保只在最后一次调整后刷新"""
-        import time
+        settled = (time.monotonic() - self._last_resize_time) * 1000 >= self.RESIZE_SETTLE_MS
+        if settled:
+            # 停止调整：按新宽度重新换行和布局（统计结果命中缓存，宽度没变时不重绘）
+            self.generate_statistics()
+            return
 
-        # 只在当前是最后一次触发时才刷新
-        if trigger_time == self._last_resize_time:
-            # 如果有缓存的数据，直接重绘
-            if hasattr(self, '_current_stats_data') and self._current_stats_data:
-                self._draw_stats_canvas(self._current_stats_data)
-            else:
-                # 如果没有缓存数据，则执行完整刷新
-                self.refresh_stats()
-
-    def _refresh_ui_with_time_check(self, trigger_time):
-        """实时刷新UI和表格 - 包含时间检查"""
-        import time
-
-        # 只在当前是最后一次触发时才刷新
-        if trigger_time == self._last_resize_time:
-            # 强制更新所有UI组件的布局
-            self.root.update_idletasks()
-
-            # 如果在统计选项卡，实时刷新表格
-            if hasattr(self, 'notebook'):
-                current_tab = self.notebook.select()
-                if current_tab:
-                    tab_text = self.notebook.tab(current_tab, "text")
-                    if "统计" in tab_text:
-                        # 如果有缓存的数据，直接重绘
-                        if hasattr(self, '_current_stats_data') and self._current_stats_data:
-                            # 确保Canvas已经正确渲染
-                            if hasattr(self, 'stats_canvas'):
-                                # 强制更新Canvas尺寸
-                                self.stats_canvas.update()
-                                # 重绘表格
-                                self._draw_stats_canvas(self._current_stats_data)
-                        else:
-                            # 如果没有缓存数据，重新生成统计数据
-                            self.refresh_stats()
+        # 调整中：把已有的图形横向缩放到新宽度，不重新创建
+        self._scale_stats_canvas(self.stats_canvas.winfo_width())
+        self._resize_timer = self.root.after(self.RESIZE_FRAME_MS, self._on_resize_frame)
 
-    def _continuous_refresh_during_resize(self, trigger_time):
-        """在窗口大小变化期间持续刷新"""
-        import time
-
-        # 检查是否还在调整大小（最近50ms内有新的触发）
-        if time.time() - self._last_resize_time < 0.05:
-            # 继续刷新
-            if hasattr(self, '_current_stats_data') and self._current_stats_data:
-                self.root.update_idletasks()
-                if hasattr(self, 'notebook'):
-                    current_tab = self.notebook.select()
-                    if current_tab:
-                        tab_text = self.notebook.tab(current_tab, "text")
-                        if "统计" in tab_text:
-                            if hasattr(self, 'stats_canvas'):
-                                self.stats_canvas.update()
-                                self._draw_stats_canvas(self._current_stats_data)
-            # 50ms后再次检查
-            self.root.after(50, lambda: self._continuous_refresh_during_resize(trigger_time))
+    def _scale_stats_canvas(self, canvas_width: int):
+        """把统计表格显示中的图形横向缩放到新的画布宽度（行高和换行不变，等停止调整后重新布局）"""
+        layout = self._stats_layout
+        if canvas_width < 50 or canvas_width == layout.canvas_width:
+            return
+        ratio = canvas_width / layout.canvas_width
+        self.stats_canvas.scale(StatsRowItems.VISIBLE_TAG, 0, 0, ratio, 1)
+        # 之后滚动补画的行也按新宽度绘制
+        layout.canvas_width = canvas_width
+        layout.col_widths = [width * ratio for width in layout.col_widths]
+        self.stats_canvas.config(scrollregion=(0, 0, canvas_width, layout.total_height))
+
+    def _is_stats_tab_visible(self) -> bool:
+        """当前是否显示统计选项卡"""
+        if not hasattr(self, 'notebook') or not hasattr(self, 'stats_canvas'):
+            return False
+        current_tab = self.notebook.select()
+        return bool(current_tab) and "统计" in self.notebook.tab(current_tab, "text")
 
     def _schedule_calendar_highlight(self):
         """延迟更新日历高亮（防抖优化）"""
@@ -3163,95 +3263,6 @@ class LeaveRecordApp:
         self.calendar.highlight_dates(dates)
         self._calendar_update_timer = None
 
-    def _count_lines(self, text, max_chars_per_line):
-        """计算文本需要的行数"""
-        if not text:
-            return 1
-
-        names = [name.strip() for name in text.split(",")]
-        lines = []
-        current_line = ""
-
-        for name in names:
-            if not current_line:
-                current_line = name
-            elif len(current_line + ", " + name) <= max_chars_per_line:
-                current_line += ", " + name
-            else:
-                lines.append(current_line)
-                current_line = name
-
-        if current_line:
-            lines.append(current_line)
-
-        return len(lines)
-
-    def _draw_multiline_text(self, canvas, text, x, y, max_width, line_height, max_chars_per_line):
-        """绘制多行文本"""
-        if not text:
-            return
-
-        # 分割文本为多行
-        names = [name.strip() for name in text.split(",")]
-        lines = []
-        current_line = ""
-
-        for name in names:
-            if not current_line:
-                current_line = name
-            elif len(current_line + ", " + name) <= max_chars_per_line:
-                current_line += ", " + name
-            else:
-                lines.append(current_line)
-                current_line = name
-
-        if current_line:
-            lines.append(current_line)
-
-        # 绘制每一行
-        for i, line in enumerate(lines):
-            canvas.create_text(
-                x,
-                y + i * line_height + line_height // 2,
-                text=line,
-                fill='#2C3E50',
-                font=('Microsoft YaHei', 9),
-                anchor='w'
-            )
-
-    def _draw_multiline_text_centered(self, canvas, text, x, y, width, line_height, max_chars_per_line):
-        """绘制居中的多行文本"""
-        if not text:
-            return
-
-        # 分割文本为多行
-        names = [name.strip() for name in text.split(",")]
-        lines = []
-        current_line = ""
-
-        for name in names:
-            if not current_line:
-                current_line = name
-            elif len(current_line + ", " + name) <= max_chars_per_line:
-                current_line += ", " + name
-            else:
-                lines.append(current_line)
-                current_line = name
-
-        if current_line:
-            lines.append(current_line)
-
-        # 绘制每一行（居中）
-        for i, line in enumerate(lines):
-            canvas.create_text(
-                x + width // 2,
-                y + i * line_height + line_height // 2,
-                text=line,
-                fill='#2C3E50',
-                font=('Microsoft YaHei UI', 9),
-                anchor='center'
-            )
-    
     def on_stats_type_change(self, event=None):
         """统计类型改变事件"""
         stats_type = self.stats_type_var.get()
@@ -3432,9 +3443,9 @@ class LeaveRecordApp:
         if current_selection not in self.student_combo['values']:
             self.selected_student_var.set("全部学生")
 
-        # 强制更新Canvas宽度
+        # 更新Canvas宽度（只处理布局，不处理输入事件，避免在刷新中重入事件回调）
         if hasattr(self, 'stats_canvas'):
-            self.stats_canvas.update()
+            self.stats_canvas.update_idletasks()
 
         # 生成统计
         self.generate_statistics()
@@ -3447,84 +3458,15 @@ class LeaveRecordApp:
     
     def export_to_excel(self):
         """导出到Excel（功能全面优化版 - 表格数据）"""
-        # 收集表格中的数据
-        table_data = []
-        # 从Canvas重新生成数据
-        stats_type = self.stats_type_var.get()
-
-        # 确定日期范围
-        if stats_type == "current":
-            start_date = self.date_var.get()
-            end_date = start_date
-        elif stats_type == "week":
-            today = datetime.datetime.now()
-            weekday = today.weekday()
-            monday = today - datetime.timedelta(days=weekday)
-            start_date = monday.strftime("%Y-%m-%d")
-            end_date = (monday + datetime.timedelta(days=6)).strftime("%Y-%m-%d")
-        elif stats_type == "month":
-            today = datetime.datetime.now()
-            start_date = today.replace(day=1).strftime("%Y-%m-%d")
-            if today.month == 12:
-                end_date = datetime.datetime(today.year + 1, 1, 1) - datetime.timedelta(days=1)
-            else:
-                end_date = datetime.datetime(today.year, today.month + 1, 1) - datetime.timedelta(days=1)
-            end_date = end_date.strftime("%Y-%m-%d")
-        else:  # custom
-            start_date = self.start_date_var.get()
-            end_date = self.end_date_var.get()
+        if self._export_job is not None and (self._export_job.is_alive() or self._export_primer is not None):
+            messagebox.showwarning("警告", "正在导出，请等待完成或取消后再导出")
+            return
 
-        # 获取所有请假记录
-        all_dates = self.leave_manager.get_all_dates()
-        selected_student = self.selected_student_var.get()
+        # 与统计表格共用同一份统计结果，刚查看过的统计无需重新计算
+        result = self._query_current_statistics()
 
-        # 准备数据
-        if selected_student == "全部学生":
-            # 按日期聚合统计
-            date_stats = {}
-            for date_str in all_dates:
-                if start_date <= date_str <= end_date:
-                    records = self.leave_manager.get_leave_records(date_str)
-                    if date_str not in date_stats:
-                        date_stats[date_str] = {"full": 0, "half": 0, "students": set(), "full_students": [], "half_students": []}
-                    for name, record in records.items():
-                        if record["type"] == "full":
-                            date_stats[date_str]["full"] += 1
-                            date_stats[date_str]["full_students"].append(name)
-                        else:
-                            date_stats[date_str]["half"] += 1
-                            date_stats[date_str]["half_students"].append(name)
-                        date_stats[date_str]["students"].add(name)
-
-            for date_str in sorted(date_stats.keys()):
-                weekday = self.get_weekday(date_str)
-                count = len(date_stats[date_str]["students"])
-                full_students = sorted(date_stats[date_str]["full_students"])
-                half_students = sorted(date_stats[date_str]["half_students"])
-                table_data.append({
-                    "date": date_str,
-                    "weekday": weekday,
-                    "col3": f"{count}人",
-                    "col4": ", ".join(full_students),
-                    "col5": ", ".join(half_students)
-                })
-        else:
-            # 单个学生统计
-            for date_str in all_dates:
-                if start_date <= date_str <= end_date:
-                    records = self.leave_manager.get_leave_records(date_str)
-                    if selected_student in records:
-                        record = records[selected_student]
-                        weekday = self.get_weekday(date_str)
-                        full = record["type"] == "full"
-                        half = record["type"] == "half"
-                        table_data.append({
-                            "date": date_str,
-                            "weekday": weekday,
-                            "col3": selected_student,
-                            "col4": "✓" if full else "",
-                            "col5": "✓" if half else ""
-                        })
+        # 收集表格中的数据
+        table_data = leaveexport.build_table_data(result)
 
         if not table_data:
             messagebox.showwarning("警告", "没有数据可导出")
@@ -3540,190 +3482,127 @@ class LeaveRecordApp:
         if not file_path:
             return
 
-        # 在新线程中导出
+        # 在后台线程中导出，导出线程不接触界面控件，进度由主线程轮询
         self.export_progress['value'] = 0
         self.export_status_label.config(text="正在导出...")
-
-        thread = threading.Thread(target=self._export_excel_thread, args=(file_path, table_data))
-        thread.start()
-    
-    def _export_excel_thread(self, file_path: str, table_data):
-        """Excel导出线程"""
+        self.export_cancel_btn.config(state=tk.NORMAL)
+        self.export_cancel_btn.pack(side=tk.LEFT, padx=(10, 0))
+
+        # 导出线程不能使用 tkinter，先在主线程分批测量好估算行高要用的字符宽度，再启动导出线程
+        self._export_job = leaveexport.ExportJob(table_data, result.student is None, file_path)
+        self._export_primer = leaveexport.prime_text_measurer(table_data)
+        self._prime_export(self._export_job, self._export_primer)
+
+    def _prime_export(self, job: leaveexport.ExportJob, primer):
+        """测量一批字符宽度后让出界面线程，全部测量完再启动导出"""
+        if primer is not self._export_primer:
+            # 已取消
+            return
         try:
-            # 创建工作簿
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "请假记录"
+            next(primer)
+        except StopIteration:
+            self._export_primer = None
+            self._poll_export(job.start())
+            return
+        self.root.after(1, lambda: self._prime_export(job, primer))
+
+    def cancel_export(self):
+        """取消正在进行的导出"""
+        if self._export_primer is not None:
+            # 还在测量字符宽度，导出线程尚未启动
+            self._export_primer = None
+            self._finish_export()
+            self.export_status_label.config(text="已取消导出")
+            self.export_progress['value'] = 0
+        elif self._export_job is not None:
+            self._export_job.cancel()
+            self.export_cancel_btn.config(state=tk.DISABLED)
+            self.export_status_label.config(text="正在取消...")
+
+    def _poll_export(self, job: leaveexport.ExportJob):
+        """在主线程取出导出线程的进度事件并更新界面"""
+        for event, value in job.poll():
+            if event == "progress":
+                self.export_progress['value'] = value
+            elif event == "done":
+                self._finish_export()
+                self.export_status_label.config(text="导出完成！")
+                self.export_progress['value'] = 100
+                # 显示成功动画
+                self._animate_success(f"成功导出 {value} 条记录")
+                return
+            elif event == "cancelled":
+                self._finish_export()
+                self.export_status_label.config(text="已取消导出")
+                self.export_progress['value'] = 0
+                return
+            elif event == "error":
+                self._finish_export()
+                self.export_status_label.config(text=f"导出失败: {value}")
+                messagebox.showerror("错误", f"导出失败: {value}")
+                return
+        self.root.after(50, lambda: self._poll_export(job))
 
-            # 检查是全部学生统计还是单个学生统计
-            is_all_students = self.selected_student_var.get() == "全部学生"
+    def _finish_export(self):
+        self._export_job = None
+        self.export_cancel_btn.pack_forget()
 
-            # 根据统计类型设置表头
-            if is_all_students:
-                headers = ["日期", "星期", "人数", "全天", "半天"]
-            else:
-                headers = ["日期", "星期", "姓名", "全天", "半天"]
-            ws.append(headers)
-
-            # 设置表头样式
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            header_alignment = Alignment(horizontal="center", vertical="center")
-
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_num)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_alignment
-
-            # 设置列宽（增加第三列宽度以容纳多人名单）
-            ws.column_dimensions[get_column_letter(1)].width = 15
-            ws.column_dimensions[get_column_letter(2)].width = 10
-            ws.column_dimensions[get_column_letter(3)].width = 50 if is_all_students else 15  # 人数多时增加宽度
-            ws.column_dimensions[get_column_letter(4)].width = 50  # 全天名单也可能很长
-            ws.column_dimensions[get_column_letter(5)].width = 50  # 半天名单也可能很长
-
-            # 添加数据并设置样式
-            weekday_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-            saturday_fill = PatternFill(start_color="FFE699", end_color="FFE699", fill_type="solid")
-            sunday_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-            # 定义细边框样式（用于有数据的单元格）
-            thin_border = Border(
-                left=Side(style='thin', color='000000'),
-                right=Side(style='thin', color='000000'),
-                top=Side(style='thin', color='000000'),
-                bottom=Side(style='thin', color='000000')
-            )
-
-            for row_num, data in enumerate(table_data, 2):
-                # 添加数据
-                ws.append([data["date"], data["weekday"], data["col3"], data["col4"], data["col5"]])
-
-                # 设置颜色
-                fill = None
-                if data["weekday"] == "周六":
-                    fill = saturday_fill
-                elif data["weekday"] == "周日":
-                    fill = sunday_fill
-                else:
-                    fill = weekday_fill
-
-                # 判断该行是否有数据
-                has_data = False
-                if data["col3"] and str(data["col3"]).strip():
-                    has_data = True
-                if data["col4"] and str(data["col4"]).strip():
-                    has_data = True
-                if data["col5"] and str(data["col5"]).strip():
-                    has_data = True
-
-                for col_num in range(1, 6):
-                    cell = ws.cell(row=row_num, column=col_num)
-                    cell.fill = fill
-                    # 所有列都使用居中对齐和自动换行
-                    cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-                    # 为有数据的单元格添加细边框
-                    if has_data:
-                        cell.border = thin_border
-
-                # 更新进度
-                progress = (row_num - 1) / len(table_data) * 100
-                self.export_progress['value'] = progress
-
-            # 如果是单个学生统计，添加合计行
-            if not is_all_students and table_data:
-                # 统计全天和半天次数
-                total_full_count = 0
-                total_half_count = 0
-                for data in table_data:
-                    if data["col4"] and str(data["col4"]).strip():
-                        total_full_count += 1
-                    if data["col5"] and str(data["col5"]).strip():
-                        total_half_count += 1
-
-                # 添加合计行
-                summary_row = ws.max_row + 1
-                ws.append(["", "", "", "", ""])
-
-                # 设置合计行样式
-                summary_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-                summary_font = Font(bold=True, color="FFFFFF", size=11)
-
-                # 第一列：合计
-                cell = ws.cell(row=summary_row, column=1)
-                cell.value = "合计"
-                cell.fill = summary_fill
-                cell.font = summary_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-                # 第二列：空
-                cell = ws.cell(row=summary_row, column=2)
-                cell.fill = summary_fill
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-                # 第三列：学生姓名
-                student_name = table_data[0]["col3"] if table_data else ""
-                cell = ws.cell(row=summary_row, column=3)
-                cell.value = student_name
-                cell.fill = summary_fill
-                cell.font = summary_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-                # 第四列：全天次数
-                cell = ws.cell(row=summary_row, column=4)
-                cell.value = f"{total_full_count}次"
-                cell.fill = summary_fill
-                cell.font = summary_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-                # 第五列：半天次数
-                cell = ws.cell(row=summary_row, column=5)
-                cell.value = f"{total_half_count}次"
-                cell.fill = summary_fill
-                cell.font = summary_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-            # 调整行高以适应内容
-            for row_num in range(2, ws.max_row + 1):
-                max_lines = 1
-                for col_num in range(1, 6):
-                    cell = ws.cell(row=row_num, column=col_num)
-                    if cell.value:
-                        # 计算需要的行数
-                        text = str(cell.value)
-                        # 根据列宽估算每行能显示的字符数
-                        if col_num == 3 or col_num == 4 or col_num == 5:
-                            # 第3、4、5列列宽较大，每行约显示20个字符
-                            chars_per_line = 20
-                        else:
-                            # 其他列列宽较小，每行约显示10个字符
-                            chars_per_line = 10
-
-                        # 计算需要的行数
-                        lines = (len(text) + chars_per_line - 1) // chars_per_line
-                        max_lines = max(max_lines, lines)
-
-                # 根据最大行数设置行高（每行高度为15）
-                if max_lines > 1:
-                    ws.row_dimensions[row_num].height = 15 * max_lines
-
-            # 保存文件
-            wb.save(file_path)
-
-            # 更新状态
-            self.export_status_label.config(text="导出完成！")
-            self.export_progress['value'] = 100
+    def export_aggregate_to_excel(self):
+        """按当前统计日期范围汇总全部班级并导出Excel（各班级在子进程中并行统计）"""
+        start_date, end_date = self._resolve_stats_range()
+        classes = leavereport.workspace_classes(self.workspaces)
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            initialfile=f"多班级汇总_{start_date}_{end_date}.xlsx",
+            filetypes=[("Excel文件", "*.xlsx"), ("所有文件", "*.*")],
+            title="选择保存位置"
+        )
+        if not file_path:
+            return
+
+        self.export_progress['value'] = 0
+        self.export_status_label.config(text=f"正在汇总 {len(classes)} 个班级...")
 
-            # 显示成功动画
-            self._animate_success(f"成功导出 {len(table_data)} 条记录")
+        future = concurrent.futures.Future()
 
+        def run():
+            try:
+                result = leavereport.aggregate_statistics(classes, start_date, end_date, backend=self.workspaces.backend)
+                leavereport.export_aggregate_to_excel(result, file_path)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        self._poll_aggregate_export(future)
+
+    def _poll_aggregate_export(self, future):
+        """等待多班级汇总导出完成（在主线程轮询，避免在后台线程操作界面）"""
+        if not future.done():
+            self.root.after(100, lambda: self._poll_aggregate_export(future))
+            return
+        try:
+            result = future.result()
         except Exception as e:
             self.export_status_label.config(text=f"导出失败: {str(e)}")
             messagebox.showerror("错误", f"导出失败: {str(e)}")
+            return
+
+        self.export_progress['value'] = 100
+        if result.errors:
+            failed = "\n".join(f"{name}: {error}" for name, error in result.errors.items())
+            self.export_status_label.config(text=f"导出完成，{len(result.errors)} 个班级统计失败")
+            messagebox.showwarning("警告", f"以下班级统计失败，未计入汇总:\n{failed}")
+        else:
+            self.export_status_label.config(text="导出完成！")
+            self._animate_success(f"成功汇总 {len(result.class_names)} 个班级")
 
 
 def main():
     """主函数"""
+    # 打包为exe后，多班级汇总的子进程需要由此进入
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = LeaveRecordApp(root)
     root.mainloop()